@@ -0,0 +1,100 @@
+# === МОДУЛЬ СТАТИСТИКИ ЗАГРУЗКИ И СПРОСА ===
+#
+# Заявки и отмены по категориям и дням хранятся в booking_stats_daily и пополняются
+# инкрементально (database.refresh_booking_stats): фоновая задача раз в STATS_REFRESH_INTERVAL
+# секунд переносит туда только новые брони и отмены. Загрузку по ночам даёт room_nights.
+# Отчёты (команда /stats, /api/admin/stats/*) читают только агрегаты, поэтому их стоимость
+# зависит от размера ответа, а не от истории bookings.
+
+import asyncio
+import html
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Optional
+
+from config import STATS_REFRESH_INTERVAL
+from database import get_demand_stats, get_occupancy_stats, refresh_booking_stats
+
+# Сколько гостиниц показывать в сводке бота
+REPORT_TOP_HOTELS = 10
+REPORT_DAYS = 7
+
+_task: Optional[asyncio.Task] = None
+
+
+async def refresh():
+    """Обновляет агрегаты; ошибки только логируются — отчёт покажет данные последнего обновления"""
+    try:
+        result = await refresh_booking_stats()
+    except Exception as e:
+        logging.error(f"booking_stats.py: не удалось обновить статистику: {e}")
+        return None
+    if result and (result["requests"] or result["cancellations"]):
+        logging.info(f"booking_stats.py: учтено заявок {result['requests']}, отмен {result['cancellations']}")
+    return result
+
+
+async def _worker():
+    while True:
+        await refresh()
+        await asyncio.sleep(STATS_REFRESH_INTERVAL)
+
+
+def start():
+    global _task
+    if STATS_REFRESH_INTERVAL <= 0 or (_task is not None and not _task.done()):
+        return
+    _task = asyncio.get_running_loop().create_task(_worker())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
+
+
+# === СВОДКА ДЛЯ БОТА ===
+
+def _percent(part, total) -> str:
+    return f"{part / total:.0%}" if total else "—"
+
+
+async def build_report(today: date = None) -> str:
+    """HTML-сводка: спрос за последние REPORT_DAYS дней и загрузка на ближайшие REPORT_DAYS ночей"""
+    today = today or date.today()
+    await refresh()
+    demand = await get_demand_stats(today - timedelta(days=REPORT_DAYS - 1), today)
+    occupancy = await get_occupancy_stats(today, today + timedelta(days=REPORT_DAYS - 1))
+
+    hotels = defaultdict(lambda: {"requests": 0, "cancellations": 0, "booked": 0, "capacity": 0})
+    for r in demand:
+        h = hotels[r["hotel_name"]]
+        h["requests"] += r["requests"]
+        h["cancellations"] += r["cancellations"]
+    for r in occupancy:
+        # Категории без ограничения номеров в загрузку не входят
+        if r["rooms_total"]:
+            h = hotels[r["hotel_name"]]
+            h["booked"] += r["booked"]
+            h["capacity"] += r["rooms_total"]
+
+    requests = sum(h["requests"] for h in hotels.values())
+    cancellations = sum(h["cancellations"] for h in hotels.values())
+    booked = sum(h["booked"] for h in hotels.values())
+    capacity = sum(h["capacity"] for h in hotels.values())
+    lines = [
+        "📊 <b>Статистика</b>",
+        f"Заявок за {REPORT_DAYS} дн.: <b>{requests}</b>, отмен: <b>{cancellations}</b> ({_percent(cancellations, requests)})",
+        f"Загрузка на {REPORT_DAYS} ночей вперёд: <b>{_percent(booked, capacity)}</b> ({booked} из {capacity} номеро-ночей)",
+    ]
+    top = sorted(hotels.items(), key=lambda item: (-item[1]["requests"], -item[1]["booked"], item[0]))
+    top = [item for item in top if item[1]["requests"] or item[1]["booked"]][:REPORT_TOP_HOTELS]
+    if top:
+        lines.append("")
+    for name, h in top:
+        lines.append(
+            f"🏨 {html.escape(name)}: заявок {h['requests']}, отмен {h['cancellations']}, загрузка {_percent(h['booked'], h['capacity'])}"
+        )
+    return "\n".join(lines)
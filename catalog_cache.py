@@ -0,0 +1,184 @@
+# === МОДУЛЬ КЭША КАТАЛОГА (гостиницы и категории номеров) ===
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple, Any
+
+import asyncpg
+
+# Канал, в который триггеры на hotels/room_categories шлют NOTIFY
+CATALOG_CHANNEL = "catalog_changed"
+# Небольшая задержка, чтобы пачка изменений каталога вызвала одну перезагрузку
+RELOAD_DEBOUNCE = 0.2
+LISTENER_RETRY_DELAY = 5
+
+# Снимок каталога. Заменяется целиком при перезагрузке, поэтому читатели
+# никогда не видят наполовину обновлённые индексы.
+_snapshot: Optional[Dict[str, Any]] = None
+# Версия растёт при каждой перезагрузке, по ней зависимые кэши понимают, что каталог изменился
+version = 0
+loaded_at: Optional[float] = None
+
+_listener_conn: Optional[asyncpg.Connection] = None
+_listener_task: Optional[asyncio.Task] = None
+_reload_task: Optional[asyncio.Task] = None
+_pool = None
+_dsn: Optional[str] = None
+
+
+def is_loaded() -> bool:
+    return _snapshot is not None
+
+
+def invalidate():
+    """Сбрасывает кэш: до следующей перезагрузки запросы пойдут в БД"""
+    global _snapshot
+    _snapshot = None
+
+
+async def reload(pool):
+    """Полностью перечитывает каталог из БД и атомарно подменяет снимок"""
+    global _snapshot, version, loaded_at
+    async with pool.acquire() as conn:
+        hotel_rows = await conn.fetch("SELECT id, name, description, address FROM hotels ORDER BY name")
+        category_rows = await conn.fetch(
+            "SELECT id, hotel_id, name, description, price FROM room_categories ORDER BY id"
+        )
+
+    hotels = [dict(r) for r in hotel_rows]
+    categories = [dict(r) for r in category_rows]
+
+    categories_by_hotel: Dict[int, List[dict]] = {}
+    categories_by_hotel_and_name: Dict[Tuple[int, str], dict] = {}
+    for c in categories:
+        categories_by_hotel.setdefault(c["hotel_id"], []).append(c)
+        # Как и SELECT ... LIMIT 1 без сортировки: при дублях имени берём первую категорию
+        categories_by_hotel_and_name.setdefault((c["hotel_id"], c["name"]), c)
+
+    _snapshot = {
+        "hotels": hotels,
+        "hotels_by_id": {h["id"]: h for h in hotels},
+        "hotels_by_name": {h["name"]: h for h in hotels},
+        "categories_by_id": {c["id"]: c for c in categories},
+        "categories_by_hotel": categories_by_hotel,
+        "categories_by_hotel_and_name": categories_by_hotel_and_name,
+    }
+    version += 1
+    loaded_at = time.time()
+    logging.info(f"catalog_cache: каталог загружен (v{version}): {len(hotels)} гостиниц, {len(categories)} категорий")
+
+
+# === ЧТЕНИЕ ИЗ КЭША ===
+# Все функции возвращают None, если кэш не загружен, чтобы вызывающий код ушёл в БД
+
+def get_hotels() -> Optional[List[dict]]:
+    return _snapshot["hotels"] if _snapshot else None
+
+
+def get_hotel(hotel_id: int) -> Optional[dict]:
+    return _snapshot["hotels_by_id"].get(hotel_id) if _snapshot else None
+
+
+def get_hotel_by_name(name: str) -> Optional[dict]:
+    return _snapshot["hotels_by_name"].get(name) if _snapshot else None
+
+
+def get_categories(hotel_id: int) -> Optional[List[dict]]:
+    return _snapshot["categories_by_hotel"].get(hotel_id, []) if _snapshot else None
+
+
+def get_category(category_id: int) -> Optional[dict]:
+    return _snapshot["categories_by_id"].get(category_id) if _snapshot else None
+
+
+def get_category_by_hotel_and_name(hotel_id: int, name: str) -> Optional[dict]:
+    return _snapshot["categories_by_hotel_and_name"].get((hotel_id, name)) if _snapshot else None
+
+
+# === ИНВАЛИДАЦИЯ ЧЕРЕЗ LISTEN/NOTIFY ===
+
+def _schedule_reload():
+    global _reload_task
+    if _reload_task is not None and not _reload_task.done():
+        return
+    _reload_task = asyncio.get_running_loop().create_task(_debounced_reload())
+
+
+async def _debounced_reload():
+    await asyncio.sleep(RELOAD_DEBOUNCE)
+    try:
+        await reload(_pool)
+    except Exception as e:
+        # Не оставляем устаревший снимок: пусть запросы идут в БД, пока каталог не перечитается
+        logging.error(f"catalog_cache: ошибка перезагрузки каталога: {e}")
+        invalidate()
+
+
+def _on_notify(conn, pid, channel, payload):
+    logging.info(f"catalog_cache: получено уведомление об изменении каталога ({payload})")
+    _schedule_reload()
+
+
+def _on_listener_lost(conn):
+    # Пока слушатель не переподключился, изменения могут пройти мимо нас
+    logging.warning("catalog_cache: соединение LISTEN потеряно, кэш сброшен.")
+    invalidate()
+    _start_listener_task()
+
+
+async def _connect_listener():
+    global _listener_conn
+    conn = await asyncpg.connect(_dsn)
+    try:
+        await conn.add_listener(CATALOG_CHANNEL, _on_notify)
+        conn.add_termination_listener(_on_listener_lost)
+        # Перечитываем каталог уже после подписки, чтобы не пропустить изменения между ними
+        await reload(_pool)
+    except Exception:
+        conn.remove_termination_listener(_on_listener_lost)
+        await conn.close()
+        raise
+    _listener_conn = conn
+
+
+async def _listen_forever():
+    while True:
+        try:
+            await _connect_listener()
+            return
+        except Exception as e:
+            logging.error(f"catalog_cache: не удалось подписаться на {CATALOG_CHANNEL}: {e}")
+            await asyncio.sleep(LISTENER_RETRY_DELAY)
+
+
+def _start_listener_task():
+    global _listener_task
+    if _listener_task is not None and not _listener_task.done():
+        return
+    _listener_task = asyncio.get_running_loop().create_task(_listen_forever())
+
+
+async def start(pool, dsn: str):
+    """Загружает каталог и подписывается на изменения hotels/room_categories"""
+    global _pool, _dsn
+    _pool = pool
+    _dsn = dsn
+    try:
+        await _connect_listener()
+    except Exception as e:
+        # Старт не блокируем: без кэша функции database.py работают напрямую с БД
+        logging.error(f"catalog_cache: кэш каталога не запущен, повторю в фоне: {e}")
+        _start_listener_task()
+
+
+async def stop():
+    global _listener_conn
+    for task in (_listener_task, _reload_task):
+        if task is not None and not task.done():
+            task.cancel()
+    if _listener_conn is not None:
+        conn, _listener_conn = _listener_conn, None
+        conn.remove_termination_listener(_on_listener_lost)
+        await conn.close()
+    invalidate()
@@ -0,0 +1,274 @@
+# === МОДУЛЬ МАССОВОГО ИМПОРТА КАТАЛОГА ===
+#
+# Гостиницы, категории номеров (с ценами и числом номеров) и исторические брони из CSV или JSON.
+# Строки проверяются здесь (обязательные поля, типы, даты), затем database.import_catalog
+# загружает их COPY в staging-таблицы и переносит в рабочие set-based запросами.
+# Ошибки возвращаются по строкам: {"kind", "row", "error"}; строка в CSV — номер строки файла,
+# в JSON — номер элемента списка (с 1).
+#
+# Форматы:
+#   CSV  — один вид данных на файл, вид задаётся --kind (или по имени файла: hotels.csv, ...);
+#   JSON — список объектов одного вида (--kind) или {"hotels": [...], "categories": [...], "bookings": [...]}.
+# Поля:
+#   hotels     — name*, description, address
+#   categories — hotel*, name*, description, price, rooms_total
+#   bookings   — telegram_id*, hotel*, category*, check_in*, check_out*, status, created_at, ref
+#   (ref — ключ брони во внешней системе: повторный импорт такой брони пропускается)
+#
+# Запуск:
+#   python catalog_import.py hotels.csv categories.csv [--dry-run] [--strict]
+#   python catalog_import.py partner.json --dry-run
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Tuple
+
+KINDS = ("hotels", "categories", "bookings")
+FIELDS = {
+    "hotels": ("name", "description", "address"),
+    "categories": ("hotel", "name", "description", "price", "rooms_total"),
+    "bookings": ("telegram_id", "hotel", "category", "check_in", "check_out", "status", "created_at", "ref"),
+}
+# Сколько ошибок возвращать в ответе (всего их считает errors_total)
+MAX_REPORTED_ERRORS = 1000
+MAX_TEXT_LENGTH = 1000
+# Диапазоны столбцов INTEGER и BIGINT: число вне них сорвало бы COPY всего файла
+INT_MAX = 2 ** 31 - 1
+BIGINT_MIN, BIGINT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class ImportFormatError(ValueError):
+    """Файл не удалось разобрать целиком (не CSV/JSON, неизвестный вид данных и т.п.)"""
+
+
+# === РАЗБОР ФАЙЛОВ ===
+
+def parse_content(content, fmt: str, kind: str = None) -> Dict[str, List[dict]]:
+    """Разбирает CSV/JSON в {kind: [{"row": n, ...поля}]}"""
+    if isinstance(content, bytes):
+        # utf-8-sig — CSV из Excel начинается с BOM
+        content = content.decode("utf-8-sig")
+    if kind is not None and kind not in KINDS:
+        raise ImportFormatError(f"неизвестный вид данных: {kind}")
+
+    if fmt == "csv":
+        if kind is None:
+            raise ImportFormatError("для CSV нужно указать вид данных (hotels, categories или bookings)")
+        reader = csv.DictReader(io.StringIO(content))
+        rows = []
+        for record in reader:
+            # Номер строки — последним: столбец с именем row его не подменит
+            rows.append({**{k.strip(): v for k, v in record.items() if k}, "row": reader.line_num})
+        return {kind: rows}
+
+    if fmt == "json":
+        try:
+            document = json.loads(content)
+        except ValueError as e:
+            raise ImportFormatError(f"некорректный JSON: {e}")
+        if isinstance(document, list):
+            if kind is None:
+                raise ImportFormatError("для JSON-списка нужно указать вид данных (hotels, categories или bookings)")
+            document = {kind: document}
+        if not isinstance(document, dict) or not set(document) <= set(KINDS):
+            raise ImportFormatError(f"ожидается список или объект с ключами {', '.join(KINDS)}")
+        result = {}
+        for k, items in document.items():
+            if not isinstance(items, list):
+                raise ImportFormatError(f"{k}: ожидается список")
+            result[k] = [
+                {**item, "row": n} if isinstance(item, dict) else {"row": n, "_invalid": True}
+                for n, item in enumerate(items, start=1)
+            ]
+        return result
+
+    raise ImportFormatError(f"неизвестный формат: {fmt} (поддерживаются csv и json)")
+
+
+def _detect(path: str, kind: str = None) -> Tuple[str, str]:
+    name, ext = os.path.splitext(os.path.basename(path))
+    fmt = ext.lower().lstrip(".")
+    if kind is None and name.lower() in KINDS:
+        kind = name.lower()
+    return fmt, kind
+
+
+# === ПРОВЕРКА СТРОК ===
+
+def _text(value, field: str, required: bool = False):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ValueError(f"не заполнено поле {field}")
+        return None
+    value = str(value).strip()
+    if len(value) > MAX_TEXT_LENGTH:
+        raise ValueError(f"поле {field} длиннее {MAX_TEXT_LENGTH} символов")
+    return value
+
+
+def _price(value):
+    value = _text(value, "price")
+    if value is None:
+        return None
+    try:
+        price = Decimal(value.replace(" ", "").replace(",", "."))
+    except InvalidOperation:
+        raise ValueError(f"некорректная цена: {value}")
+    if price < 0 or price >= Decimal("100000000"):
+        raise ValueError(f"цена вне допустимого диапазона: {value}")
+    return price.quantize(Decimal("0.01"))
+
+
+def _int(value, field: str, required: bool = False, minimum: int = BIGINT_MIN, maximum: int = BIGINT_MAX):
+    value = _text(value, field, required)
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"поле {field} должно быть целым числом: {value}")
+    if number < minimum:
+        raise ValueError(f"поле {field} должно быть не меньше {minimum}")
+    if number > maximum:
+        raise ValueError(f"поле {field} должно быть не больше {maximum}")
+    return number
+
+
+def _date(value, field: str) -> date:
+    value = _text(value, field, required=True)
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"поле {field}: дата должна быть в формате YYYY-MM-DD или DD.MM.YYYY: {value}")
+
+
+def _datetime(value, field: str):
+    value = _text(value, field)
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"поле {field}: ожидается дата и время ISO 8601: {value}")
+    # В bookings.created_at время без часового пояса
+    return parsed.replace(tzinfo=None)
+
+
+def _validate_row(kind: str, item: dict) -> tuple:
+    if item.get("_invalid"):
+        raise ValueError("ожидается объект")
+    if kind == "hotels":
+        return (_text(item.get("name"), "name", True), _text(item.get("description"), "description"),
+                _text(item.get("address"), "address"))
+    if kind == "categories":
+        return (_text(item.get("hotel"), "hotel", True), _text(item.get("name"), "name", True),
+                _text(item.get("description"), "description"), _price(item.get("price")),
+                _int(item.get("rooms_total"), "rooms_total", minimum=0, maximum=INT_MAX))
+    check_in = _date(item.get("check_in"), "check_in")
+    check_out = _date(item.get("check_out"), "check_out")
+    if check_in >= check_out:
+        raise ValueError("дата заезда должна быть раньше даты выезда")
+    return (_int(item.get("telegram_id"), "telegram_id", True), _text(item.get("hotel"), "hotel", True),
+            _text(item.get("category"), "category", True), check_in, check_out,
+            _text(item.get("status"), "status") or "Заявка", _datetime(item.get("created_at"), "created_at"),
+            _text(item.get("ref"), "ref"))
+
+
+def validate(kind: str, items: List[dict]) -> Tuple[List[tuple], List[dict]]:
+    """Проверенные записи (row, ...поля) для database.import_catalog и ошибки по строкам"""
+    records, errors = [], []
+    seen = {}
+    for item in items:
+        row = item["row"]
+        try:
+            values = _validate_row(kind, item)
+        except ValueError as e:
+            errors.append({"kind": kind, "row": row, "error": str(e)})
+            continue
+        # Дубликаты внутри файла: сопоставление идёт по ключу, вторая строка неоднозначна
+        key = {"hotels": values[:1], "categories": values[:2], "bookings": values[-1:] if values[-1] else None}[kind]
+        if key is not None:
+            if key in seen:
+                errors.append({"kind": kind, "row": row, "error": f"повторяет строку {seen[key]}"})
+                continue
+            seen[key] = row
+        records.append((row, *values))
+    return records, errors
+
+
+# === ИМПОРТ ===
+
+async def run_import(batches: Dict[str, List[dict]], dry_run: bool = False, strict: bool = False) -> Dict[str, Any]:
+    """
+    Проверяет и импортирует {kind: строки}. strict — ничего не записывать, если есть хоть одна ошибка.
+    Возвращает счётчики по видам данных, errors (не больше MAX_REPORTED_ERRORS) и errors_total.
+    """
+    from database import import_catalog
+    records, errors = {}, []
+    for kind in KINDS:
+        records[kind], kind_errors = validate(kind, batches.get(kind, []))
+        errors.extend(kind_errors)
+
+    result = await import_catalog(
+        records["hotels"], records["categories"], records["bookings"],
+        # Ошибки проверки в strict-режиме: прогоняем импорт вхолостую, чтобы собрать и ошибки из БД
+        dry_run=dry_run or (strict and bool(errors)), strict=strict
+    )
+    errors = sorted(errors + result["errors"], key=lambda e: (KINDS.index(e["kind"]), e["row"]))
+    result["errors_total"] = len(errors)
+    result["errors"] = errors[:MAX_REPORTED_ERRORS]
+    result["dry_run"] = dry_run
+    return result
+
+
+async def _main(args):
+    from database import init_db, close_db
+    batches: Dict[str, List[dict]] = {}
+    for path in args.files:
+        fmt, kind = _detect(path, args.kind)
+        with open(path, "rb") as f:
+            for k, rows in parse_content(f.read(), fmt, kind).items():
+                batches.setdefault(k, []).extend(rows)
+
+    await init_db()
+    try:
+        result = await run_import(batches, dry_run=args.dry_run, strict=args.strict)
+    finally:
+        await close_db()
+
+    for kind in KINDS:
+        counts = ", ".join(f"{k}: {v}" for k, v in result[kind].items())
+        print(f"{kind}: {counts}")
+    for error in result["errors"]:
+        print(f"❌ {error['kind']}, строка {error['row']}: {error['error']}")
+    if result["errors_total"] > len(result["errors"]):
+        print(f"... и ещё {result['errors_total'] - len(result['errors'])} ошибок")
+    if result["committed"]:
+        print("✅ Импорт сохранён.")
+    else:
+        print("↩️ Изменения не сохранены" + (" (dry run)." if args.dry_run else " (strict: есть ошибки)."))
+    return 0 if not result["errors_total"] else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Массовый импорт гостиниц, категорий и броней из CSV/JSON")
+    parser.add_argument("files", nargs="+", help="CSV или JSON файлы")
+    parser.add_argument("--kind", choices=KINDS, help="вид данных (для CSV и JSON-списков, если не следует из имени файла)")
+    parser.add_argument("--dry-run", action="store_true", help="проверить и откатить, ничего не сохраняя")
+    parser.add_argument("--strict", action="store_true", help="не сохранять ничего, если есть хоть одна ошибка")
+    try:
+        sys.exit(asyncio.run(_main(parser.parse_args())))
+    except ImportFormatError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
@@ -1,5 +1,6 @@
 # === КОНФИГУРАЦИОННЫЙ МОДУЛЬ === 
 
+import hashlib
 import os
 from dotenv import load_dotenv
 
@@ -10,5 +11,83 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 MINI_APP_URL = os.getenv("MINI_APP_HTTP")
 ADMIN_CHAT_ID = int(os.getenv("ADMIN_CHAT_ID", 0))
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Реплика только для чтения (необязательно): каталог, списки броней, отчёты читаются с неё
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# При отставании больше этого (с) чтение переключается на основную БД; столько же после записи
+# чтения в том же обработчике идут в основную БД
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 5))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", 5))
+
+# === ПУЛ СОЕДИНЕНИЙ С БД ===
+# Соединения, открываемые заранее при старте, и предел пула
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 5))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 20))
+# Простаивающее дольше (с) соединение закрывается, но не ниже DB_POOL_MIN_SIZE; 0 — не закрывать
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", 300))
+# Сколько ждать свободное соединение (с), прежде чем вернуть ошибку; 0 — ждать без ограничения
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", 10))
+# Кэш подготовленных запросов на соединение; 0 — отключить (нужно за PgBouncer в режиме transaction)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+# Предельное время одного запроса (с); 0 — без ограничения
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", 0))
+# Сколько секунд при старте ждать, пока БД станет доступна
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", 60))
 ADMIN_CONTACT = os.getenv("ADMIN_CONTACT", "Контактная информация не указана")
-ADMIN_NAME = os.getenv("ADMIN_NAME", "Администратор")
\ No newline at end of file
+ADMIN_NAME = os.getenv("ADMIN_NAME", "Администратор")
+# Применять миграции БД при старте (удобно при разработке). В production по умолчанию выключено:
+# схему обновляют заранее командой `python migrate.py up`
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false" if (PROD or "").lower() == "true" else "true").lower() == "true"
+
+# === WEBHOOK (production) ===
+# Публичный https-адрес FastAPI-приложения, например https://bot.example.com
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+# Секрет, который Telegram присылает в X-Telegram-Bot-Api-Secret-Token.
+# По умолчанию выводится из токена бота, чтобы совпадать во всех процессах
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or (
+    hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest() if BOT_TOKEN else None
+)
+
+# === УВЕДОМЛЕНИЯ АДМИНИСТРАТОРУ (outbox) ===
+# Если > 0, уведомления копятся указанное число секунд и приходят одной сводкой
+OUTBOX_DIGEST_INTERVAL = float(os.getenv("OUTBOX_DIGEST_INTERVAL", 0))
+
+# === ХРАНИЛИЩЕ СОСТОЯНИЙ FSM ===
+# memory — в памяти процесса (только один воркер, формы теряются при перезапуске),
+# postgres — таблица fsm_states, redis — RedisStorage aiogram (нужен пакет redis и REDIS_URL).
+# В production по умолчанию postgres
+FSM_STORAGE = os.getenv("FSM_STORAGE", "postgres" if (PROD or "").lower() == "true" else "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Через сколько секунд бездействия незаполненная форма считается брошенной
+FSM_TTL = int(os.getenv("FSM_TTL", 24 * 3600))
+
+# === ПЛАНИРОВЩИК ОБНОВЛЕНИЙ (scheduler.py) ===
+# Обновления одного чата обрабатываются строго по очереди, разных чатов — параллельно
+# не более чем SCHEDULER_WORKERS обработчиками
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", 16))
+# Сколько обновлений может ждать в очереди всего и в одном чате
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", 1000))
+SCHEDULER_MAX_CHAT_QUEUE = int(os.getenv("SCHEDULER_MAX_CHAT_QUEUE", 20))
+# Обновления, прождавшие в очереди дольше (с), отбрасываются без обработки; 0 — не отбрасывать
+SCHEDULER_MAX_WAIT = float(os.getenv("SCHEDULER_MAX_WAIT", 60))
+
+# === ОГРАНИЧЕНИЕ ЧАСТОТЫ (throttling.py) ===
+# Пользователь может сделать THROTTLE_BURST действий подряд, дальше — THROTTLE_RATE в секунду; 0 — без ограничения
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", 1))
+THROTTLE_BURST = float(os.getenv("THROTTLE_BURST", 5))
+THROTTLE_MAX_BUCKETS = int(os.getenv("THROTTLE_MAX_BUCKETS", 100_000))
+
+# === МЕТРИКИ ===
+# В режиме polling (без FastAPI) метрики Prometheus отдаются отдельным HTTP-сервером на этом порту.
+# В FastAPI-приложении они всегда доступны на /metrics
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+# Запросы к БД дольше этого порога (мс) пишутся в лог; 0 — не логировать
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+
+# === СТАТИСТИКА ===
+# Как часто (с) переносить новые брони и отмены в агрегаты booking_stats_daily; 0 — только по запросу отчёта
+STATS_REFRESH_INTERVAL = float(os.getenv("STATS_REFRESH_INTERVAL", 60))
+
+# === АДМИНИСТРАТИВНОЕ API ===
+# Токен для /api/admin/* (заголовок X-Admin-Token). Если не задан, административные методы отключены
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
@@ -1,60 +1,174 @@
 # === МОДУЛЬ ВЗАИМОДЕЙСТВИЯ С БД === 
 
+import asyncio
 import asyncpg
-from config import DATABASE_URL
+import inspect
+import catalog_cache
+import db_stats
+import metrics
+import migrate
+from config import DATABASE_URL, AUTO_MIGRATE
+from config import DATABASE_REPLICA_URL, DB_REPLICA_MAX_LAG, DB_REPLICA_CHECK_INTERVAL
+from config import (
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_MAX_INACTIVE_LIFETIME, DB_POOL_ACQUIRE_TIMEOUT,
+    DB_STATEMENT_CACHE_SIZE, DB_COMMAND_TIMEOUT, DB_CONNECT_TIMEOUT,
+)
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from datetime import date
+import json
+import time
 from typing import List, Dict, Any
 import logging # Добавим логирование в database.py
 
 # db_pool = None
 # Используем глобальную переменную, но добавим логирование
 db_pool = None
+# Пул реплики для чтения (DATABASE_REPLICA_URL), None — все запросы идут в основную БД
+replica_pool = None
 
 async def init_db():
     global db_pool
     logging.info("database.py: init_db вызвана, пытаюсь создать пул.")
     try:
-        db_pool = await asyncpg.create_pool(DATABASE_URL)
-        logging.info("database.py: Успешное подключение к PostgreSQL, пул создан.")
+        db_pool = await _create_pool_with_backoff(DATABASE_URL, "основной БД")
+        logging.info(
+            f"database.py: Успешное подключение к PostgreSQL, пул создан "
+            f"({db_pool.get_size()} соединений прогрето, максимум {db_pool.get_max_size()})."
+        )
         print("✅ Успешное подключение к PostgreSQL") # Оставим и print
     except Exception as e:
         logging.error(f"database.py: Ошибка подключения к БД: {e}")
         print(f"❌ Ошибка подключения к БД: {e}")
         raise
+    db_stats.observe_pool(db_pool)
 
-    logging.info("database.py: Создаю таблицы.")
+    # Схема ведётся миграциями (migrate.py). В production DDL при старте не выполняется:
+    # миграции применяются заранее командой `python migrate.py up`.
     async with db_pool.acquire() as conn:
-        # Создание таблиц
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS hotels (
-                id SERIAL PRIMARY KEY,
-                name TEXT UNIQUE NOT NULL,
-                description TEXT,
-                address TEXT
-            )
-        """)
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS room_categories (
-                id SERIAL PRIMARY KEY,
-                hotel_id INTEGER REFERENCES hotels(id),
-                name TEXT NOT NULL,
-                description TEXT,
-                price DECIMAL(10,2)
+        pending = await migrate.get_pending(conn)
+        if pending and AUTO_MIGRATE:
+            logging.info(f"database.py: Применяю миграции: {[m['version'] for m in pending]}")
+            await migrate.apply_migrations(conn)
+        elif pending:
+            names = ", ".join(f"{m['version']}_{m['name']}" for m in pending)
+            logging.error(f"database.py: Схема БД устарела, не применены миграции: {names}")
+            raise RuntimeError(f"Не применены миграции БД ({names}). Выполните: python migrate.py up")
+    logging.info("database.py: Схема БД актуальна.")
+
+    await catalog_cache.start(db_pool, DATABASE_URL)
+    await _start_replica()
+
+async def close_db():
+    global db_pool
+    await catalog_cache.stop()
+    await _stop_replica()
+    if db_pool is not None:
+        pool, db_pool = db_pool, None
+        await pool.close()
+        logging.info("database.py: Пул соединений закрыт.")
+
+# === ПУЛ СОЕДИНЕНИЙ ===
+# Размеры пула, кэш подготовленных запросов и таймауты задаются в config.py (DB_POOL_*, DB_*).
+# При создании пул сразу открывает DB_POOL_MIN_SIZE соединений, и каждое новое соединение
+# заранее готовит частые запросы (_hot), поэтому первые обработчики после деплоя не платят
+# ни за подключение, ни за разбор запросов. Если БД ещё не поднялась, init_db повторяет
+# попытки с растущей паузой до DB_CONNECT_TIMEOUT секунд.
+
+CONNECT_BACKOFF_MIN = 0.5
+CONNECT_BACKOFF_MAX = 10
+# Частые запросы: (текст, только чтение). Текст должен совпадать с тем, что передаётся в fetch/execute —
+# asyncpg находит подготовленный запрос в кэше соединения по тексту
+_HOT_STATEMENTS: List[tuple] = []
+# Предупреждение о недоступном прогреве пишется один раз, а не на каждое соединение пула
+_warmup_unsupported_logged = False
+
+def _hot(query: str, readonly: bool = False) -> str:
+    """Регистрирует запрос для подготовки на каждом новом соединении пула и возвращает его текст"""
+    _HOT_STATEMENTS.append((query, readonly))
+    return query
+
+def _private_prepare(conn):
+    """conn._prepare, если он есть и принимает use_cache, иначе None"""
+    prepare = getattr(conn, "_prepare", None)
+    if prepare is None:
+        return None
+    try:
+        params = inspect.signature(prepare).parameters
+    except (TypeError, ValueError):
+        return None
+    return prepare if "use_cache" in params else None
+
+async def _prepare_hot_statements(conn, readonly_only: bool):
+    # Внутренний conn._prepare(use_cache=True) кладёт запрос в тот же кэш, которым пользуются
+    # fetch/execute. Публичный conn.prepare() кэш не заполняет, а его PreparedStatement
+    # перестаёт работать, как только соединение вернулось в пул, поэтому для прогрева не годится.
+    # Метод приватный: в версии asyncpg, где его нет или у него другая сигнатура, прогрев
+    # отключается — запросы подготовятся при первом вызове, как без прогрева.
+    global _warmup_unsupported_logged
+    prepare = _private_prepare(conn)
+    if prepare is None:
+        if not _warmup_unsupported_logged:
+            _warmup_unsupported_logged = True
+            logging.warning(
+                f"database.py: asyncpg {asyncpg.__version__} без Connection._prepare(use_cache=...), "
+                "частые запросы заранее не готовятся"
             )
-        """)
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS bookings (
-                id SERIAL PRIMARY KEY,
-                telegram_id BIGINT NOT NULL,
-                hotel_id INTEGER REFERENCES hotels(id),
-                room_category_id INTEGER REFERENCES room_categories(id),
-                check_in DATE,
-                check_out DATE,
-                status TEXT DEFAULT 'Заявка',
-                created_at TIMESTAMP DEFAULT NOW()
+        return
+    for query, readonly in _HOT_STATEMENTS:
+        if readonly_only and not readonly:
+            continue
+        try:
+            await prepare(query, use_cache=True)
+        except asyncpg.PostgresError as e:
+            # Например, схема ещё не обновлена миграциями — запрос подготовится при первом вызове
+            logging.warning(f"database.py: не удалось подготовить запрос заранее: {e}")
+    # Подготовка идёт без Sync, и неявная транзакция держит AccessShareLock на таблицах запросов,
+    # пока соединение не выполнит следующий запрос. Простаивающие в пуле соединения иначе
+    # блокировали бы ALTER TABLE миграций (в том числе применяемых тем же init_db)
+    await conn.execute("SELECT 1")
+
+async def _init_primary_connection(conn):
+    await _prepare_hot_statements(conn, readonly_only=False)
+
+async def _init_replica_connection(conn):
+    # На реплике выполняются только чтения
+    await _prepare_hot_statements(conn, readonly_only=True)
+
+def _pool_options() -> Dict[str, Any]:
+    return {
+        "min_size": min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+        "max_size": DB_POOL_MAX_SIZE,
+        "max_inactive_connection_lifetime": DB_POOL_MAX_INACTIVE_LIFETIME,
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "command_timeout": DB_COMMAND_TIMEOUT or None,
+    }
+
+async def _create_pool(dsn: str, replica: bool = False, **overrides):
+    options = _pool_options()
+    options.update(overrides)
+    # Без кэша запросов (statement_cache_size=0, например за PgBouncer) готовить заранее нечего
+    if DB_STATEMENT_CACHE_SIZE:
+        options["init"] = _init_replica_connection if replica else _init_primary_connection
+    return await asyncpg.create_pool(dsn, **options)
+
+async def _create_pool_with_backoff(dsn: str, title: str, **kwargs):
+    """Создаёт пул, повторяя попытки при недоступной БД до DB_CONNECT_TIMEOUT секунд"""
+    deadline = time.monotonic() + DB_CONNECT_TIMEOUT
+    delay = CONNECT_BACKOFF_MIN
+    attempt = 1
+    while True:
+        try:
+            return await _create_pool(dsn, **kwargs)
+        except (OSError, asyncio.TimeoutError, asyncpg.CannotConnectNowError, asyncpg.PostgresConnectionError) as e:
+            if time.monotonic() + delay > deadline:
+                raise
+            logging.warning(
+                f"database.py: {title} недоступна (попытка {attempt}): {e}. Повтор через {delay:.1f} с"
             )
-        """)
-    logging.info("database.py: Таблицы созданы.")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CONNECT_BACKOFF_MAX)
+            attempt += 1
 
 # === ФУНКЦИИ РАБОТЫ С БАЗОЙ ===
 # Обернём каждую функцию в проверку db_pool
@@ -64,17 +178,346 @@ async def _ensure_pool():
         raise RuntimeError("База данных не инициализирована (db_pool is None)")
     return db_pool
 
+# Статистика запросов (время, строки, ожидание пула) — см. db_stats.py
+get_query_stats = db_stats.get_query_stats
+
+async def _acquire_primary():
+    pool = await _ensure_pool()
+    started = time.perf_counter()
+    db_stats.acquire_started()
+    try:
+        conn = await pool.acquire(timeout=DB_POOL_ACQUIRE_TIMEOUT or None)
+    finally:
+        db_stats.acquire_finished(pool, time.perf_counter() - started)
+    return pool, conn
+
+async def _release_primary(pool, conn):
+    await pool.release(conn)
+    db_stats.observe_pool(pool)
+
+@asynccontextmanager
+async def _connection(name: str, readonly: bool = False, pin: bool = True):
+    """
+    Соединение из пула, через которое идут все запросы модуля. Запросы учитываются
+    в статистике под именем name (или name=..., переданным в сам запрос),
+    отдельно учитывается время ожидания свободного соединения.
+    readonly=True — только чтение, такие запросы уходят на реплику, если она есть и не отстаёт.
+    Запись (readonly=False) переводит дальнейшие чтения контекста на основную БД; pin=False —
+    для служебных запросов, которые идут в основную БД, но пользовательских данных не меняют
+    (чтение FSM, outbox): после них чтения обработчика по-прежнему идут на реплику.
+    Внутри unit_of_work() запросы идут через одно соединение единицы работы.
+    """
+    uow = _unit_of_work.get()
+    if uow is not None and (uow.finished or uow.task is not asyncio.current_task()):
+        # Задачи, порождённые обработчиком (gather, фоновые), живут дольше его соединения
+        uow = None
+    if uow is not None and (uow.conn is not None or uow.transaction or not (readonly and _replica_usable())):
+        conn = await uow.connection()
+        if readonly:
+            metrics.DB_READS.labels("primary").inc()
+        elif pin:
+            _pin_primary()
+        yield db_stats.InstrumentedConnection(conn, name)
+        return
+
+    if readonly and _replica_usable():
+        try:
+            conn = await replica_pool.acquire(timeout=REPLICA_ACQUIRE_TIMEOUT)
+        except Exception as e:
+            _replica_failed(e)
+        else:
+            metrics.DB_READS.labels("replica").inc()
+            try:
+                yield db_stats.InstrumentedConnection(conn, name)
+            except _CONNECTION_ERRORS as e:
+                _replica_failed(e)
+                raise
+            finally:
+                await replica_pool.release(conn)
+            return
+
+    pool, conn = await _acquire_primary()
+    if readonly:
+        metrics.DB_READS.labels("primary").inc()
+    elif pin:
+        # Дальнейшие чтения в этом контексте (обработчик, запрос API) видят свою запись
+        _pin_primary()
+    try:
+        yield db_stats.InstrumentedConnection(conn, name)
+    finally:
+        await _release_primary(pool, conn)
+
+# === ЕДИНИЦА РАБОТЫ (одно соединение на обработчик) ===
+# unit_of_work() открывает область, в которой все функции модуля используют одно соединение
+# основной БД: оно берётся из пула при первом запросе (обработчик без запросов пул не трогает)
+# и возвращается при выходе. С transaction=True на этом соединении открывается транзакция:
+# при выходе без исключения она фиксируется, при исключении откатывается; транзакции самих
+# функций (create_booking, update_booking_status) становятся точками сохранения внутри неё.
+# Чтения до первой записи в области без транзакции по-прежнему могут идти на реплику.
+# Вне unit_of_work() функции работают как раньше — каждая со своим соединением.
+# В боте область открывает UnitOfWorkMiddleware (dispatcher.py) только для обработчиков
+# с флагом flags={"transaction": True}. Соединение области занято, пока она открыта, поэтому
+# перед вызовами Telegram обработчик закрывает её досрочно — finish_unit_of_work().
+
+_unit_of_work: ContextVar = ContextVar("unit_of_work", default=None)
+
+class _UnitOfWork:
+    def __init__(self, transaction: bool):
+        self.transaction = transaction
+        # Соединение принадлежит задаче, открывшей область: только она может им пользоваться
+        self.task = asyncio.current_task()
+        self.pool = None
+        self.conn = None
+        self._tx = None
+        # После finish_unit_of_work() запросы снова идут каждый со своим соединением
+        self.finished = False
+
+    async def connection(self):
+        if self.conn is None:
+            pool, conn = await _acquire_primary()
+            if self.transaction:
+                tx = conn.transaction()
+                try:
+                    await tx.start()
+                except BaseException:
+                    await _release_primary(pool, conn)
+                    raise
+                self._tx = tx
+            self.pool, self.conn = pool, conn
+        return self.conn
+
+    async def close(self, failed: bool):
+        if self.conn is None:
+            return
+        pool, conn, tx = self.pool, self.conn, self._tx
+        self.pool = self.conn = self._tx = None
+        try:
+            if tx is not None:
+                if failed:
+                    await tx.rollback()
+                else:
+                    await tx.commit()
+        finally:
+            await _release_primary(pool, conn)
+
+@asynccontextmanager
+async def unit_of_work(transaction: bool = False):
+    """Одно соединение (и при transaction=True — одна транзакция) на все запросы внутри блока"""
+    if _unit_of_work.get() is not None and _unit_of_work.get().task is asyncio.current_task():
+        # Вложенная область использует внешнюю
+        yield
+        return
+    uow = _UnitOfWork(transaction)
+    token = _unit_of_work.set(uow)
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        _unit_of_work.reset(token)
+        await uow.close(failed)
+
+async def finish_unit_of_work():
+    """
+    Досрочно закрывает область unit_of_work() текущей задачи: фиксирует транзакцию и возвращает
+    соединение в пул. Дальнейшие запросы обработчика идут каждый со своим соединением
+    """
+    uow = _unit_of_work.get()
+    if uow is None or uow.finished or uow.task is not asyncio.current_task():
+        return
+    uow.finished = True
+    await uow.close(failed=False)
+
+# === РЕПЛИКА ДЛЯ ЧТЕНИЯ ===
+# Функции только для чтения открывают _connection(..., readonly=True) и попадают на реплику, кроме случаев:
+#   - реплика недоступна или отстаёт больше чем на DB_REPLICA_MAX_LAG секунд (проверка раз
+#     в DB_REPLICA_CHECK_INTERVAL) — читаем из основной БД, пока проверка не пройдёт снова;
+#   - в этом же контексте (обновление Telegram, HTTP-запрос) недавно была запись — например,
+#     отмена брони и сразу перерисовка списка. Такие чтения DB_REPLICA_MAX_LAG секунд идут
+#     в основную БД, чтобы увидеть собственные изменения.
+# Состояния FSM и outbox всегда читаются из основной БД, но чтения обработчика на основную БД
+# не переводят (pin=False): иначе чтение формы в начале каждого обновления отключало бы реплику.
+
+REPLICA_ACQUIRE_TIMEOUT = 2
+# Отставание реплики в секундах. Если всё полученное уже применено, отставания нет, даже когда
+# основная БД давно ничего не писала и время последней применённой транзакции старое
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END::float8
+"""
+_CONNECTION_ERRORS = (asyncpg.PostgresConnectionError, asyncpg.exceptions.ConnectionDoesNotExistError, OSError)
+
+_replica_healthy = False
+_replica_task = None
+# До какого момента (time.monotonic) чтения в этом контексте идут в основную БД
+_primary_until: ContextVar = ContextVar("primary_until", default=0.0)
+
+def _replica_usable() -> bool:
+    return replica_pool is not None and _replica_healthy and time.monotonic() >= _primary_until.get()
+
+def _pin_primary():
+    if replica_pool is not None:
+        _primary_until.set(time.monotonic() + DB_REPLICA_MAX_LAG)
+
+def _set_replica_health(healthy: bool, lag: float = None):
+    global _replica_healthy
+    if healthy != _replica_healthy:
+        if healthy:
+            logging.info("database.py: реплика доступна, чтение идёт с неё.")
+        else:
+            logging.warning("database.py: реплика недоступна или отстаёт, чтение переключено на основную БД.")
+    _replica_healthy = healthy
+    metrics.DB_REPLICA_HEALTHY.set(1 if healthy else 0)
+    if lag is not None:
+        metrics.DB_REPLICA_LAG.set(lag)
+
+def _replica_failed(e: Exception):
+    logging.error(f"database.py: ошибка соединения с репликой: {e}")
+    _set_replica_health(False)
+
+async def _check_replica():
+    try:
+        async with replica_pool.acquire(timeout=REPLICA_ACQUIRE_TIMEOUT) as conn:
+            lag = await conn.fetchval(REPLICA_LAG_SQL)
+    except Exception as e:
+        if _replica_healthy:
+            _replica_failed(e)
+        else:
+            metrics.DB_REPLICA_HEALTHY.set(0)
+        return
+    _set_replica_health(lag <= DB_REPLICA_MAX_LAG, lag)
+
+async def _replica_monitor():
+    while True:
+        await asyncio.sleep(DB_REPLICA_CHECK_INTERVAL)
+        await _check_replica()
+
+async def _start_replica():
+    global replica_pool, _replica_task
+    if not DATABASE_REPLICA_URL:
+        return
+    # min_size=0: пул создаётся, даже если реплика сейчас недоступна; подключится, когда она поднимется
+    replica_pool = await _create_pool(DATABASE_REPLICA_URL, replica=True, min_size=0)
+    await _check_replica()
+    _replica_task = asyncio.get_running_loop().create_task(_replica_monitor())
+    logging.info(f"database.py: пул реплики создан, реплика {'доступна' if _replica_healthy else 'пока недоступна'}.")
+
+async def _stop_replica():
+    global replica_pool, _replica_task
+    if _replica_task is not None:
+        _replica_task.cancel()
+        _replica_task = None
+    if replica_pool is not None:
+        pool, replica_pool = replica_pool, None
+        _set_replica_health(False)
+        await pool.close()
+
+# === ПАКЕТНАЯ ЗАГРУЗКА ПО ID ===
+# Поиск по id, запрошенный разными задачами в одной итерации цикла событий (обработчики
+# нескольких пользователей, asyncio.gather в одном обработчике), уходит в БД одним запросом
+# с ANY($1). Одинаковые id, которые уже запрошены и ещё не вернулись, ждут тот же ответ.
+# Внутри lookup_scope() (одно обновление Telegram) повторный поиск того же id берётся из памяти.
+
+# (имя загрузчика, id) -> строка; None — вне lookup_scope
+_lookup_memo: ContextVar = ContextVar("lookup_memo", default=None)
+# Больше id в одном запросе не отправляем
+LOADER_MAX_BATCH = 500
+
+@contextmanager
+def lookup_scope():
+    """Область одного обновления: повторные поиски по id внутри неё не ходят в БД"""
+    token = _lookup_memo.set({})
+    try:
+        yield
+    finally:
+        _lookup_memo.reset(token)
+
+class _BatchLoader:
+    def __init__(self, name: str, query: str):
+        self.name = name
+        # Запрос с единственным параметром — массивом id; в ответе обязателен столбец id
+        self.query = _hot(query, readonly=True)
+        self._pending: Dict[Any, asyncio.Future] = {}
+        self._inflight: Dict[Any, asyncio.Future] = {}
+        self._tasks = set()
+
+    async def load(self, key):
+        memo = _lookup_memo.get()
+        if memo is not None and (self.name, key) in memo:
+            return memo[(self.name, key)]
+        future = self._inflight.get(key) or self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            if not self._pending:
+                # Отправляем после того, как отработают уже готовые к запуску задачи
+                loop.call_soon(self._dispatch)
+            self._pending[key] = future
+        # shield: отмена одного ожидающего не отменяет общий ответ для остальных
+        row = await asyncio.shield(future)
+        if memo is not None:
+            memo[(self.name, key)] = row
+        return row
+
+    def _dispatch(self):
+        pending, self._pending = self._pending, {}
+        self._inflight.update(pending)
+        keys = list(pending)
+        for i in range(0, len(keys), LOADER_MAX_BATCH):
+            batch = {k: pending[k] for k in keys[i:i + LOADER_MAX_BATCH]}
+            task = asyncio.get_running_loop().create_task(self._fetch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, batch: Dict[Any, asyncio.Future]):
+        try:
+            async with _connection(self.name, readonly=True) as conn:
+                rows = await conn.fetch(self.query, list(batch))
+            found = {r["id"]: r for r in rows}
+            for key, future in batch.items():
+                if not future.done():
+                    future.set_result(found.get(key))
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for key, future in batch.items():
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+_hotel_loader = _BatchLoader(
+    "load_hotels", "SELECT id, name, description FROM hotels WHERE id = ANY($1::int[])"
+)
+_room_category_loader = _BatchLoader(
+    "load_room_categories", "SELECT id, name, description, price FROM room_categories WHERE id = ANY($1::int[])"
+)
+
+# === КАТАЛОГ (гостиницы и категории) ===
+# Сначала смотрим в catalog_cache, в БД идём только если кэш ещё не загружен
+
 # НОВАЯ ФУНКЦИЯ: Получить ID отеля по имени
 async def get_hotel_id_by_name(name: str):
-    pool = await _ensure_pool()
-    async with pool.acquire() as conn:
+    if catalog_cache.is_loaded():
+        hotel = catalog_cache.get_hotel_by_name(name)
+        return hotel["id"] if hotel else None
+    async with _connection("get_hotel_id_by_name", readonly=True) as conn:
         row = await conn.fetchrow("SELECT id FROM hotels WHERE name = $1", name)
         return row["id"] if row else None
 
 # НОВАЯ ФУНКЦИЯ: Получить ID категории номера по ID отеля и имени
 async def get_room_category_id_by_hotel_and_name(hotel_id: int, name: str):
-    pool = await _ensure_pool()
-    async with pool.acquire() as conn:
+    if catalog_cache.is_loaded():
+        category = catalog_cache.get_category_by_hotel_and_name(hotel_id, name)
+        return category["id"] if category else None
+    async with _connection("get_room_category_id_by_hotel_and_name", readonly=True) as conn:
         row = await conn.fetchrow(
             "SELECT id FROM room_categories WHERE hotel_id = $1 AND name = $2",
             hotel_id, name
@@ -82,121 +525,744 @@ async def get_room_category_id_by_hotel_and_name(hotel_id: int, name: str):
         return row["id"] if row else None
 
 async def get_all_hotels(sort_by: str = "name", desc: bool = False):
-    pool = await _ensure_pool()
-    order = "DESC" if desc else "ASC"
+    # У hotels нет created_at, порядок создания даёт SERIAL id
     valid_sort_fields = {
         "name": "name",
-        "created": "created_at"
+        "created": "id"
     }
     order_field = valid_sort_fields.get(sort_by, "name")
 
-    async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            f"SELECT id, name, description, address FROM hotels ORDER BY {order_field} {order}"
-        )
-        return [
-            {
-                "id": r["id"],
-                "name": r["name"],
-                "description": r["description"],
-                "address": r["address"]
-            }
-            for r in rows
-        ]
+    hotels = catalog_cache.get_hotels()
+    if hotels is None:
+        order = "DESC" if desc else "ASC"
+        async with _connection("get_all_hotels", readonly=True) as conn:
+            hotels = await conn.fetch(
+                f"SELECT id, name, description, address FROM hotels ORDER BY {order_field} {order}"
+            )
+    elif order_field != "name" or desc:
+        hotels = sorted(hotels, key=lambda h: h[order_field], reverse=desc)
+
+    return [
+        {
+            "id": r["id"],
+            "name": r["name"],
+            "description": r["description"],
+            "address": r["address"]
+        }
+        for r in hotels
+    ]
 
 async def get_hotel_by_id(hotel_id: int):
-    pool = await _ensure_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT id, name, description FROM hotels WHERE id = $1", hotel_id)
-        return {"id": row["id"], "name": row["name"], "description": row["description"]} if row else None
+    if catalog_cache.is_loaded():
+        row = catalog_cache.get_hotel(hotel_id)
+    else:
+        row = await _hotel_loader.load(hotel_id)
+    return {"id": row["id"], "name": row["name"], "description": row["description"]} if row else None
 
 async def get_room_categories_by_hotel(hotel_id: int):
-    pool = await _ensure_pool()
-    async with pool.acquire() as conn:
-        rows = await conn.fetch("SELECT id, name, description, price FROM room_categories WHERE hotel_id = $1", hotel_id)
-        return [{"id": r["id"], "name": r["name"], "description": r["description"], "price": r["price"]} for r in rows]
+    rows = catalog_cache.get_categories(hotel_id)
+    if rows is None:
+        async with _connection("get_room_categories_by_hotel", readonly=True) as conn:
+            rows = await conn.fetch("SELECT id, name, description, price FROM room_categories WHERE hotel_id = $1", hotel_id)
+    return [{"id": r["id"], "name": r["name"], "description": r["description"], "price": r["price"]} for r in rows]
 
 async def get_room_category_by_id(category_id: int):
-    pool = await _ensure_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT id, name, description, price FROM room_categories WHERE id = $1", category_id)
-        return {"id": row["id"], "name": row["name"], "description": row["description"], "price": row["price"]} if row else None
+    if catalog_cache.is_loaded():
+        row = catalog_cache.get_category(category_id)
+    else:
+        row = await _room_category_loader.load(category_id)
+    return {"id": row["id"], "name": row["name"], "description": row["description"], "price": row["price"]} if row else None
 
-async def get_user_bookings(telegram_id: int):
-    """Получить активные (неотменённые) бронирования пользователя"""
-    pool = await _ensure_pool()
-    async with pool.acquire() as conn:
-        rows = await conn.fetch("""
+async def get_hotels_with_categories_json() -> str:
+    """Весь каталог для Mini App одним запросом, уже сериализованный в JSON на стороне Postgres"""
+    async with _connection("get_hotels_with_categories_json", readonly=True) as conn:
+        return await conn.fetchval("""
+            SELECT COALESCE(json_agg(json_build_object(
+                       'id', h.id,
+                       'name', h.name,
+                       'categories', COALESCE(c.categories, '[]'::json)
+                   ) ORDER BY h.name), '[]'::json)::text
+            FROM hotels h
+            LEFT JOIN LATERAL (
+                SELECT json_agg(json_build_object(
+                           'id', rc.id,
+                           'name', rc.name,
+                           'price', rc.price::float8
+                       ) ORDER BY rc.id) AS categories
+                FROM room_categories rc
+                WHERE rc.hotel_id = h.id
+            ) c ON TRUE
+        """)
+
+async def get_user_bookings(telegram_id: int, limit: int = None, after: tuple = None, before: tuple = None):
+    """
+    Получить активные (неотменённые) бронирования пользователя, новые сверху.
+    Keyset-пагинация по (created_at, id): after=(created_at, id) — следующая страница
+    (более старые брони), before=(created_at, id) — предыдущая (более новые).
+    Без limit возвращаются все брони.
+    """
+    conditions = ["b.telegram_id = $1", "b.status != 'cancelled'"]
+    args = [telegram_id]
+    order = "DESC"
+    if after is not None:
+        args.extend(after)
+        conditions.append(f"(b.created_at, b.id) < (${len(args) - 1}, ${len(args)})")
+    elif before is not None:
+        args.extend(before)
+        conditions.append(f"(b.created_at, b.id) > (${len(args) - 1}, ${len(args)})")
+        # Идём от курсора вверх, чтобы взять ближайшие к нему брони, и потом разворачиваем
+        order = "ASC"
+    limit_sql = ""
+    if limit is not None:
+        args.append(limit)
+        limit_sql = f"LIMIT ${len(args)}"
+
+    async with _connection("get_user_bookings", readonly=True) as conn:
+        rows = await conn.fetch(f"""
             SELECT b.id, h.name as hotel_name, rc.name as room_category, 
-                   b.check_in, b.check_out, b.status
+                   b.check_in, b.check_out, b.status, b.created_at
             FROM bookings b
             JOIN hotels h ON b.hotel_id = h.id
             JOIN room_categories rc ON b.room_category_id = rc.id
-            WHERE b.telegram_id = $1 AND b.status != 'cancelled'
-            ORDER BY b.created_at DESC
-        """, telegram_id)
-        return [{
-            "id": r["id"], 
-            "hotel_name": r["hotel_name"], 
-            "room_category": r["room_category"],
-            "check_in": r["check_in"],
-            "check_out": r["check_out"],
-            "status": r["status"]
-        } for r in rows]
-
-async def create_booking(telegram_id: int, hotel_id: int, room_category_id: int, check_in: str, check_out: str):
-    pool = await _ensure_pool()
+            WHERE {" AND ".join(conditions)}
+            ORDER BY b.created_at {order}, b.id {order}
+            {limit_sql}
+        """, *args)
+    if order == "ASC":
+        rows = list(reversed(rows))
+    return [{
+        "id": r["id"], 
+        "hotel_name": r["hotel_name"], 
+        "room_category": r["room_category"],
+        "check_in": r["check_in"],
+        "check_out": r["check_out"],
+        "status": r["status"],
+        "created_at": r["created_at"]
+    } for r in rows]
+
+# Результаты create_booking и update_booking_status
+BOOKING_CREATED = "created"
+BOOKING_UPDATED = "updated"
+BOOKING_OVERLAP = "overlap"
+BOOKING_SOLD_OUT = "sold_out"
+
+class _SoldOut(Exception):
+    """Внутренний сигнал для отката транзакции create_booking / update_booking_status"""
+
+# Занимает (delta=1) или освобождает (delta=-1) номер категории на каждую ночь [check_in, check_out).
+# Возвращает число ночей, на которых после изменения занято больше номеров, чем есть в категории.
+_ALLOCATE_NIGHTS_SQL = _hot("""
+    WITH alloc AS (
+        INSERT INTO room_nights (room_category_id, night, booked)
+        SELECT $1, d::date, GREATEST($4, 0)
+        FROM generate_series($2::date, $3::date - 1, interval '1 day') d
+        ON CONFLICT (room_category_id, night) DO UPDATE SET booked = room_nights.booked + $4
+        RETURNING booked
+    )
+    SELECT count(*) FROM alloc
+    WHERE booked > (SELECT rooms_total FROM room_categories WHERE id = $1)
+""")
+
+_CREATE_BOOKING_SQL = _hot("""
+    INSERT INTO bookings (telegram_id, hotel_id, room_category_id, check_in, check_out)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING id
+""")
+
+async def create_booking(telegram_id: int, hotel_id: int, room_category_id: int, check_in: str, check_out: str,
+                         notification: dict = None):
+    """
+    Создаёт бронирование, если у пользователя нет активной брони на пересекающиеся даты
+    и в категории есть свободный номер на каждую ночь.
+    Обе проверки выполняются в одной транзакции со вставкой: пересечения запрещает ограничение
+    bookings_no_overlap, а счётчики room_nights блокируются построчно при резервировании.
+    notification ({"chat_id", "text", "parse_mode"}) записывается в outbox в той же транзакции.
+    Возвращает {"status": BOOKING_CREATED, "id": ...}, {"status": BOOKING_OVERLAP}
+    или {"status": BOOKING_SOLD_OUT}.
+    """
     check_in_date = date.fromisoformat(check_in)
     check_out_date = date.fromisoformat(check_out)
-    
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO bookings (telegram_id, hotel_id, room_category_id, check_in, check_out)
-            VALUES ($1, $2, $3, $4, $5)
-        """, telegram_id, hotel_id, room_category_id, check_in_date, check_out_date)
+    if check_in_date >= check_out_date:
+        raise ValueError("дата заезда должна быть раньше даты выезда")
 
-async def has_overlapping_booking(telegram_id: int, new_check_in: str, new_check_out: str):
-    """Проверяет, есть ли у пользователя бронирования, пересекающиеся с новыми датами"""
-    pool = await _ensure_pool()
-    new_check_in_date = date.fromisoformat(new_check_in)
-    new_check_out_date = date.fromisoformat(new_check_out)
-    
-    async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT check_in, check_out FROM bookings WHERE telegram_id = $1 AND status != 'cancelled'",
-            telegram_id
-        )
-        
-        for row in rows:
-            existing_check_in = row["check_in"]
-            existing_check_out = row["check_out"]
-            
-            # Проверяем пересечение:
-            # Новый заезд < выезда_существующего И выезд_новый > заезда_существующего
-            if new_check_in_date < existing_check_out and new_check_out_date > existing_check_in:
-                return True  # Найдено пересечение
-    return False 
+    async with _connection("create_booking") as conn:
+        try:
+            async with conn.transaction():
+                booking_id = await conn.fetchval(
+                    _CREATE_BOOKING_SQL, telegram_id, hotel_id, room_category_id, check_in_date, check_out_date,
+                    name="create_booking.insert"
+                )
+                overbooked = await conn.fetchval(
+                    _ALLOCATE_NIGHTS_SQL, room_category_id, check_in_date, check_out_date, 1,
+                    name="create_booking.allocate_nights"
+                )
+                if overbooked:
+                    raise _SoldOut()
+                if notification is not None:
+                    await _insert_notification(conn, notification)
+        except asyncpg.exceptions.ExclusionViolationError:
+            return {"status": BOOKING_OVERLAP}
+        except _SoldOut:
+            return {"status": BOOKING_SOLD_OUT}
+    return {"status": BOOKING_CREATED, "id": booking_id}
+
+_AVAILABLE_CATEGORIES_SQL = _hot("""
+    SELECT rc.id, rc.hotel_id
+    FROM room_categories rc
+    WHERE ($3::int IS NULL OR rc.hotel_id = $3)
+      AND (rc.rooms_total IS NULL OR NOT EXISTS (
+            SELECT 1 FROM room_nights rn
+            WHERE rn.room_category_id = rc.id
+              AND rn.night >= $1 AND rn.night < $2
+              AND rn.booked >= rc.rooms_total
+      ))
+    ORDER BY rc.hotel_id, rc.id
+""", readonly=True)
+
+async def get_available_categories(check_in: str, check_out: str, hotel_id: int = None):
+    """
+    Категории ({"id", "hotel_id"}), в которых есть свободный номер на каждую ночь [check_in, check_out).
+    Если hotel_id не задан — по всему каталогу, одним запросом по первичному ключу room_nights.
+    """
+    check_in_date = date.fromisoformat(check_in)
+    check_out_date = date.fromisoformat(check_out)
+    if check_in_date >= check_out_date:
+        raise ValueError("дата заезда должна быть раньше даты выезда")
+
+    async with _connection("get_available_categories", readonly=True) as conn:
+        rows = await conn.fetch(_AVAILABLE_CATEGORIES_SQL, check_in_date, check_out_date, hotel_id)
+    return [{"id": r["id"], "hotel_id": r["hotel_id"]} for r in rows]
+
+async def get_available_category_ids(check_in: str, check_out: str, hotel_id: int = None):
+    return {c["id"] for c in await get_available_categories(check_in, check_out, hotel_id)}
+
+_USER_BOOKING_SQL = _hot("""
+    SELECT b.id, h.name as hotel_name, rc.name as room_category,
+           b.check_in, b.check_out, b.status
+    FROM bookings b
+    JOIN hotels h ON b.hotel_id = h.id
+    JOIN room_categories rc ON b.room_category_id = rc.id
+    WHERE b.id = $1 AND b.telegram_id = $2
+""", readonly=True)
 
 async def get_user_booking_by_id(booking_id: int, telegram_id: int):
     """Получить конкретное бронирование пользователя по ID"""
-    pool = await _ensure_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow("""
-            SELECT b.id, h.name as hotel_name, rc.name as room_category, 
-                   b.check_in, b.check_out, b.status
-            FROM bookings b
-            JOIN hotels h ON b.hotel_id = h.id
-            JOIN room_categories rc ON b.room_category_id = rc.id
-            WHERE b.id = $1 AND b.telegram_id = $2
-        """, booking_id, telegram_id)
+    async with _connection("get_user_booking_by_id", readonly=True) as conn:
+        row = await conn.fetchrow(_USER_BOOKING_SQL, booking_id, telegram_id)
         
         return dict(row) if row else None
 
-async def update_booking_status(booking_id: int, status: str):
-    """Обновить статус бронирования"""
-    pool = await _ensure_pool()
-    async with pool.acquire() as conn:
+async def update_booking_status(booking_id: int, status: str, notification: dict = None):
+    """
+    Обновить статус бронирования (при отмене номера возвращаются в номерной фонд).
+    Возврат отменённой брони в активный статус снова занимает номера — с теми же проверками,
+    что и create_booking: свободный номер на каждую ночь и отсутствие пересечений у пользователя.
+    notification записывается в outbox в той же транзакции.
+    Возвращает None, если брони нет, иначе {"status": BOOKING_UPDATED}, {"status": BOOKING_OVERLAP}
+    или {"status": BOOKING_SOLD_OUT} (в последних двух случаях ничего не изменено).
+    """
+    async with _connection("update_booking_status") as conn:
+        try:
+            async with conn.transaction():
+                row = await conn.fetchrow(
+                    "SELECT status, room_category_id, check_in, check_out FROM bookings WHERE id = $1 FOR UPDATE",
+                    booking_id, name="update_booking_status.lock"
+                )
+                if row is None:
+                    return None
+                was_active = row["status"] != "cancelled"
+                is_active = status != "cancelled"
+                # Время и транзакция отмены — для инкрементальной статистики (refresh_booking_stats)
+                if was_active and not is_active:
+                    cancel_columns = ", cancelled_at = NOW(), cancelled_xid = pg_current_xact_id()"
+                elif is_active and not was_active:
+                    cancel_columns = ", cancelled_at = NULL, cancelled_xid = NULL"
+                else:
+                    cancel_columns = ""
+                await conn.execute(
+                    f"UPDATE bookings SET status = $1{cancel_columns} WHERE id = $2",
+                    status, booking_id, name="update_booking_status.update"
+                )
+                if was_active != is_active and row["room_category_id"] is not None and row["check_in"] < row["check_out"]:
+                    overbooked = await conn.fetchval(
+                        _ALLOCATE_NIGHTS_SQL, row["room_category_id"], row["check_in"], row["check_out"],
+                        1 if is_active else -1, name="update_booking_status.allocate_nights"
+                    )
+                    if overbooked and is_active:
+                        raise _SoldOut()
+                if notification is not None:
+                    await _insert_notification(conn, notification)
+        except asyncpg.exceptions.ExclusionViolationError:
+            return {"status": BOOKING_OVERLAP}
+        except _SoldOut:
+            return {"status": BOOKING_SOLD_OUT}
+    return {"status": BOOKING_UPDATED}
+
+# === OUTBOX УВЕДОМЛЕНИЙ ===
+# Уведомления пишутся в таблицу outbox, доставляет их фоновый диспетчер (outbox.py)
+
+async def _insert_notification(conn, notification: dict):
+    await conn.execute(
+        "INSERT INTO outbox (chat_id, text, parse_mode) VALUES ($1, $2, $3)",
+        notification["chat_id"], notification["text"], notification.get("parse_mode"),
+        name="outbox.insert"
+    )
+
+async def enqueue_notification(chat_id: int, text: str, parse_mode: str = None):
+    """Поставить уведомление в outbox вне какой-либо транзакции"""
+    async with _connection("enqueue_notification") as conn:
+        await _insert_notification(conn, {"chat_id": chat_id, "text": text, "parse_mode": parse_mode})
+
+async def claim_outbox_batch(limit: int, lease_seconds: int):
+    """
+    Забирает до limit готовых к отправке уведомлений. Строки "арендуются": next_attempt_at
+    сдвигается на lease_seconds, поэтому другие воркеры их не возьмут, а при падении
+    процесса уведомления вернутся в очередь сами.
+    """
+    async with _connection("claim_outbox_batch", pin=False) as conn:
+        rows = await conn.fetch("""
+            UPDATE outbox o
+            SET attempts = o.attempts + 1,
+                next_attempt_at = NOW() + make_interval(secs => $2)
+            FROM (
+                SELECT id FROM outbox
+                WHERE sent_at IS NULL AND failed_at IS NULL AND next_attempt_at <= NOW()
+                ORDER BY next_attempt_at, id
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            ) batch
+            WHERE o.id = batch.id
+            RETURNING o.id, o.chat_id, o.text, o.parse_mode, o.attempts
+        """, limit, lease_seconds)
+    return sorted((dict(r) for r in rows), key=lambda r: r["id"])
+
+async def mark_outbox_sent(ids: List[int]):
+    async with _connection("mark_outbox_sent", pin=False) as conn:
+        await conn.execute("UPDATE outbox SET sent_at = NOW(), last_error = NULL WHERE id = ANY($1::bigint[])", ids)
+
+async def mark_outbox_retry(ids: List[int], error: str, max_attempts: int, backoff_seconds: int):
+    """Откладывает повторную отправку (экспоненциально) или помечает уведомление неотправляемым"""
+    async with _connection("mark_outbox_retry", pin=False) as conn:
+        await conn.execute("""
+            UPDATE outbox
+            SET last_error = $2,
+                failed_at = CASE WHEN attempts >= $3 THEN NOW() END,
+                next_attempt_at = NOW() + make_interval(secs => LEAST($4 * power(2, attempts - 1), 3600))
+            WHERE id = ANY($1::bigint[])
+        """, ids, error, max_attempts, backoff_seconds)
+
+# === СОСТОЯНИЯ FSM (см. fsm_storage.py) ===
+
+_FSM_RECORD_SQL = _hot("""
+    SELECT state, data::text AS data FROM fsm_states
+    WHERE key = $1 AND updated_at > NOW() - make_interval(secs => $2)
+""")
+
+async def get_fsm_record(key: str, ttl_seconds: int):
+    """Состояние и данные FSM по ключу; записи старше ttl_seconds считаются брошенными"""
+    async with _connection("get_fsm_record", pin=False) as conn:
+        row = await conn.fetchrow(_FSM_RECORD_SQL, key, ttl_seconds)
+    if row is None:
+        return None
+    return {"state": row["state"], "data": json.loads(row["data"])}
+
+async def save_fsm_records(records: List[Dict[str, Any]]):
+    """
+    Пакетно сохраняет записи {"key", "state", "data"}: пустые (без состояния и данных)
+    удаляются, остальные вставляются или обновляются. Всё в одной транзакции.
+    """
+    upserts = [(r["key"], r["state"], json.dumps(r["data"], ensure_ascii=False)) for r in records if r["state"] or r["data"]]
+    deletes = [r["key"] for r in records if not (r["state"] or r["data"])]
+    async with _connection("save_fsm_records", pin=False) as conn:
+        async with conn.transaction():
+            if upserts:
+                await conn.executemany("""
+                    INSERT INTO fsm_states (key, state, data, updated_at)
+                    VALUES ($1, $2, $3::jsonb, NOW())
+                    ON CONFLICT (key) DO UPDATE
+                    SET state = EXCLUDED.state, data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+                """, upserts, name="save_fsm_records.upsert")
+            if deletes:
+                await conn.execute("DELETE FROM fsm_states WHERE key = ANY($1::text[])", deletes,
+                                   name="save_fsm_records.delete")
+
+async def delete_expired_fsm_records(ttl_seconds: int) -> int:
+    async with _connection("delete_expired_fsm_records", pin=False) as conn:
+        result = await conn.execute(
+            "DELETE FROM fsm_states WHERE updated_at <= NOW() - make_interval(secs => $1)", ttl_seconds
+        )
+    return int(result.split()[-1])
+
+# === РЕЕСТР МЕДИАФАЙЛОВ (file_id Telegram) ===
+
+async def get_media_file_ids(bot_id: int) -> Dict[tuple, str]:
+    """Все известные file_id бота: {(path, sha256): file_id}"""
+    async with _connection("get_media_file_ids", readonly=True) as conn:
+        rows = await conn.fetch("SELECT path, sha256, file_id FROM media_files WHERE bot_id = $1", bot_id)
+    return {(r["path"], r["sha256"]): r["file_id"] for r in rows}
+
+async def save_media_file_id(bot_id: int, path: str, sha256: str, file_id: str, file_unique_id: str = None):
+    async with _connection("save_media_file_id") as conn:
+        await conn.execute("""
+            INSERT INTO media_files (bot_id, path, sha256, file_id, file_unique_id)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (bot_id, path, sha256) DO UPDATE
+            SET file_id = EXCLUDED.file_id, file_unique_id = EXCLUDED.file_unique_id, uploaded_at = NOW()
+        """, bot_id, path, sha256, file_id, file_unique_id)
+
+async def delete_media_file_id(bot_id: int, path: str, sha256: str):
+    async with _connection("delete_media_file_id") as conn:
         await conn.execute(
-            "UPDATE bookings SET status = $1 WHERE id = $2",
-            status, booking_id
-        )   
\ No newline at end of file
+            "DELETE FROM media_files WHERE bot_id = $1 AND path = $2 AND sha256 = $3", bot_id, path, sha256
+        )
+
+async def get_hotel_photos(hotel_id: int):
+    async with _connection("get_hotel_photos", readonly=True) as conn:
+        rows = await conn.fetch(
+            "SELECT path, caption FROM hotel_photos WHERE hotel_id = $1 ORDER BY position, id", hotel_id
+        )
+    return [{"path": r["path"], "caption": r["caption"]} for r in rows]
+
+async def get_all_hotel_photo_paths() -> List[str]:
+    async with _connection("get_all_hotel_photo_paths", readonly=True) as conn:
+        rows = await conn.fetch("SELECT DISTINCT path FROM hotel_photos")
+    return [r["path"] for r in rows]
+
+# === МАССОВЫЙ ИМПОРТ КАТАЛОГА И БРОНЕЙ (см. catalog_import.py) ===
+# Строки копируются бинарным COPY во временные staging-таблицы, а затем переносятся
+# в рабочие таблицы несколькими set-based запросами. Гостиницы сопоставляются по name,
+# категории — по (гостиница, name); пустые поля импорта не затирают существующие значения.
+
+# Ключ advisory-блокировки: два импорта одновременно не создадут одну гостиницу дважды
+CATALOG_IMPORT_LOCK_ID = 7_260_002
+
+class _ImportRollback(Exception):
+    """Внутренний сигнал для отката транзакции импорта (dry run или strict с ошибками)"""
+
+async def import_catalog(hotels: List[tuple], categories: List[tuple], bookings: List[tuple],
+                         dry_run: bool = False, strict: bool = False) -> Dict[str, Any]:
+    """
+    Импортирует уже проверенные строки:
+      hotels     — (row, name, description, address)
+      categories — (row, hotel, name, description, price, rooms_total)
+      bookings   — (row, telegram_id, hotel, category, check_in, check_out, status, created_at, ref)
+    Строки, которые не прошли проверки в БД (нет гостиницы, пересечение дат и т.п.), пропускаются
+    и попадают в errors. При dry_run или strict с ошибками транзакция откатывается.
+    """
+    result = {
+        "hotels": {"inserted": 0, "updated": 0},
+        "categories": {"inserted": 0, "updated": 0},
+        "bookings": {"inserted": 0, "skipped": 0},
+        "errors": [],
+        "committed": False,
+    }
+
+    def add_errors(kind, rows, message):
+        result["errors"].extend({"kind": kind, "row": r["row_num"], "error": message} for r in rows)
+
+    async with _connection("import_catalog") as conn:
+        try:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", CATALOG_IMPORT_LOCK_ID)
+                await conn.execute("""
+                    CREATE TEMP TABLE import_hotels (
+                        row_num INTEGER, name TEXT, description TEXT, address TEXT
+                    ) ON COMMIT DROP;
+                    CREATE TEMP TABLE import_categories (
+                        row_num INTEGER, hotel TEXT, name TEXT, description TEXT, price NUMERIC(10,2), rooms_total INTEGER
+                    ) ON COMMIT DROP;
+                    CREATE TEMP TABLE import_bookings (
+                        row_num INTEGER, telegram_id BIGINT, hotel TEXT, category TEXT, check_in DATE, check_out DATE,
+                        status TEXT, created_at TIMESTAMP, ref TEXT, room_category_id INTEGER, hotel_id INTEGER
+                    ) ON COMMIT DROP;
+                """, name="import_catalog.staging")
+                if hotels:
+                    await conn.copy_records_to_table(
+                        "import_hotels", records=hotels, columns=["row_num", "name", "description", "address"]
+                    )
+                if categories:
+                    await conn.copy_records_to_table(
+                        "import_categories", records=categories,
+                        columns=["row_num", "hotel", "name", "description", "price", "rooms_total"]
+                    )
+                if bookings:
+                    await conn.copy_records_to_table(
+                        "import_bookings", records=bookings,
+                        columns=["row_num", "telegram_id", "hotel", "category", "check_in", "check_out",
+                                 "status", "created_at", "ref"]
+                    )
+
+                # --- Гостиницы ---
+                if hotels:
+                    status = await conn.execute("""
+                        UPDATE hotels h
+                        SET description = COALESCE(s.description, h.description),
+                            address = COALESCE(s.address, h.address)
+                        FROM import_hotels s
+                        WHERE h.name = s.name
+                          AND (h.description, h.address) IS DISTINCT FROM
+                              (COALESCE(s.description, h.description), COALESCE(s.address, h.address))
+                    """, name="import_catalog.hotels_update")
+                    result["hotels"]["updated"] = int(status.split()[-1])
+                    status = await conn.execute("""
+                        INSERT INTO hotels (name, description, address)
+                        SELECT s.name, s.description, s.address FROM import_hotels s
+                        WHERE NOT EXISTS (SELECT 1 FROM hotels h WHERE h.name = s.name)
+                        ORDER BY s.row_num
+                    """, name="import_catalog.hotels_insert")
+                    result["hotels"]["inserted"] = int(status.split()[-1])
+
+                # --- Категории ---
+                if categories:
+                    add_errors("categories", await conn.fetch("""
+                        DELETE FROM import_categories s
+                        WHERE NOT EXISTS (SELECT 1 FROM hotels h WHERE h.name = s.hotel)
+                        RETURNING row_num
+                    """, name="import_catalog.categories_check"), "гостиница не найдена")
+                    status = await conn.execute("""
+                        UPDATE room_categories rc
+                        SET description = COALESCE(s.description, rc.description),
+                            price = COALESCE(s.price, rc.price),
+                            rooms_total = COALESCE(s.rooms_total, rc.rooms_total)
+                        FROM import_categories s
+                        JOIN hotels h ON h.name = s.hotel
+                        WHERE rc.hotel_id = h.id AND rc.name = s.name
+                          AND (rc.description, rc.price, rc.rooms_total) IS DISTINCT FROM
+                              (COALESCE(s.description, rc.description), COALESCE(s.price, rc.price),
+                               COALESCE(s.rooms_total, rc.rooms_total))
+                    """, name="import_catalog.categories_update")
+                    result["categories"]["updated"] = int(status.split()[-1])
+                    status = await conn.execute("""
+                        INSERT INTO room_categories (hotel_id, name, description, price, rooms_total)
+                        SELECT h.id, s.name, s.description, s.price, s.rooms_total
+                        FROM import_categories s
+                        JOIN hotels h ON h.name = s.hotel
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM room_categories rc WHERE rc.hotel_id = h.id AND rc.name = s.name
+                        )
+                        ORDER BY s.row_num
+                    """, name="import_catalog.categories_insert")
+                    result["categories"]["inserted"] = int(status.split()[-1])
+
+                # --- Брони ---
+                if bookings:
+                    await conn.execute("""
+                        UPDATE import_bookings s
+                        SET hotel_id = h.id, room_category_id = rc.id
+                        FROM hotels h
+                        JOIN room_categories rc ON rc.hotel_id = h.id
+                        WHERE h.name = s.hotel AND rc.name = s.category
+                    """, name="import_catalog.bookings_resolve")
+                    add_errors("bookings", await conn.fetch("""
+                        DELETE FROM import_bookings WHERE room_category_id IS NULL RETURNING row_num
+                    """, name="import_catalog.bookings_check"), "гостиница или категория не найдена")
+                    skipped = await conn.fetch("""
+                        DELETE FROM import_bookings s
+                        WHERE s.ref IS NOT NULL AND EXISTS (SELECT 1 FROM bookings b WHERE b.import_ref = s.ref)
+                        RETURNING row_num
+                    """, name="import_catalog.bookings_skip_imported")
+                    result["bookings"]["skipped"] = len(skipped)
+                    add_errors("bookings", await conn.fetch("""
+                        DELETE FROM import_bookings s
+                        WHERE s.status <> 'cancelled' AND (
+                            EXISTS (
+                                SELECT 1 FROM bookings b
+                                WHERE b.telegram_id = s.telegram_id AND b.status <> 'cancelled'
+                                  AND daterange(b.check_in, b.check_out) && daterange(s.check_in, s.check_out)
+                            )
+                            OR EXISTS (
+                                SELECT 1 FROM import_bookings o
+                                WHERE o.telegram_id = s.telegram_id AND o.status <> 'cancelled' AND o.row_num < s.row_num
+                                  AND daterange(o.check_in, o.check_out) && daterange(s.check_in, s.check_out)
+                            )
+                        )
+                        RETURNING row_num
+                    """, name="import_catalog.bookings_overlap"), "пересекается с другой активной бронью пользователя")
+                    # Вставка и учёт занятых ночей (как в create_booking) одним запросом
+                    result["bookings"]["inserted"] = await conn.fetchval("""
+                        WITH inserted AS (
+                            INSERT INTO bookings (telegram_id, hotel_id, room_category_id, check_in, check_out,
+                                                  status, created_at, import_ref)
+                            SELECT telegram_id, hotel_id, room_category_id, check_in, check_out,
+                                   status, COALESCE(created_at, NOW()), ref
+                            FROM import_bookings
+                            ORDER BY row_num
+                            RETURNING room_category_id, check_in, check_out, status
+                        ), nights AS (
+                            INSERT INTO room_nights (room_category_id, night, booked)
+                            SELECT i.room_category_id, d::date, count(*)
+                            FROM inserted i
+                            CROSS JOIN generate_series(i.check_in, i.check_out - 1, interval '1 day') d
+                            WHERE i.status <> 'cancelled'
+                            GROUP BY 1, 2
+                            ON CONFLICT (room_category_id, night) DO UPDATE SET booked = room_nights.booked + EXCLUDED.booked
+                        )
+                        SELECT count(*) FROM inserted
+                    """, name="import_catalog.bookings_insert")
+
+                if dry_run or (strict and result["errors"]):
+                    raise _ImportRollback()
+                result["committed"] = True
+        except _ImportRollback:
+            pass
+
+    result["errors"].sort(key=lambda e: (e["kind"], e["row"]))
+    return result
+
+# === ВЫГРУЗКА БРОНЕЙ (потоковая) ===
+
+async def iter_bookings_export(hotel_id: int = None, status: str = None, date_from: date = None, date_to: date = None,
+                               chunk_size: int = 1000):
+    """
+    Брони с гостиницей и категорией пачками по chunk_size строк через серверный курсор:
+    в памяти одновременно только одна пачка, сколько бы строк ни было.
+    Фильтры: гостиница, статус, дата заезда в [date_from, date_to].
+    Соединение занято, пока выгрузка не прочитана до конца (или генератор не закрыт).
+    """
+    conditions, args = [], []
+    for condition, value in (
+        ("b.hotel_id = ${}", hotel_id),
+        ("b.status = ${}", status),
+        ("b.check_in >= ${}", date_from),
+        ("b.check_in <= ${}", date_to),
+    ):
+        if value is not None:
+            args.append(value)
+            conditions.append(condition.format(len(args)))
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    async with _connection("iter_bookings_export", readonly=True) as conn:
+        # Курсор живёт только внутри транзакции; repeatable read — согласованный снимок на всю выгрузку
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            started = time.perf_counter()
+            total = 0
+            cursor = await conn.cursor(f"""
+                SELECT b.id, b.telegram_id, b.hotel_id, h.name AS hotel_name,
+                       b.room_category_id, rc.name AS room_category, rc.price,
+                       b.check_in, b.check_out, b.status, b.created_at
+                FROM bookings b
+                LEFT JOIN hotels h ON h.id = b.hotel_id
+                LEFT JOIN room_categories rc ON rc.id = b.room_category_id
+                {where}
+                ORDER BY b.id
+            """, *args)
+            try:
+                while True:
+                    rows = await cursor.fetch(chunk_size)
+                    if not rows:
+                        break
+                    total += len(rows)
+                    yield rows
+            finally:
+                # Курсор не проходит через обёртку db_stats, учитываем выгрузку целиком
+                db_stats.record_query("iter_bookings_export", time.perf_counter() - started, total)
+
+# === СТАТИСТИКА ЗАГРУЗКИ И СПРОСА (см. booking_stats.py) ===
+# Заявки и отмены копятся в booking_stats_daily, загрузка по ночам — в room_nights.
+# Отчёты читают только эти таблицы, а не всю историю bookings
+
+BOOKING_STATS_WATERMARK = "booking_stats"
+
+async def refresh_booking_stats():
+    """
+    Дописывает в booking_stats_daily заявки и отмены из транзакций, завершившихся после
+    прошлого обновления (окно [водяной знак, xmin текущего снимка)). Транзакции новее xmin
+    могут быть ещё не закоммичены — они попадут в следующее окно.
+    Если обновление уже идёт в другом соединении, возвращает None, иначе
+    {"requests": ..., "cancellations": ...} — сколько броней учтено.
+    """
+    async with _connection("refresh_booking_stats") as conn:
+        async with conn.transaction():
+            since = await conn.fetchval(
+                "SELECT low_xid::text::bigint FROM stats_watermarks WHERE name = $1 FOR UPDATE SKIP LOCKED",
+                BOOKING_STATS_WATERMARK, name="refresh_booking_stats.lock"
+            )
+            if since is None:
+                return None
+            until = await conn.fetchval(
+                "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint", name="refresh_booking_stats.horizon"
+            )
+            requests = await conn.fetchval("""
+                WITH agg AS (
+                    SELECT room_category_id, created_at::date AS day, count(*) AS requests,
+                           sum(GREATEST(check_out - check_in, 0)) AS requested_nights,
+                           -- брони, созданные сразу отменёнными (импорт), отменой не помечены
+                           count(*) FILTER (WHERE status = 'cancelled' AND cancelled_xid IS NULL) AS cancellations
+                    FROM bookings
+                    WHERE created_xid >= $1::xid8 AND created_xid < $2::xid8 AND room_category_id IS NOT NULL
+                    GROUP BY 1, 2
+                ), ins AS (
+                    INSERT INTO booking_stats_daily AS s (room_category_id, day, requests, requested_nights, cancellations)
+                    SELECT room_category_id, day, requests, requested_nights, cancellations FROM agg
+                    ON CONFLICT (room_category_id, day) DO UPDATE
+                    SET requests = s.requests + EXCLUDED.requests,
+                        requested_nights = s.requested_nights + EXCLUDED.requested_nights,
+                        cancellations = s.cancellations + EXCLUDED.cancellations
+                )
+                SELECT COALESCE(sum(requests), 0) FROM agg
+            """, since, until, name="refresh_booking_stats.requests")
+            cancellations = await conn.fetchval("""
+                WITH agg AS (
+                    SELECT room_category_id, cancelled_at::date AS day, count(*) AS cancellations
+                    FROM bookings
+                    WHERE cancelled_xid >= $1::xid8 AND cancelled_xid < $2::xid8 AND room_category_id IS NOT NULL
+                    GROUP BY 1, 2
+                ), ins AS (
+                    INSERT INTO booking_stats_daily AS s (room_category_id, day, cancellations)
+                    SELECT room_category_id, day, cancellations FROM agg
+                    ON CONFLICT (room_category_id, day) DO UPDATE
+                    SET cancellations = s.cancellations + EXCLUDED.cancellations
+                )
+                SELECT COALESCE(sum(cancellations), 0) FROM agg
+            """, since, until, name="refresh_booking_stats.cancellations")
+            await conn.execute(
+                "UPDATE stats_watermarks SET low_xid = $2::xid8, refreshed_at = NOW() WHERE name = $1",
+                BOOKING_STATS_WATERMARK, until, name="refresh_booking_stats.advance"
+            )
+    return {"requests": int(requests), "cancellations": int(cancellations)}
+
+async def get_booking_stats_refreshed_at():
+    """Время последнего обновления booking_stats_daily"""
+    async with _connection("get_booking_stats_refreshed_at", readonly=True) as conn:
+        return await conn.fetchval(
+            "SELECT refreshed_at FROM stats_watermarks WHERE name = $1", BOOKING_STATS_WATERMARK
+        )
+
+async def get_demand_stats(date_from: date, date_to: date, hotel_id: int = None):
+    """Заявки, запрошенные ночи и отмены по категориям и дням в [date_from, date_to]"""
+    async with _connection("get_demand_stats", readonly=True) as conn:
+        rows = await conn.fetch("""
+            SELECT h.id AS hotel_id, h.name AS hotel_name, rc.id AS room_category_id, rc.name AS room_category,
+                   s.day, s.requests, s.requested_nights, s.cancellations
+            FROM booking_stats_daily s
+            JOIN room_categories rc ON rc.id = s.room_category_id
+            JOIN hotels h ON h.id = rc.hotel_id
+            WHERE s.day BETWEEN $1 AND $2 AND ($3::int IS NULL OR rc.hotel_id = $3)
+            ORDER BY h.name, rc.name, s.day
+        """, date_from, date_to, hotel_id)
+        return [dict(r) for r in rows]
+
+async def get_occupancy_stats(date_from: date, date_to: date, hotel_id: int = None):
+    """
+    Загрузка по категориям и ночам в [date_from, date_to]: booked — занято номеров (из room_nights),
+    rooms_total — всего номеров (None — без ограничений), occupancy — доля от 0 до 1 или None
+    """
+    async with _connection("get_occupancy_stats", readonly=True) as conn:
+        rows = await conn.fetch("""
+            SELECT h.id AS hotel_id, h.name AS hotel_name, rc.id AS room_category_id, rc.name AS room_category,
+                   n.night::date AS night, COALESCE(rn.booked, 0) AS booked, rc.rooms_total
+            FROM room_categories rc
+            JOIN hotels h ON h.id = rc.hotel_id
+            CROSS JOIN generate_series($1::date, $2::date, interval '1 day') n(night)
+            LEFT JOIN room_nights rn ON rn.room_category_id = rc.id AND rn.night = n.night::date
+            WHERE ($3::int IS NULL OR rc.hotel_id = $3)
+            ORDER BY h.name, rc.name, n.night
+        """, date_from, date_to, hotel_id)
+        result = []
+        for r in rows:
+            item = dict(r)
+            item["occupancy"] = (
+                round(r["booked"] / r["rooms_total"], 4) if r["rooms_total"] else None
+            )
+            result.append(item)
+        return result
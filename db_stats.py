@@ -0,0 +1,181 @@
+# === МОДУЛЬ СТАТИСТИКИ ЗАПРОСОВ К БД ===
+#
+# Все запросы database.py идут через InstrumentedConnection (см. database._connection):
+# по имени запроса копятся число вызовов, ошибки, время и число строк, отдельно —
+# ожидание свободного соединения и заполненность пула. То же уходит в метрики Prometheus.
+# Запросы дольше DB_SLOW_QUERY_MS пишутся в лог вместе с "формой" параметров
+# (типы и размеры, без значений — в параметрах бывают персональные данные).
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+import metrics
+from config import DB_SLOW_QUERY_MS
+
+# name -> {"calls", "errors", "total_time", "max_time", "rows"}
+_queries: Dict[str, Dict[str, Any]] = {}
+# Счётчик запросов текущей операции (см. track_queries), наследуется вложенными задачами
+_tracked: ContextVar[Optional[Dict[str, int]]] = ContextVar("db_tracked_queries", default=None)
+_pool = {"acquires": 0, "wait_total": 0.0, "wait_max": 0.0, "waiting": 0, "size": 0, "idle": 0, "max_size": 0}
+
+
+def _param_shape(args) -> str:
+    parts = []
+    for arg in args:
+        if arg is None:
+            parts.append("None")
+        elif isinstance(arg, (list, tuple, set, dict, str, bytes)):
+            parts.append(f"{type(arg).__name__}[{len(arg)}]")
+        else:
+            parts.append(type(arg).__name__)
+    return "(" + ", ".join(parts) + ")"
+
+
+def _count_rows(method: str, result, args) -> int:
+    if method == "fetch":
+        return len(result)
+    if method in ("fetchrow", "fetchval"):
+        return 0 if result is None else 1
+    if method == "executemany":
+        return len(args[0]) if args else 0
+    # execute возвращает статус вида "UPDATE 3" / "INSERT 0 1"
+    try:
+        return int(str(result).split()[-1])
+    except (ValueError, IndexError):
+        return 0
+
+
+def record_query(name: str, duration: float, rows: int, error: Exception = None, query: str = None, args=()):
+    stats = _queries.get(name)
+    if stats is None:
+        stats = _queries[name] = {"calls": 0, "errors": 0, "total_time": 0.0, "max_time": 0.0, "rows": 0}
+    stats["calls"] += 1
+    tracked = _tracked.get()
+    if tracked is not None:
+        tracked[name] = tracked.get(name, 0) + 1
+    stats["total_time"] += duration
+    stats["max_time"] = max(stats["max_time"], duration)
+    stats["rows"] += rows
+    metrics.DB_QUERY_DURATION.labels(name).observe(duration)
+    metrics.DB_QUERY_ROWS.labels(name).inc(rows)
+    if error is not None:
+        stats["errors"] += 1
+        metrics.DB_QUERY_ERRORS.labels(name, type(error).__name__).inc()
+
+    if DB_SLOW_QUERY_MS and duration * 1000 >= DB_SLOW_QUERY_MS:
+        first_line = " ".join((query or "").split())[:200]
+        logging.warning(
+            f"db_stats.py: медленный запрос {name}: {duration * 1000:.1f} мс, строк {rows}, "
+            f"параметры {_param_shape(args)}: {first_line}"
+        )
+
+
+# === ПУЛ СОЕДИНЕНИЙ ===
+
+def acquire_started():
+    _pool["waiting"] += 1
+    metrics.DB_POOL_WAITING.set(_pool["waiting"])
+
+
+def acquire_finished(pool, wait: float):
+    _pool["waiting"] -= 1
+    _pool["acquires"] += 1
+    _pool["wait_total"] += wait
+    _pool["wait_max"] = max(_pool["wait_max"], wait)
+    metrics.DB_POOL_WAITING.set(_pool["waiting"])
+    metrics.DB_POOL_ACQUIRE_WAIT.observe(wait)
+    observe_pool(pool)
+
+
+def observe_pool(pool):
+    _pool["size"] = pool.get_size()
+    _pool["idle"] = pool.get_idle_size()
+    _pool["max_size"] = pool.get_max_size()
+    metrics.DB_POOL_CONNECTIONS.labels("used").set(_pool["size"] - _pool["idle"])
+    metrics.DB_POOL_CONNECTIONS.labels("idle").set(_pool["idle"])
+    metrics.DB_POOL_CONNECTIONS.labels("max").set(_pool["max_size"])
+    metrics.DB_POOL_SATURATION.set(
+        (_pool["size"] - _pool["idle"]) / _pool["max_size"] if _pool["max_size"] else 0.0
+    )
+
+
+def get_query_stats() -> Dict[str, Any]:
+    """
+    Снимок статистики: {"queries": {name: {...}}, "pool": {...}}.
+    Запросы отсортированы по суммарному времени — сверху те, что сильнее всего нагружают БД.
+    """
+    queries = {}
+    for name, stats in sorted(_queries.items(), key=lambda item: item[1]["total_time"], reverse=True):
+        queries[name] = {
+            **stats,
+            "avg_time": stats["total_time"] / stats["calls"] if stats["calls"] else 0.0,
+        }
+    pool = dict(_pool)
+    pool["avg_wait"] = pool["wait_total"] / pool["acquires"] if pool["acquires"] else 0.0
+    pool["saturation"] = (pool["size"] - pool["idle"]) / pool["max_size"] if pool["max_size"] else 0.0
+    return {"queries": queries, "pool": pool}
+
+
+@contextmanager
+def track_queries():
+    """
+    Считает запросы, выполненные внутри блока (в том же контексте): {name: число вызовов}.
+    Нужно, чтобы узнать, сколько запросов делает одно обновление бота или один API-запрос.
+    """
+    counts: Dict[str, int] = {}
+    token = _tracked.set(counts)
+    try:
+        yield counts
+    finally:
+        _tracked.reset(token)
+
+
+def reset_query_stats():
+    _queries.clear()
+    _pool.update(acquires=0, wait_total=0.0, wait_max=0.0)
+
+
+class InstrumentedConnection:
+    """
+    Обёртка над соединением asyncpg: fetch/fetchrow/fetchval/execute/executemany
+    учитываются в статистике. Остальное (transaction, cursor, ...) проксируется как есть.
+    """
+
+    def __init__(self, conn, name: str):
+        self._conn = conn
+        self.name = name
+
+    async def _run(self, method: str, query: str, args, name, kwargs):
+        started = time.perf_counter()
+        error = None
+        result = None
+        try:
+            result = await getattr(self._conn, method)(query, *args, **kwargs)
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            rows = 0 if error is not None else _count_rows(method, result, args)
+            record_query(name or self.name, time.perf_counter() - started, rows, error, query, args)
+
+    async def fetch(self, query: str, *args, name: str = None, **kwargs):
+        return await self._run("fetch", query, args, name, kwargs)
+
+    async def fetchrow(self, query: str, *args, name: str = None, **kwargs):
+        return await self._run("fetchrow", query, args, name, kwargs)
+
+    async def fetchval(self, query: str, *args, name: str = None, **kwargs):
+        return await self._run("fetchval", query, args, name, kwargs)
+
+    async def execute(self, query: str, *args, name: str = None, **kwargs):
+        return await self._run("execute", query, args, name, kwargs)
+
+    async def executemany(self, query: str, args, name: str = None, **kwargs):
+        return await self._run("executemany", query, (args,), name, kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._conn, attr)
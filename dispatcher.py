@@ -0,0 +1,112 @@
+# === МОДУЛЬ ДИСПЕТЧЕРА AIOGRAM ===
+# Общая сборка Dispatcher для polling (main.py) и webhook (fastapi_app.py)
+
+import logging
+
+from aiogram import BaseMiddleware, Bot, Dispatcher, Router
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import ErrorEvent
+
+from handlers.start import router as start_router
+from handlers.booking import router as booking_router
+from handlers.hotels import router as hotels_router
+from handlers.bookings import router as bookings_router
+from handlers.admin import router as admin_router
+from handlers.webapp import router as webapp_router
+import outbox
+import media
+import booking_stats
+from metrics import setup_dispatcher_metrics
+from throttling import setup_throttling
+from fsm_storage import PostgresStorage, create_fsm_storage
+from database import lookup_scope, unit_of_work
+
+# === ГЛОБАЛЬНЫЙ ОБРАБОТЧИК ОШИБОК AIORAM ===
+error_router = Router()
+
+@error_router.errors()
+async def error_handler(event: ErrorEvent):
+    logging.error(f"Произошла ошибка внутри обработчика aiogram: {event.exception}")
+
+# === ОБЛАСТЬ ПОИСКОВ ПО ID НА ОДНО ОБНОВЛЕНИЕ ===
+class LookupScopeMiddleware(BaseMiddleware):
+    """Повторные get_hotel_by_id / get_room_category_by_id в одном обновлении не ходят в БД"""
+    async def __call__(self, handler, event, data):
+        with lookup_scope():
+            return await handler(event, data)
+
+# === СОСТОЯНИЯ FSM НА ОДНО ОБНОВЛЕНИЕ ===
+class FSMScopeMiddleware(BaseMiddleware):
+    """
+    PostgresStorage читает форму из БД один раз за обновление и сохраняет изменения,
+    прежде чем обновление будет считаться обработанным
+    """
+    def __init__(self, storage: PostgresStorage):
+        self.storage = storage
+
+    async def __call__(self, handler, event, data):
+        async with self.storage.update_scope():
+            return await handler(event, data)
+
+# === ТРАНЗАКЦИЯ НА ОБРАБОТЧИК ===
+class UnitOfWorkMiddleware(BaseMiddleware):
+    """
+    Обработчик с flags={"transaction": True} выполняет все запросы через одно соединение
+    и в одной транзакции, которая фиксируется после обработчика (или раньше —
+    finish_unit_of_work()). Соединение берётся при первом запросе. Остальные обработчики
+    соединение на всё время работы не держат: каждый запрос берёт его из пула и сразу отдаёт,
+    поэтому вызовы Telegram и паузы лимитов пул не занимают.
+    """
+    async def __call__(self, handler, event, data):
+        if not get_flag(data, "transaction"):
+            return await handler(event, data)
+        async with unit_of_work(transaction=True):
+            return await handler(event, data)
+
+async def on_startup(bot: Bot):
+    # Доставка outbox живёт столько же, сколько диспетчер
+    await outbox.start(bot)
+    # Заранее загружаем картинки в Telegram, чтобы дальше отправлять их по file_id
+    media.start_prewarm(bot)
+    # Инкрементальное обновление агрегатов статистики
+    booking_stats.start()
+
+async def on_shutdown():
+    await booking_stats.stop()
+    await media.stop_prewarm()
+    await outbox.stop()
+
+def create_dispatcher() -> Dispatcher:
+    # Хранилище FSM выбирается в config.FSM_STORAGE (memory / postgres / redis)
+    storage = create_fsm_storage()
+    # FSM-middleware aiogram подключаем сами: область обновления PostgresStorage должна
+    # охватывать и чтение состояния, которое он делает до обработчика
+    dp = Dispatcher(storage=storage, disable_fsm=True)
+    if isinstance(storage, PostgresStorage):
+        dp.update.outer_middleware(FSMScopeMiddleware(storage))
+    dp.update.outer_middleware(dp.fsm)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+    # Подключаем роутеры
+    dp.include_router(start_router)
+    dp.include_router(booking_router)
+    dp.include_router(hotels_router)
+    dp.include_router(bookings_router)
+    dp.include_router(admin_router)
+    dp.include_router(webapp_router)
+    dp.include_router(error_router) # Подключаем роутер с обработчиком ошибок
+
+    dp.update.outer_middleware(LookupScopeMiddleware())
+
+    # Лимит частоты на пользователя (throttling.py). Регистрируется раньше метрик, поэтому
+    # отброшенные нажатия не попадают во время работы обработчиков
+    setup_throttling(dp)
+
+    # Транзакция на обработчик по флагу; внутренний middleware — видит флаги найденного обработчика
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(UnitOfWorkMiddleware())
+
+    # Метрики обновлений, обработчиков и переходов FSM (см. metrics.py)
+    setup_dispatcher_metrics(dp)
+    return dp
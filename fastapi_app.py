@@ -1,10 +1,26 @@
 # fastapi_app.py
+import asyncio
+import csv
+import hashlib
+import hmac
+import io
+import json
 import os
-from fastapi import FastAPI, HTTPException
+import time
+from datetime import date, timedelta
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from config import BOT_TOKEN # Не используется в API, но пусть будет, если нужен
-from database import init_db # <-- Импортируем init_db
+from config import ADMIN_API_TOKEN
+from database import init_db, close_db, get_hotels_with_categories_json, get_available_categories # <-- Импортируем init_db
+from database import get_query_stats, iter_bookings_export, get_demand_stats, get_occupancy_stats, get_booking_stats_refreshed_at
 from fastapi.middleware.cors import CORSMiddleware
-import decimal # Импортируем decimal
+import booking_stats
+import catalog_cache
+import catalog_import
+import metrics
+import webhook
 from contextlib import asynccontextmanager # <-- Импортируем asynccontextmanager
 
 # lifespan определяем ДО создания app
@@ -15,12 +31,19 @@ async def lifespan(app: FastAPI):
         # Инициализация БД при запуске приложения
         await init_db()
         print("✅ База данных инициализирована для FastAPI.")
+        if webhook.is_enabled():
+            await webhook.start_webhook()
+            print("✅ Бот принимает обновления через webhook.")
+        elif (os.getenv("PROD") or "").lower() == "true":
+            print("⚠️ WEBHOOK_BASE_URL не задан: запущен только API, бот обновлений не получает.")
         yield # <-- FastAPI начинает обслуживание
     except Exception as e:
         print(f"❌ Ошибка инициализации FastAPI приложения: {e}")
         raise e
     finally:
         print("🛑 Завершение работы приложения (FastAPI)...")
+        await webhook.stop_webhook()
+        await close_db()
 
 # Передаём lifespan в FastAPI
 app = FastAPI(lifespan=lifespan)
@@ -34,38 +57,244 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# === WEBHOOK TELEGRAM-БОТА ===
+app.include_router(webhook.router)
+
+# === КЭШ ОТВЕТА /api/hotels-with-categories ===
+# Готовые байты ответа пересобираются только при смене версии каталога (catalog_cache.version)
+_hotels_payload = None
+_hotels_payload_lock = asyncio.Lock()
+
+async def _get_hotels_payload():
+    global _hotels_payload
+    payload = _hotels_payload
+    # Пока кэш каталога не загружен, об изменениях мы не узнаем, поэтому ответ не переиспользуем
+    if payload is not None and catalog_cache.is_loaded() and payload["version"] == catalog_cache.version:
+        return payload
+
+    async with _hotels_payload_lock:
+        payload = _hotels_payload
+        if payload is not None and catalog_cache.is_loaded() and payload["version"] == catalog_cache.version:
+            return payload
+        # Версию запоминаем до запроса: если каталог изменится во время сборки, пересоберём ещё раз
+        version = catalog_cache.version
+        body = (await get_hotels_with_categories_json()).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        # Если содержимое не поменялось (например, правка без изменения полей ответа), дату не сдвигаем
+        if payload is not None and payload["etag"] == etag:
+            last_modified = payload["last_modified"]
+        else:
+            last_modified = formatdate(time.time(), usegmt=True)
+        _hotels_payload = {
+            "version": version,
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        return _hotels_payload
+
+def _not_modified(request: Request, payload) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match приоритетнее If-Modified-Since (RFC 9110)
+        etags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in etags or payload["etag"] in etags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(payload["last_modified"])
+        except (TypeError, ValueError):
+            return False
+    return False
+
 # === API МАРШРУТЫ ===
 @app.get("/api/hotels-with-categories")
-async def get_hotels_with_categories_api():
-    # Импортируем нужные функции из database.py
-    from database import get_all_hotels, get_room_categories_by_hotel
+async def get_hotels_with_categories_api(request: Request):
     try:
-        hotels = await get_all_hotels(sort_by="name", desc=False)
-        result = []
-        for hotel in hotels:
-            categories = await get_room_categories_by_hotel(hotel["id"])
-            hotel_data = {
-                "id": hotel["id"],
-                "name": hotel["name"],
-                "categories": [
-                    {
-                        "id": c["id"],
-                        "name": c["name"],
-                        # Преобразуем Decimal в int или float перед включением в JSON
-                        "price": float(c["price"]) if isinstance(c["price"], (decimal.Decimal, float)) else c["price"]
-                    }
-                    for c in categories
-                ]
-            }
-            result.append(hotel_data)
-
-        return result
-
+        payload = await _get_hotels_payload()
     except Exception as e:
         # Логируем ошибку
         print(f"Ошибка в /api/hotels-with-categories: {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка загрузки данных: {str(e)}")
 
+    headers = {
+        "ETag": payload["etag"],
+        "Last-Modified": payload["last_modified"],
+        # Браузер хранит ответ, но каждый раз сверяется с сервером (дёшево благодаря 304)
+        "Cache-Control": "no-cache",
+    }
+    if _not_modified(request, payload):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload["body"], media_type="application/json", headers=headers)
+
+@app.get("/api/availability")
+async def get_availability_api(check_in: str, check_out: str, hotel_id: int = None):
+    """Свободные категории на [check_in, check_out) по гостиницам: {"<hotel_id>": [category_id, ...]}"""
+    try:
+        categories = await get_available_categories(check_in, check_out, hotel_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректные даты: {e}")
+    except Exception as e:
+        print(f"Ошибка в /api/availability: {e}")
+        raise HTTPException(status_code=500, detail=f"Ошибка загрузки данных: {str(e)}")
+
+    available = {}
+    for c in categories:
+        available.setdefault(str(c["hotel_id"]), []).append(c["id"])
+    return {"check_in": check_in, "check_out": check_out, "available": available}
+
+# === АДМИНИСТРАТИВНОЕ API ===
+def _require_admin(request: Request):
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode(), ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Неверный токен администратора")
+
+@app.post("/api/admin/import")
+async def import_catalog_api(request: Request, kind: str = None, format: str = None,
+                             dry_run: bool = False, strict: bool = False):
+    """
+    Массовый импорт из тела запроса (CSV или JSON, см. catalog_import.py).
+    Формат берётся из параметра format или из Content-Type (text/csv — CSV, иначе JSON).
+    """
+    _require_admin(request)
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "json"
+    try:
+        batches = catalog_import.parse_content(await request.body(), format, kind)
+    except catalog_import.ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Файл должен быть в кодировке UTF-8")
+    try:
+        return await catalog_import.run_import(batches, dry_run=dry_run, strict=strict)
+    except Exception as e:
+        print(f"Ошибка в /api/admin/import: {e}")
+        raise HTTPException(status_code=500, detail=f"Ошибка импорта: {str(e)}")
+
+def _parse_date(value: str, field: str):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{field}: ожидается дата YYYY-MM-DD")
+
+EXPORT_COLUMNS = [
+    "id", "telegram_id", "hotel_id", "hotel_name", "room_category_id", "room_category", "price",
+    "check_in", "check_out", "status", "created_at",
+]
+
+def _export_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, str)):
+        return value
+    # date, datetime, Decimal
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+async def _export_chunks(format: str, filters: dict):
+    # Каждая пачка строк из курсора превращается в один кусок ответа
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue().encode("utf-8-sig")
+    try:
+        async for rows in iter_bookings_export(**filters):
+            if format == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([[_export_value(r[c]) for c in EXPORT_COLUMNS] for r in rows])
+                yield buffer.getvalue().encode("utf-8")
+            else:
+                yield "".join(
+                    json.dumps({c: _export_value(r[c]) for c in EXPORT_COLUMNS}, ensure_ascii=False) + "\n"
+                    for r in rows
+                ).encode("utf-8")
+    except Exception as e:
+        # Заголовки уже отправлены, поменять статус ответа нельзя — обрываем выгрузку
+        print(f"Ошибка выгрузки броней: {e}")
+        raise
+
+@app.get("/api/admin/bookings/export")
+async def export_bookings_api(request: Request, format: str = "csv", hotel_id: int = None, status: str = None,
+                              date_from: str = None, date_to: str = None):
+    """
+    Потоковая выгрузка броней (CSV или NDJSON) с гостиницей и категорией.
+    Фильтры: hotel_id, status, диапазон дат заезда date_from..date_to (YYYY-MM-DD).
+    """
+    _require_admin(request)
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format должен быть csv или ndjson")
+    filters = {
+        "hotel_id": hotel_id,
+        "status": status,
+        "date_from": _parse_date(date_from, "date_from"),
+        "date_to": _parse_date(date_to, "date_to"),
+    }
+
+    filename = f"bookings_{date.today():%Y%m%d}.{format}"
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_chunks(format, filters),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# === СТАТИСТИКА ЗАГРУЗКИ И СПРОСА ===
+# Читают агрегаты booking_stats_daily и room_nights (см. booking_stats.py)
+STATS_MAX_DAYS = 366
+
+def _stats_range(date_from: str, date_to: str, default_from: date, default_to: date):
+    start = _parse_date(date_from, "date_from") or default_from
+    end = _parse_date(date_to, "date_to") or default_to
+    if start > end:
+        raise HTTPException(status_code=400, detail="date_from позже date_to")
+    if (end - start).days >= STATS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Период не больше {STATS_MAX_DAYS} дней")
+    return start, end
+
+def _stats_rows(rows: list) -> list:
+    return [{k: _export_value(v) for k, v in r.items()} for r in rows]
+
+@app.get("/api/admin/stats/occupancy")
+async def occupancy_stats_api(request: Request, date_from: str = None, date_to: str = None, hotel_id: int = None):
+    """Загрузка по гостиницам, категориям и ночам (по умолчанию — ближайшие 30 ночей)"""
+    _require_admin(request)
+    start, end = _stats_range(date_from, date_to, date.today(), date.today() + timedelta(days=29))
+    return {
+        "date_from": start.isoformat(), "date_to": end.isoformat(),
+        "rows": _stats_rows(await get_occupancy_stats(start, end, hotel_id)),
+    }
+
+@app.get("/api/admin/stats/demand")
+async def demand_stats_api(request: Request, date_from: str = None, date_to: str = None, hotel_id: int = None):
+    """Заявки и отмены по гостиницам, категориям и дням (по умолчанию — последние 30 дней)"""
+    _require_admin(request)
+    start, end = _stats_range(date_from, date_to, date.today() - timedelta(days=29), date.today())
+    # Догоняем агрегаты перед отчётом: переносятся только брони после прошлого обновления
+    await booking_stats.refresh()
+    refreshed_at = await get_booking_stats_refreshed_at()
+    return {
+        "date_from": start.isoformat(), "date_to": end.isoformat(),
+        "refreshed_at": _export_value(refreshed_at),
+        "rows": _stats_rows(await get_demand_stats(start, end, hotel_id)),
+    }
+
+# === МЕТРИКИ PROMETHEUS ===
+@app.get("/metrics")
+async def metrics_api():
+    body, content_type = metrics.render_latest()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/api/admin/db-stats")
+async def db_stats_api(request: Request):
+    """Статистика запросов к БД и пула: размер, занятость (saturation), ожидание соединений"""
+    _require_admin(request)
+    return get_query_stats()
+
 # Это блок только для ЛОКАЛЬНОГО запуска FastAPI
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,142 @@
+# === МОДУЛЬ ХРАНИЛИЩА СОСТОЯНИЙ FSM ===
+#
+# PostgresStorage хранит состояние и данные форм (BookingForm и т.п.) в таблице fsm_states,
+# поэтому несколько воркеров бота видят одни и те же формы, а перезапуск их не теряет.
+#
+# Чтобы не ходить в БД на каждый get_state/get_data/update_data, записи кэшируются на время
+# одного обновления (update_scope, см. FSMScopeMiddleware в dispatcher.py):
+#   - чтение: запись загружается одним запросом (состояние и данные вместе) при первом
+#     обращении в обновлении, дальше берётся из области — чтение состояния в FSM-middleware
+#     aiogram + get_data + update_data в обработчике дают один SELECT;
+#   - запись: изменения копятся в области и сохраняются одной транзакцией, когда обработчик
+#     закончил, но до того, как обновление считается обработанным. Следующее обновление
+#     (в этом или другом воркере) читает состояние из БД заново.
+# Вне области (например, FSMContext, созданный вручную) каждое чтение и запись идут в БД.
+# Брошенные формы старше FSM_TTL не читаются и периодически удаляются.
+#
+# Тип хранилища выбирается в config.FSM_STORAGE: memory, postgres или redis.
+
+import asyncio
+import copy
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config import FSM_STORAGE, FSM_TTL, REDIS_URL
+from database import get_fsm_record, save_fsm_records, delete_expired_fsm_records
+
+CLEANUP_INTERVAL = 3600
+
+# key -> {"key", "state", "data", "dirty"}; None — вне области обновления
+_update_scope: ContextVar = ContextVar("fsm_update_scope", default=None)
+
+
+class PostgresStorage(BaseStorage):
+    def __init__(self, ttl: int = FSM_TTL):
+        self.ttl = ttl
+        self._key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+        self._cleanup_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    # === ОБЛАСТЬ ОДНОГО ОБНОВЛЕНИЯ ===
+
+    @asynccontextmanager
+    async def update_scope(self):
+        """Записи читаются из БД один раз на обновление и сохраняются при выходе из области"""
+        if _update_scope.get() is not None:
+            yield
+            return
+        scope: Dict[str, Dict[str, Any]] = {}
+        token = _update_scope.set(scope)
+        try:
+            yield
+        finally:
+            _update_scope.reset(token)
+            dirty = [entry for entry in scope.values() if entry["dirty"]]
+            if dirty:
+                await save_fsm_records(dirty)
+
+    async def _load(self, key: StorageKey) -> Dict[str, Any]:
+        k = self._key_builder.build(key)
+        scope = _update_scope.get()
+        if scope is not None and k in scope:
+            return scope[k]
+
+        record = await get_fsm_record(k, self.ttl)
+        entry = {
+            "key": k,
+            "state": record["state"] if record else None,
+            "data": record["data"] if record else {},
+            "dirty": False,
+        }
+        if scope is not None:
+            scope[k] = entry
+        return entry
+
+    async def _save(self, entry):
+        self._ensure_cleanup_task()
+        if _update_scope.get() is not None:
+            entry["dirty"] = True
+        else:
+            await save_fsm_records([entry])
+
+    # === ОЧИСТКА БРОШЕННЫХ ФОРМ ===
+
+    def _ensure_cleanup_task(self):
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.get_running_loop().create_task(self._cleanup_loop())
+
+    async def _cleanup_loop(self):
+        while not self._closed:
+            try:
+                deleted = await delete_expired_fsm_records(self.ttl)
+                if deleted:
+                    logging.info(f"fsm_storage.py: удалено брошенных форм: {deleted}")
+            except Exception as e:
+                logging.error(f"fsm_storage.py: ошибка очистки fsm_states: {e}")
+            await asyncio.sleep(CLEANUP_INTERVAL)
+
+    # === ИНТЕРФЕЙС BaseStorage ===
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._load(key)
+        entry["state"] = state.state if isinstance(state, State) else state
+        await self._save(entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(key))["state"]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        entry = await self._load(key)
+        entry["data"] = copy.deepcopy(dict(data))
+        await self._save(entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy((await self._load(key))["data"])
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> Dict[str, Any]:
+        # Без лишней копии через get_data/set_data: одна загрузка (обычно из области) и одна запись
+        entry = await self._load(key)
+        entry["data"].update(copy.deepcopy(dict(data)))
+        await self._save(entry)
+        return copy.deepcopy(entry["data"])
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._cleanup_task is not None and not self._cleanup_task.done():
+            self._cleanup_task.cancel()
+
+
+def create_fsm_storage() -> BaseStorage:
+    if FSM_STORAGE == "postgres":
+        return PostgresStorage()
+    if FSM_STORAGE == "redis":
+        # Опциональная зависимость: нужна только при FSM_STORAGE=redis (pip install redis)
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(REDIS_URL, state_ttl=FSM_TTL, data_ttl=FSM_TTL)
+    return MemoryStorage()
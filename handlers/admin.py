@@ -1,6 +1,8 @@
 from aiogram import F, Router
+from aiogram.filters import Command
 from aiogram.types import Message
-from config import ADMIN_CONTACT, ADMIN_NAME
+from config import ADMIN_CONTACT, ADMIN_NAME, ADMIN_CHAT_ID
+import booking_stats
 
 router = Router()
 # 📞 Связаться с админом
@@ -11,4 +13,9 @@ async def contact_admin(message: Message):
         f"{ADMIN_CONTACT}\n\n"
         "Вы можете связаться напрямую или написать в Telegram."
     )
-    await message.answer(caption, parse_mode="Markdown")
\ No newline at end of file
+    await message.answer(caption, parse_mode="Markdown")
+
+# 📊 Статистика загрузки и спроса — только в чате администратора
+@router.message(Command("stats"), F.chat.id == ADMIN_CHAT_ID)
+async def stats_command(message: Message):
+    await message.answer(await booking_stats.build_report(), parse_mode="HTML")
@@ -5,17 +5,15 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
 from keyboards import get_main_reply_keyboard
-from database import get_all_hotels, get_hotel_by_id, get_room_categories_by_hotel, get_room_category_by_id, create_booking, has_overlapping_booking
+from database import get_all_hotels, get_hotel_by_id, get_room_categories_by_hotel, get_room_category_by_id, create_booking, BOOKING_OVERLAP
+from database import BOOKING_SOLD_OUT, get_available_category_ids, finish_unit_of_work
 from database import get_hotel_id_by_name, get_room_category_id_by_hotel_and_name
 from config import ADMIN_CHAT_ID
+import asyncio
 import re
 from datetime import datetime
-from aiogram import Bot
-from config import BOT_TOKEN
-import logging
 
 router = Router()
-bot = Bot(token=BOT_TOKEN)
 
 # === FSM СОСТОЯНИЯ ===
 class BookingForm(StatesGroup):
@@ -25,7 +23,7 @@ class BookingForm(StatesGroup):
     confirming = State()
 
 # 📤 Отправить заявку
-@router.message(F.text == '📤 Отправить заявку')
+@router.message(F.text == '📤 Отправить заявку', flags={"throttle": {"key": "start_booking", "rate": 0.5, "burst": 3}})
 async def start_booking_form(message: Message, state: FSMContext):
     hotels = await get_all_hotels()
     
@@ -65,20 +63,31 @@ async def choose_hotel(message: Message, state: FSMContext):
     
     room_categories = await get_room_categories_by_hotel(hotel_id)
     
+    # Если даты уже известны (пользователь вернулся к выбору), предлагаем только свободные категории
+    data = await state.get_data()
+    if room_categories and data.get("check_in") and data.get("check_out"):
+        available_ids = await get_available_category_ids(data["check_in"], data["check_out"], hotel_id)
+        room_categories = [rc for rc in room_categories if rc["id"] in available_ids]
+    
     if not room_categories:
         await message.answer(f"❌ В гостинице *{hotel_name}* нет доступных категорий номеров.", parse_mode="Markdown")
         await state.clear()
         return
     
-    keyboard = ReplyKeyboardMarkup(
+    await message.answer(
+        f"🛏️ *Выберите категорию номера в гостинице {hotel_name}*",
+        reply_markup=_room_categories_keyboard(room_categories),
+        parse_mode="Markdown"
+    )
+    await state.set_state(BookingForm.choosing_room)
+
+def _room_categories_keyboard(room_categories):
+    return ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text=f"{rc['name']} — {rc['price']} руб.")] for rc in room_categories
         ] + [[KeyboardButton(text="◀️ Назад")]],
         resize_keyboard=True
     )
-    
-    await message.answer(f"🛏️ *Выберите категорию номера в гостинице {hotel_name}*", reply_markup=keyboard, parse_mode="Markdown")
-    await state.set_state(BookingForm.choosing_room)
 
 # === ОБРАБОТЧИК ВЫБОРА КАТЕГОРИИ НОМЕРА ===
 @router.message(BookingForm.choosing_room)
@@ -98,6 +107,15 @@ async def choose_room_category(message: Message, state: FSMContext):
     
     await state.update_data(room_category_id=room_category_id)
     
+    # Даты уже введены (категорию меняли из-за отсутствия мест) — сразу к подтверждению
+    if data.get("check_in") and data.get("check_out"):
+        available_ids = await get_available_category_ids(data["check_in"], data["check_out"], hotel_id)
+        if room_category_id not in available_ids:
+            await message.answer("❌ В этой категории нет свободных номеров на выбранные даты. Выберите другую.")
+            return
+        await _show_confirmation(message, state)
+        return
+    
     await message.answer(
         "📅 *Введите даты бронирования в формате:\n\n"
         "С 20.11.2025 по 25.11.2025*\n\n"
@@ -134,28 +152,46 @@ async def enter_dates(message: Message, state: FSMContext):
             
     except ValueError:
         await message.answer("❌ Неверный формат дат. Используйте DD.MM.YYYY (например, 20.11.2025).",
-            reply_markup=keyboard, # Применяем клавиатуру
             parse_mode="Markdown")
         return
     
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="✅ Подтвердить"), KeyboardButton(text="❌ Отмена")]
-        ],
-        resize_keyboard=True
-    )
-    
     # Сохраняем даты в формате YYYY-MM-DD для БД
     await state.update_data(check_in=str(check_in), check_out=str(check_out))
     
+    # Проверяем, есть ли свободные номера выбранной категории на эти даты
+    data = await state.get_data()
+    available_ids = await get_available_category_ids(str(check_in), str(check_out), data["hotel_id"])
+    if data["room_category_id"] not in available_ids:
+        room_categories = [
+            rc for rc in await get_room_categories_by_hotel(data["hotel_id"]) if rc["id"] in available_ids
+        ]
+        if not room_categories:
+            await message.answer("❌ На эти даты в гостинице нет свободных номеров. Введите другие даты.")
+            return
+        await message.answer(
+            "❌ В выбранной категории нет свободных номеров на эти даты.\n"
+            "🛏️ *Выберите одну из доступных категорий:*",
+            reply_markup=_room_categories_keyboard(room_categories),
+            parse_mode="Markdown"
+        )
+        await state.set_state(BookingForm.choosing_room)
+        return
+    
+    await _show_confirmation(message, state)
+
+async def _load_choice(data: dict):
+    # Гостиница и категория запрашиваются одновременно: без кэша каталога поиски уходят
+    # пачкой вместе с поисками других пользователей (см. database._BatchLoader)
+    return await asyncio.gather(get_hotel_by_id(data["hotel_id"]), get_room_category_by_id(data["room_category_id"]))
+
+async def _show_confirmation(message: Message, state: FSMContext):
     # Показываем подтверждение (в формате DD.MM.YYYY для пользователя)
     data = await state.get_data()
-    hotel_info = await get_hotel_by_id(data["hotel_id"])
-    room_info = await get_room_category_by_id(data["room_category_id"])
+    hotel_info, room_info = await _load_choice(data)
     
     # Преобразуем даты обратно в формат DD.MM.YYYY для отображения
-    display_check_in = check_in.strftime("%d.%m.%Y")
-    display_check_out = check_out.strftime("%d.%m.%Y")
+    display_check_in = datetime.strptime(data["check_in"], "%Y-%m-%d").strftime("%d.%m.%Y")
+    display_check_out = datetime.strptime(data["check_out"], "%Y-%m-%d").strftime("%d.%m.%Y")
     
     caption = (
         f"✅ *Подтвердите вашу заявку:*\n\n"
@@ -175,31 +211,13 @@ async def enter_dates(message: Message, state: FSMContext):
     await message.answer(caption, reply_markup=keyboard, parse_mode="Markdown")
     await state.set_state(BookingForm.confirming)
 
-@router.message(BookingForm.confirming, F.text == "✅ Подтвердить")
+# Запросы обработчика — через одно соединение и в одной транзакции (UnitOfWorkMiddleware)
+@router.message(BookingForm.confirming, F.text == "✅ Подтвердить", flags={"transaction": True})
 async def confirm_and_save(message: Message, state: FSMContext):
     data = await state.get_data()
     user = message.from_user
     
-    # Проверяем, нет ли пересекающихся бронирований
-    if await has_overlapping_booking(user.id, data["check_in"], data["check_out"]):
-        await message.answer(
-            "❌ У вас уже есть бронирование на эти даты!\n"
-            "Невозможно создать новое бронирование с пересекающимися датами.",
-            reply_markup=get_main_reply_keyboard
-        )
-        await state.clear()
-        return
-    
-    await create_booking(
-        telegram_id=user.id,
-        hotel_id=data["hotel_id"],
-        room_category_id=data["room_category_id"],
-        check_in=data["check_in"],
-        check_out=data["check_out"]
-    )
-    
-    hotel_info = await get_hotel_by_id(data["hotel_id"])
-    room_info = await get_room_category_by_id(data["room_category_id"])
+    hotel_info, room_info = await _load_choice(data)
     
     admin_message = (
         "🚨 <b>НОВАЯ ЗАЯВКА НА БРОНИРОВАНИЕ</b>\n\n"
@@ -211,10 +229,36 @@ async def confirm_and_save(message: Message, state: FSMContext):
         "❗ Свяжитесь с клиентом для подтверждения."
     )
     
-    try:
-        await bot.send_message(ADMIN_CHAT_ID, admin_message, parse_mode="HTML")
-    except Exception as e:
-        logging.error(f"Ошибка отправки администратору: {e}")
+    # Проверка пересечения дат и вставка выполняются в БД атомарно,
+    # уведомление администратору записывается в outbox в той же транзакции
+    result = await create_booking(
+        telegram_id=user.id,
+        hotel_id=data["hotel_id"],
+        room_category_id=data["room_category_id"],
+        check_in=data["check_in"],
+        check_out=data["check_out"],
+        notification={"chat_id": ADMIN_CHAT_ID, "text": admin_message, "parse_mode": "HTML"}
+    )
+    # Фиксируем до ответа пользователю: соединение и блокировки room_nights не ждут Telegram
+    await finish_unit_of_work()
+    
+    if result["status"] == BOOKING_OVERLAP:
+        await message.answer(
+            "❌ У вас уже есть бронирование на эти даты!\n"
+            "Невозможно создать новое бронирование с пересекающимися датами.",
+            reply_markup=get_main_reply_keyboard
+        )
+        await state.clear()
+        return
+    
+    if result["status"] == BOOKING_SOLD_OUT:
+        await message.answer(
+            "❌ К сожалению, свободных номеров этой категории на выбранные даты уже не осталось.\n"
+            "Попробуйте другие даты или категорию.",
+            reply_markup=get_main_reply_keyboard
+        )
+        await state.clear()
+        return
     
     await message.answer(
         "✅ *Заявка успешно отправлена администратору!*\n\n"
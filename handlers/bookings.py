@@ -1,89 +1,152 @@
-# === МОДУЛЬ ПОЛУЧЕНИЯ ДАННЫХ О ЗАЯВКАХ И БРОНЯХ === 
+# === МОДУЛЬ ПОЛУЧЕНИЯ ДАННЫХ О ЗАЯВКАХ И БРОНЯХ ===
 
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from database import get_user_bookings, get_user_booking_by_id, update_booking_status
 from config import ADMIN_CHAT_ID
+from datetime import datetime, timedelta
+import html
 import logging
-from aiogram import Bot
-from config import BOT_TOKEN
 
-bot = Bot(token=BOT_TOKEN)
+router = Router()
 
+# Сколько броней показывать на одной странице
+PAGE_SIZE = 5
+NO_BOOKINGS_TEXT = "🎫 У вас пока нет активных бронирований."
 
-router = Router()
+# === ПАГИНАЦИЯ ===
+# Все брони показываются в одном сообщении, листание редактирует его на месте.
+# Курсор страницы — (created_at, id) крайней брони, created_at кодируется в callback_data
+# микросекундами от эпохи, чтобы при декодировании не терять точность.
+_EPOCH = datetime(1970, 1, 1)
+
+def _encode_cursor(booking) -> str:
+    micros = (booking["created_at"] - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}:{booking['id']}"
+
+def _decode_cursor(value: str) -> tuple:
+    micros, booking_id = value.split(":")
+    return _EPOCH + timedelta(microseconds=int(micros)), int(booking_id)
+
+async def _load_page(user_id: int, after: tuple = None, before: tuple = None):
+    """Страница броней и флаги наличия соседних страниц"""
+    # Берём на одну бронь больше, чтобы узнать, есть ли страница дальше
+    bookings = await get_user_bookings(user_id, limit=PAGE_SIZE + 1, after=after, before=before)
+    has_more = len(bookings) > PAGE_SIZE
+    if before is not None:
+        # При листании назад лишняя бронь — самая новая, она в начале списка
+        bookings = bookings[-PAGE_SIZE:]
+        return bookings, has_more, True
+    return bookings[:PAGE_SIZE], after is not None, has_more
+
+def _render_page(bookings: list, has_prev: bool, has_next: bool, header: str = None):
+    """Текст и клавиатура страницы «Мои брони»"""
+    if not bookings:
+        text = NO_BOOKINGS_TEXT
+        return (f"{header}\n\n{text}" if header else text), None
+
+    lines = [header, ""] if header else []
+    lines.append("🎫 <b>Мои брони</b>")
+    buttons = []
+    for b in bookings:
+        lines.append(
+            f"\n<b>№{b['id']}</b> • <b>Гостиница:</b> {html.escape(b['hotel_name'])}\n"
+            f"<b>Категория номера:</b> {html.escape(b['room_category'])}\n"
+            f"<b>Даты:</b> {b['check_in']} — {b['check_out']}\n"
+            f"<b>Статус:</b> {b['status']}"
+        )
+        # Формат callback_data прежний, чтобы работали кнопки в старых сообщениях
+        buttons.append([InlineKeyboardButton(text=f"❌ Отменить №{b['id']}", callback_data=f"cancel_booking_{b['id']}")])
+
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"bookings:prev:{_encode_cursor(bookings[0])}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"bookings:next:{_encode_cursor(bookings[-1])}"))
+    if nav:
+        buttons.append(nav)
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=buttons)
+
+async def _edit_page(callback: CallbackQuery, text: str, kb):
+    try:
+        await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+    except TelegramBadRequest as e:
+        # Двойное нажатие на кнопку — страница не изменилась
+        if "message is not modified" not in str(e):
+            raise
 
 # 🎫 Мои брони
-@router.message(F.text == '🎫 Мои брони')
+# Каждое нажатие — запрос к БД, поэтому у раздела своё, более строгое ограничение частоты
+@router.message(F.text == '🎫 Мои брони', flags={"throttle": {"key": "my_bookings", "rate": 0.5, "burst": 3}})
 async def my_bookings(message: Message):
     try:
         user_id = message.from_user.id
-        bookings = await get_user_bookings(user_id)
-        
-        if bookings:
-            # Формируем список с инлайн-кнопками "Отменить"
-            for b in bookings:
-                text = (
-                    f"• <b>Гостиница:</b> {b['hotel_name']}\n"
-                    f"<b>Категория номера:</b> {b['room_category']}\n"
-                    f"<b>Дата заезда:</b> {b['check_in']}\n"
-                    f"<b>Дата выезда:</b> {b['check_out']}\n"
-                    f"<b>Статус:</b> {b['status']}"
-                )
-                
-                # Кнопка "Отменить" с callback_data = cancel_booking_{id}
-                kb = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="❌ Отменить", callback_data=f"cancel_booking_{b['id']}")]
-                ])
-                
-                await message.answer(text, reply_markup=kb, parse_mode="HTML")
-        else:
-            await message.answer("🎫 У вас пока нет активных бронирований.", parse_mode="Markdown")
-            
+        bookings, has_prev, has_next = await _load_page(user_id)
+        text, kb = _render_page(bookings, has_prev, has_next)
+        await message.answer(text, reply_markup=kb, parse_mode="HTML")
+
     except Exception as e:
         logging.error(f"Error fetching bookings: {e}")
         await message.answer("Ошибка загрузки броней. Попробуйте позже.")
 
+# === ЛИСТАНИЕ СТРАНИЦ ===
+@router.callback_query(F.data.startswith("bookings:"))
+async def bookings_page_handler(callback: CallbackQuery):
+    try:
+        _, direction, cursor = callback.data.split(":", 2)
+        cursor = _decode_cursor(cursor)
+    except ValueError:
+        await callback.answer()
+        return
+
+    user_id = callback.from_user.id
+    if direction == "prev":
+        bookings, has_prev, has_next = await _load_page(user_id, before=cursor)
+    else:
+        bookings, has_prev, has_next = await _load_page(user_id, after=cursor)
+
+    if not bookings and direction == "prev":
+        # Новее курсора броней не осталось (например, их отменили) — показываем первую страницу
+        bookings, has_prev, has_next = await _load_page(user_id)
+    text, kb = _render_page(bookings, has_prev, has_next)
+    await _edit_page(callback, text, kb)
+    await callback.answer()
+
 # === ОБРАБОТЧИК ОТМЕНЫ БРОНИРОВАНИЯ ===
 @router.callback_query(F.data.startswith("cancel_booking_"))
 async def cancel_booking_handler(callback: CallbackQuery):
     booking_id = int(callback.data.split("_")[-1])  # получаем ID брони
     user_id = callback.from_user.id
-    
+
     # Проверяем, принадлежит ли бронь пользователю
     booking = await get_user_booking_by_id(booking_id, user_id)
-    
+
     if not booking:
         await callback.answer("❌ Бронирование не найдено или вы не можете его отменить.", show_alert=True)
         return
-    
+
     if booking["status"] == "cancelled":
         await callback.answer("✅ Бронирование уже отменено.", show_alert=True)
         return
-    
-    # Обновляем статус в БД
-    await update_booking_status(booking_id, "cancelled")
-    
-    # Подтверждение пользователю
-    await callback.message.edit_text(
-        f"✅ Бронирование в *{booking['hotel_name']}* отменено.\n\n"
-        f"Гостиница: {booking['hotel_name']}\n"
-        f"Номер: {booking['room_category']}\n"
-        f"Даты: {booking['check_in']} — {booking['check_out']}",
-        parse_mode="Markdown"
+
+    # Обновляем статус в БД; уведомление администратору пишется в outbox в той же транзакции
+    admin_message = (
+        "🗑️ <b>БРОНИРОВАНИЕ ОТМЕНЕНО</b>\n\n"
+        f"👤 Пользователь: @{callback.from_user.username or 'не указан'} (ID: {user_id})\n"
+        f"🏨 Гостиница: {booking['hotel_name']}\n"
+        f"🛏️ Категория: {booking['room_category']}\n"
+        f"📅 Даты: {booking['check_in']} — {booking['check_out']}"
     )
-    
-    # Уведомление администратору
-    try:
-        admin_message = (
-            "🗑️ <b>БРОНИРОВАНИЕ ОТМЕНЕНО</b>\n\n"
-            f"👤 Пользователь: @{callback.from_user.username or 'не указан'} (ID: {user_id})\n"
-            f"🏨 Гостиница: {booking['hotel_name']}\n"
-            f"🛏️ Категория: {booking['room_category']}\n"
-            f"📅 Даты: {booking['check_in']} — {booking['check_out']}"
-        )
-        await bot.send_message(ADMIN_CHAT_ID, admin_message, parse_mode="HTML")
-    except Exception as e:
-        logging.error(f"Ошибка отправки администратору при отмене: {e}")
-    
-    await callback.answer()
\ No newline at end of file
+    await update_booking_status(
+        booking_id, "cancelled",
+        notification={"chat_id": ADMIN_CHAT_ID, "text": admin_message, "parse_mode": "HTML"}
+    )
+
+    # Подтверждение пользователю: перерисовываем список на месте, с первой страницы
+    header = f"✅ Бронирование в <b>{html.escape(booking['hotel_name'])}</b> отменено."
+    bookings, has_prev, has_next = await _load_page(user_id)
+    text, kb = _render_page(bookings, has_prev, has_next, header=header)
+    await _edit_page(callback, text, kb)
+
+    await callback.answer()
@@ -1,35 +1,118 @@
 from aiogram import F, Router
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from database import get_all_hotels
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from database import get_all_hotels, get_hotel_photos
+import catalog_cache
+import media
+import html
 import logging
 
 router = Router()
 
+# Сколько гостиниц показывать на одной странице
+PAGE_SIZE = 5
+NO_HOTELS_TEXT = "🏨 Нет доступных гостиниц."
+
+# === КЭШ СТРАНИЦ ===
+# Список гостиниц показывается одним сообщением с листанием на месте. Текст и клавиатура
+# всех страниц собираются один раз и переиспользуются, пока не сменится версия каталога
+# (catalog_cache.version растёт при каждой перезагрузке по NOTIFY).
+_pages = []
+_pages_version = None
+
+def _render_pages(hotels: list) -> list:
+    chunks = [hotels[i:i + PAGE_SIZE] for i in range(0, len(hotels), PAGE_SIZE)]
+    pages = []
+    for number, chunk in enumerate(chunks):
+        lines = [f"🏨 <b>Гостиницы</b> (стр. {number + 1} из {len(chunks)})"]
+        buttons = []
+        for hotel in chunk:
+            lines.append(f"\n🏨 <b>{html.escape(hotel['name'])}</b>\n📍 {html.escape(hotel['address'] or 'Адрес не указан')}")
+            # В description хранится ссылка на сайт гостиницы. Кнопки с некорректным URL не добавляем:
+            # Telegram отклонил бы всё сообщение целиком
+            row = []
+            url = (hotel['description'] or "").strip()
+            if url.startswith(("http://", "https://")):
+                row.append(InlineKeyboardButton(text=f"🌐 {hotel['name']}", url=url))
+            row.append(InlineKeyboardButton(text="📷 Фото", callback_data=f"hotel_photos:{hotel['id']}"))
+            buttons.append(row)
+
+        nav = []
+        if number > 0:
+            nav.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"hotels:page:{number - 1}"))
+        if number < len(chunks) - 1:
+            nav.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"hotels:page:{number + 1}"))
+        if nav:
+            buttons.append(nav)
+        pages.append(("\n".join(lines), InlineKeyboardMarkup(inline_keyboard=buttons) if buttons else None))
+    return pages
+
+async def _get_pages() -> list:
+    global _pages, _pages_version
+    if catalog_cache.is_loaded() and _pages_version == catalog_cache.version:
+        return _pages
+    # Версию запоминаем до чтения: если каталог перезагрузится в процессе, страницы соберутся заново
+    loaded, version = catalog_cache.is_loaded(), catalog_cache.version
+    hotels = await get_all_hotels(sort_by="name", desc=False)
+    pages = _render_pages(hotels)
+    # Без загруженного каталога версия неизвестна — такие страницы не кэшируем
+    if loaded:
+        _pages, _pages_version = pages, version
+    return pages
+
 # 🏨 Выбрать гостиницу
 @router.message(F.text == '🏨 Выбрать гостиницу')
 async def select_hotel(message: Message):
     try:
-        hotels = await get_all_hotels(sort_by="name", desc=False)
-        if hotels:
-            for hotel in hotels:
-                # Создаем инлайн-клавиатуру с одной кнопкой "Открыть сайт"
-                keyboard = InlineKeyboardMarkup(
-                    inline_keyboard=[
-                        [InlineKeyboardButton(text="🌐 Открыть сайт", url=hotel['description'])] # Используем 'description' как URL
-                        # Если у вас есть отдельное поле для сайта, например, 'website', используйте его:
-                        # [InlineKeyboardButton(text="🌐 Открыть сайт", url=hotel['website'])]
-                    ]
-                )
-                
-                # Формируем текст для одного отеля
-                hotel_info = f"🏨 <b>{hotel['name']}</b>\n📍 {hotel['address'] or 'Адрес не указан'}"
-                
-                # Отправляем сообщение с кнопкой для этого отеля
-                await message.answer(hotel_info, reply_markup=keyboard, parse_mode="HTML")
+        pages = await _get_pages()
+        if pages:
+            text, keyboard = pages[0]
+            await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
         else:
-            await message.answer("🏨 Нет доступных гостиниц.")
+            await message.answer(NO_HOTELS_TEXT)
     except Exception as e:
         logging.error(f"Error fetching hotels: {e}")
         await message.answer("Ошибка загрузки гостиниц.")
 
+# === ЛИСТАНИЕ СТРАНИЦ ===
+@router.callback_query(F.data.startswith("hotels:page:"))
+async def hotels_page_handler(callback: CallbackQuery):
+    try:
+        number = int(callback.data.split(":")[-1])
+    except ValueError:
+        await callback.answer()
+        return
+
+    pages = await _get_pages()
+    if not pages:
+        await callback.message.edit_text(NO_HOTELS_TEXT)
+        await callback.answer()
+        return
+
+    # Каталог мог измениться, пока сообщение висело в чате: страниц могло стать меньше
+    text, keyboard = pages[min(max(number, 0), len(pages) - 1)]
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    except TelegramBadRequest as e:
+        # Двойное нажатие на кнопку — страница не изменилась
+        if "message is not modified" not in str(e):
+            raise
+    await callback.answer()
+
+# === ФОТОГАЛЕРЕЯ ГОСТИНИЦЫ ===
+@router.callback_query(F.data.startswith("hotel_photos:"))
+async def hotel_photos_handler(callback: CallbackQuery):
+    try:
+        hotel_id = int(callback.data.split(":")[-1])
+    except ValueError:
+        await callback.answer()
+        return
+
+    photos = await get_hotel_photos(hotel_id)
+    if not photos:
+        await callback.answer("📷 Фотографий этой гостиницы пока нет.", show_alert=True)
+        return
 
+    # Фото уходят по file_id из реестра media.py, загружаются только новые файлы
+    await callback.answer()
+    await media.send_media_group(callback.bot, callback.message.chat.id, photos)
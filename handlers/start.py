@@ -4,12 +4,9 @@ from aiogram import Router, F
 from aiogram.filters import CommandStart
 from aiogram.types import Message
 from keyboards import get_main_reply_keyboard
-from aiogram import Bot
-from config import BOT_TOKEN
-from aiogram.types import FSInputFile
+import media
 
 router = Router()
-bot = Bot(token=BOT_TOKEN)
 
 @router.message(CommandStart())
 async def cmd_start(message: Message):
@@ -23,10 +20,10 @@ async def cmd_start(message: Message):
         "• 📅 <b>Забронировать</b> — заполните данные в мини-приложении\n"
     )
     try:
-          photo = FSInputFile("images\iz_hotel1.jpg")
-          await message.answer_photo(photo=photo, caption=caption, parse_mode="HTML")
+          # Фото загружается в Telegram один раз, дальше отправляется по file_id (см. media.py)
+          await media.send_photo(message.bot, message.chat.id, media.START_PHOTO, caption=caption, parse_mode="HTML")
     except FileNotFoundError:
-          await message.answer("📸 Фото временно недоступно, но гостиницы всё равно прекрасны!\n\n" + caption, parse_mode="Markdown")
+          await message.answer("📸 Фото временно недоступно, но гостиницы всё равно прекрасны!\n\n" + caption, parse_mode="HTML")
 
     await message.answer("Выберите действие ниже:", reply_markup=get_main_reply_keyboard)
 
@@ -4,10 +4,11 @@ from aiogram import F, Router
 from aiogram.types import Message
 from keyboards import get_main_reply_keyboard
 from utils import sanitize_miniapp_data_universal
+import asyncio
 import json
 import logging
-from database import has_overlapping_booking, create_booking, get_hotel_by_id, get_room_category_by_id
-from datetime import date
+from database import create_booking, get_hotel_by_id, get_room_category_by_id, BOOKING_OVERLAP, BOOKING_SOLD_OUT
+from config import ADMIN_CHAT_ID
 
 
 router = Router()
@@ -42,27 +43,50 @@ async def handle_webapp_data(message: Message):
             )
             return
         
-        # 🔍 Проверка пересечения дат
-        user_id = message.from_user.id
-        if await has_overlapping_booking(user_id, check_in, check_out):
-            await message.answer(
-                "❌ У вас уже есть бронирование на эти даты!\n"
-                "Невозможно создать новое бронирование с пересекающимися датами.",
-                parse_mode="Markdown"
-            )
+        user = message.from_user
+        hotel_info, room_info = await asyncio.gather(
+            get_hotel_by_id(int(hotel_id)), get_room_category_by_id(int(room_category_id))
+        )
+        
+        if not hotel_info or not room_info:
+            await message.answer("❌ Гостиница или категория номера не найдены. Обновите форму.")
             return
         
-        # ✅ Создаем бронь
-        await create_booking(
-            telegram_id=user_id,
+        admin_message = (
+            "🚨 <b>НОВАЯ ЗАЯВКА НА БРОНИРОВАНИЕ</b>\n\n"
+            f"👤 Пользователь: @{user.username or 'не указан'} (ID: {user.id})\n"
+            f"📞 Телефон: {getattr(user, 'phone_number', 'не указан') or 'не указан'}\n"
+            f"🏨 Гостиница: {hotel_info['name']}\n"
+            f"🛏️ Категория: {room_info['name']}\n"
+            f"📅 Даты: {data['check_in']} — {data['check_out']}\n\n"
+            "❗ Свяжитесь с клиентом для подтверждения."
+        )
+        
+        # ✅ Создаем бронь (пересечение дат проверяет БД в том же запросе),
+        # уведомление администратору записывается в outbox в той же транзакции
+        result = await create_booking(
+            telegram_id=user.id,
             hotel_id=int(hotel_id),
             room_category_id=int(room_category_id),
             check_in=check_in,
-            check_out=check_out
+            check_out=check_out,
+            notification={"chat_id": ADMIN_CHAT_ID, "text": admin_message, "parse_mode": "HTML"}
         )
         
-        hotel_info = await get_hotel_by_id(int(hotel_id))
-        room_info = await get_room_category_by_id(int(room_category_id))
+        if result["status"] == BOOKING_OVERLAP:
+            await message.answer(
+                "❌ У вас уже есть бронирование на эти даты!\n"
+                "Невозможно создать новое бронирование с пересекающимися датами.",
+                parse_mode="Markdown"
+            )
+            return
+        
+        if result["status"] == BOOKING_SOLD_OUT:
+            await message.answer(
+                "❌ К сожалению, свободных номеров этой категории на выбранные даты не осталось.\n"
+                "Попробуйте другие даты или категорию."
+            )
+            return
         
         caption = (
             f"✅ *Бронирование успешно создано!*\n\n"
@@ -72,21 +96,6 @@ async def handle_webapp_data(message: Message):
             f"Спасибо за заявку!"
         )
         await message.answer(caption, parse_mode="Markdown", reply_markup=get_main_reply_keyboard)
-        
-        admin_message = (
-        "🚨 <b>НОВАЯ ЗАЯВКА НА БРОНИРОВАНИЕ</b>\n\n"
-        f"👤 Пользователь: @{user.username or 'не указан'} (ID: {user.id})\n"
-        f"📞 Телефон: {getattr(user, 'phone_number', 'не указан') or 'не указан'}\n"
-        f"🏨 Гостиница: {hotel_info['name']}\n"
-        f"🛏️ Категория: {room_info['name']}\n"
-        f"📅 Даты: {data['check_in']} — {data['check_out']}\n\n"
-        "❗ Свяжитесь с клиентом для подтверждения."
-    )
-    
-        try:
-            await bot.send_message(ADMIN_CHAT_ID, admin_message, parse_mode="HTML")
-        except Exception as e:
-            logging.error(f"Ошибка отправки администратору: {e}")
     
         await message.answer(
             "✅ *Заявка успешно отправлена администратору!*\n\n"
@@ -0,0 +1,16 @@
+# === ОБЩИЙ ЭКЗЕМПЛЯР БОТА ===
+# Один Bot (и одна HTTP-сессия) на процесс: его используют обработчики, polling и webhook
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+
+from config import BOT_TOKEN
+from metrics import TelegramApiMetricsMiddleware
+from sender import RateLimitMiddleware
+
+session = AiohttpSession()
+session.middleware(RateLimitMiddleware())
+# Внутренний относительно лимитов: меряем сам запрос (и каждый повтор), без ожидания в очереди
+session.middleware(TelegramApiMetricsMiddleware())
+
+bot = Bot(token=BOT_TOKEN, session=session)
@@ -0,0 +1,109 @@
+# === ОБЩИЕ ФУНКЦИИ НАГРУЗОЧНЫХ ТЕСТОВ ===
+# Подсчёт перцентилей, запись файлов результатов и их сравнение между прогонами
+
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Dict, List
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# Насколько должна вырасти задержка, чтобы compare отметил регрессию
+REGRESSION_THRESHOLD = 0.10
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Перцентиль p (0..100) по отсортированному списку, с линейной интерполяцией"""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def summarize(durations: List[float], errors: int = 0) -> Dict[str, float]:
+    """Сводка по длительностям (секунды) в миллисекундах"""
+    values = sorted(durations)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(RESULTS_DIR)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_result(kind: str, params: Dict, result: Dict, path: str = None) -> str:
+    """Сохраняет результат прогона в JSON (по умолчанию в loadtest/results/) и возвращает путь"""
+    document = {
+        "kind": kind,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "params": params,
+        **result,
+    }
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{kind}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_result(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """
+    Сравнивает секции "steps" двух результатов (p50/p95/p99 и запросы к БД).
+    Возвращает строки отчёта; регрессии помечены ❗.
+    """
+    if baseline.get("params") != current.get("params"):
+        lines = ["⚠️ Параметры прогонов различаются, сравнение может быть некорректным"]
+    else:
+        lines = []
+    for step, now in current.get("steps", {}).items():
+        before = baseline.get("steps", {}).get(step)
+        if before is None:
+            lines.append(f"{step}: нет в базовом прогоне")
+            continue
+        parts = []
+        regression = False
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            old, new = before.get(key, 0.0), now.get(key, 0.0)
+            change = (new - old) / old if old else 0.0
+            regression |= change > threshold
+            parts.append(f"{key[:-3]} {old:.1f}→{new:.1f} мс ({change:+.0%})")
+        old_q, new_q = before.get("db_queries"), now.get("db_queries")
+        if old_q is not None and new_q is not None:
+            regression |= new_q > old_q
+            parts.append(f"запросов {old_q:g}→{new_q:g}")
+        lines.append(f"{'❗' if regression else '  '} {step}: " + ", ".join(parts))
+    return lines
+
+
+def print_steps(steps: Dict[str, Dict]):
+    print(f"{'шаг':<28}{'n':>7}{'ошибки':>8}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'запросов':>10}")
+    for name, s in steps.items():
+        queries = s.get("db_queries")
+        print(
+            f"{name:<28}{s['count']:>7}{s['errors']:>8}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}"
+            f"{'' if queries is None else format(queries, '.1f'):>10}"
+        )
@@ -0,0 +1,29 @@
+# === СРАВНЕНИЕ РЕЗУЛЬТАТОВ НАГРУЗОЧНЫХ ТЕСТОВ ===
+#
+# Запуск:
+#   python -m loadtest.compare baseline.json current.json
+# Код возврата 1, если найдена регрессия (задержка выросла больше чем на 10%
+# или шаг стал делать больше запросов к БД).
+
+import argparse
+import sys
+
+from loadtest.common import REGRESSION_THRESHOLD, compare, load_result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение двух файлов результатов loadtest")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="допустимый относительный рост задержки (по умолчанию 0.10)")
+    args = parser.parse_args()
+
+    lines = compare(load_result(args.baseline), load_result(args.current), args.threshold)
+    for line in lines:
+        print(line)
+    sys.exit(1 if any(line.startswith("❗") for line in lines) else 0)
+
+
+if __name__ == "__main__":
+    main()
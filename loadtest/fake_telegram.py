@@ -0,0 +1,104 @@
+# === ФИКТИВНЫЙ СЕРВЕР TELEGRAM BOT API ===
+#
+# Отвечает на вызовы бота (sendMessage, editMessageText, sendPhoto, ...) правдоподобными
+# объектами, с настраиваемой задержкой, и запоминает последнее сообщение в каждом чате —
+# так нагрузочный тест находит кнопки (например, cancel_booking_<id>) в ответах бота.
+# Бот подключается к нему через TelegramAPIServer.from_base(server.base_url).
+
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from aiohttp import web
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "LoadTestBot", "username": "loadtest_bot"}
+
+
+class FakeTelegramServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.calls: Counter = Counter()
+        # chat_id -> последнее отправленное или отредактированное сообщение (dict Bot API)
+        self.last_message: Dict[int, dict] = {}
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Порт 0 — свободный порт, выбранный системой
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # === ОТВЕТЫ НА МЕТОДЫ ===
+
+    @staticmethod
+    def _field(form, name, default=None):
+        value = form.get(name, default)
+        if isinstance(value, str) and value[:1] in ("{", "["):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+        return value
+
+    def _message(self, form, **extra) -> dict:
+        chat_id = int(form.get("chat_id", 0))
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": BOT_USER,
+            **extra,
+        }
+        reply_markup = self._field(form, "reply_markup")
+        if isinstance(reply_markup, dict) and "inline_keyboard" in reply_markup:
+            message["reply_markup"] = reply_markup
+        self.last_message[chat_id] = message
+        return message
+
+    def _photo(self) -> list:
+        n = next(self._file_ids)
+        return [{"file_id": f"fake-photo-{n}", "file_unique_id": f"fake-unique-{n}", "width": 800, "height": 600}]
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        form = await request.post()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method == "sendMessage":
+            result = self._message(form, text=form.get("text", ""))
+        elif method == "editMessageText":
+            result = self._message(form, text=form.get("text", ""))
+            result["message_id"] = int(form.get("message_id", result["message_id"]))
+        elif method == "sendPhoto":
+            result = self._message(form, photo=self._photo(), caption=form.get("caption"))
+        elif method == "sendMediaGroup":
+            media = self._field(form, "media", [])
+            result = [self._message(form, photo=self._photo()) for _ in media]
+        elif method == "getMe":
+            result = BOT_USER
+        else:
+            # answerCallbackQuery, deleteMessage, setWebhook, deleteWebhook, ...
+            result = True
+        return web.json_response({"ok": True, "result": result})
@@ -1,97 +1,32 @@
-# import asyncio # Закомментировано, так как не используется
 import logging
 import os
-#import decimal 
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from config import BOT_TOKEN 
-from database import init_db
-# Простой middleware для логирования обновлений (опционально)
-from aiogram import BaseMiddleware
-from aiogram.types import Message, CallbackQuery
-from typing import Callable, Dict, Any
-import logging
+import sys
+from database import init_db, close_db
+from config import METRICS_PORT, WEBHOOK_BASE_URL
 
 # === НАСТРОЙКА ЛОГИРОВАНИЯ ===
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# === ИМПОРТИРУЕМ РОУТЕРЫ НА УРОВНЕ МОДУЛЯ (но пока не подключаем) ===
-from handlers.start import router as start_router
-from handlers.booking import router as booking_router
-from handlers.hotels import router as hotels_router
-from handlers.bookings import router as bookings_router
-from handlers.admin import router as admin_router
-from handlers.webapp import router as webapp_router
-
-# === ГЛОБАЛЬНЫЙ ОБРАБОТЧИК ОШИБОК AIORAM ===
-from aiogram import Router
-from aiogram.types import ErrorEvent
-
-error_router = Router()
-
-@error_router.errors()
-async def error_handler(event: ErrorEvent):
-    logging.error(f"Произошла ошибка внутри обработчика aiogram: {event.exception}")
+# === ДИСПЕТЧЕР С РОУТЕРАМИ И MIDDLEWARE (общий с webhook-режимом) ===
+from dispatcher import create_dispatcher
+from loader import bot
+from scheduler import run_polling
 
 async def main():
-    # Проверяем переменную окружения PROD, по умолчанию считаем, что режим - development (polling)
-    prod_mode = os.getenv("PROD", "false").lower() == "true"
-    print(f"🔄 Режим запуска: {'Production (webhook)' if prod_mode else 'Development (polling)'}")
-
-    if prod_mode:
-        print("❌ Этот режим (PROD) не реализован в этом упрощенном скрипте.")
-        print("   Для PROD используйте запуск через uvicorn напрямую с установленным PROD=true.")
-        return
-
     print("🚀 Запуск приложения (Development - только бот)...")
 
     # Инициализация БД
     await init_db()
     print("✅ База данных инициализирована.")
 
-    # Создание бота и диспетчера
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
-    print("✅ Bot и Dispatcher созданы.")
+    # Создание диспетчера (бот общий для всего процесса, см. loader.py)
+    dp = create_dispatcher()
+    print("✅ Dispatcher создан, роутеры подключены.")
 
     # Удаляем webhook, чтобы избежать конфликта при polling
     await bot.delete_webhook(drop_pending_updates=True) # drop_pending_updates=True очищает очередь обновлений, пришедших на webhook
     print("🧹 Webhook удален, готов к polling.")
 
-    # Подключаем роутеры
-    dp.include_router(start_router)
-    dp.include_router(booking_router)
-    dp.include_router(hotels_router)
-    dp.include_router(bookings_router)
-    dp.include_router(admin_router)
-    dp.include_router(webapp_router)
-    dp.include_router(error_router) # Подключаем роутер с обработчиком ошибок
-    print("✅ Роутеры подключены.")
-
-    class LogUpdatesMiddleware(BaseMiddleware):
-        async def __call__(
-            self,
-            handler: Callable,
-            event: object,
-            data: Dict[str, Any]  
-        ) -> Any:
-                # Пытаемся определить тип события и user_id более явно
-                event_type = type(event).__name__ # Получаем имя класса события
-                user_id = "unknown_user"
-                if hasattr(event, 'from_user') and event.from_user:
-                    user_id = event.from_user.id
-                elif hasattr(event, 'message') and event.message and event.message.from_user:
-                     user_id = event.message.from_user.id
-                elif hasattr(event, 'callback_query') and event.callback_query and event.callback_query.from_user:
-                     user_id = event.callback_query.from_user.id
-                # Можно добавить другие типы, если нужно
-                
-                #logging.info(f"Получено обновление (Middleware): {event_type}, от user_id: {user_id}, сам event: {event}")
-                return await handler(event, data)
-
-    # Добавляем middleware к диспетчеру
-    dp.update.middleware(LogUpdatesMiddleware())
-
     # Добавим лог в main.py после инициализации
     from database import db_pool
     if db_pool is None:
@@ -99,10 +34,36 @@ async def main():
     else:
         logging.info(f"main.py: db_pool инициализирован, тип: {type(db_pool)}")
 
+    if METRICS_PORT:
+        from prometheus_client import start_http_server
+        start_http_server(METRICS_PORT)
+        print(f"📈 Метрики Prometheus: http://0.0.0.0:{METRICS_PORT}/metrics")
+
     print("🤖 Запуск aiogram polling...")
     # Запускаем polling. Это блокирующая операция.
-    await dp.start_polling(bot)
+    # Обновления идут через планировщик: по порядку внутри чата, параллельно между чатами (scheduler.py)
+    try:
+        await run_polling(dp, bot)
+    finally:
+        await close_db()
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
\ No newline at end of file
+    # Проверяем переменную окружения PROD, по умолчанию считаем, что режим - development (polling)
+    prod_mode = os.getenv("PROD", "false").lower() == "true"
+    print(f"🔄 Режим запуска: {'Production (webhook)' if prod_mode else 'Development (polling)'}")
+
+    if prod_mode:
+        # В production бот получает обновления через webhook внутри FastAPI-приложения:
+        # один процесс, один event loop и один пул БД для Mini App API и бота
+        if not WEBHOOK_BASE_URL:
+            # Без публичного адреса webhook не регистрируется и бот молча не получал бы обновлений
+            print("❌ PROD=true, но WEBHOOK_BASE_URL не задан: бот не сможет получать обновления. "
+                  "Задайте WEBHOOK_BASE_URL или запустите с PROD=false (polling).")
+            sys.exit(1)
+        import uvicorn
+        port = int(os.getenv("PORT", 8000))
+        print(f"🚀 Запуск FastAPI (API + webhook бота) на порту {port}...")
+        uvicorn.run("fastapi_app:app", host="0.0.0.0", port=port)
+    else:
+        import asyncio
+        asyncio.run(main())
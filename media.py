@@ -0,0 +1,219 @@
+# === МОДУЛЬ РЕЕСТРА МЕДИАФАЙЛОВ ===
+#
+# Картинки (фото на /start, галереи гостиниц) загружаются в Telegram один раз, а дальше
+# отправляются по file_id. Реестр хранится в таблице media_files по ключу
+# (бот, путь к файлу, sha256 содержимого): если файл на диске заменили, хэш изменится и
+# файл загрузится заново. При старте бота файлы заранее загружаются в чат администратора
+# (сообщение сразу удаляется), чтобы первый пользователь не ждал загрузку.
+#
+# Пути указываются относительно корня проекта через "/", например "images/iz_hotel1.jpg".
+
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+
+from config import ADMIN_CHAT_ID
+from database import get_media_file_ids, save_media_file_id, delete_media_file_id, get_all_hotel_photo_paths
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+START_PHOTO = "images/iz_hotel1.jpg"
+# Telegram принимает в одной медиагруппе не больше 10 файлов
+MEDIA_GROUP_LIMIT = 10
+
+# (path, sha256) -> file_id для бота _registry_bot_id
+_file_ids: Dict[Tuple[str, str], str] = {}
+_registry_bot_id: Optional[int] = None
+# path -> (mtime_ns, size, sha256): файл перехэшируется, только если изменился на диске
+_hashes: Dict[str, Tuple[int, int, str]] = {}
+# Одна загрузка одного файла за раз: параллельные запросы дождутся file_id первой
+_upload_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+_prewarm_task: Optional[asyncio.Task] = None
+
+
+def _abs_path(path: str) -> str:
+    return os.path.join(BASE_DIR, *path.split("/"))
+
+
+def _hash_file(abs_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(abs_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def _file_hash(path: str) -> str:
+    """sha256 файла; FileNotFoundError, если файла нет"""
+    abs_path = _abs_path(path)
+    stat = os.stat(abs_path)
+    cached = _hashes.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    sha256 = await asyncio.to_thread(_hash_file, abs_path)
+    _hashes[path] = (stat.st_mtime_ns, stat.st_size, sha256)
+    return sha256
+
+
+async def _load_registry(bot: Bot, force: bool = False):
+    global _file_ids, _registry_bot_id
+    if not force and _registry_bot_id == bot.id:
+        return
+    try:
+        _file_ids = await get_media_file_ids(bot.id)
+        _registry_bot_id = bot.id
+    except Exception as e:
+        # Без реестра файлы просто загрузятся заново
+        logging.error(f"media.py: не удалось загрузить реестр file_id: {e}")
+
+
+async def _remember(bot: Bot, path: str, sha256: str, message: Message):
+    photo = message.photo[-1]
+    _file_ids[(path, sha256)] = photo.file_id
+    try:
+        await save_media_file_id(bot.id, path, sha256, photo.file_id, photo.file_unique_id)
+    except Exception as e:
+        logging.error(f"media.py: не удалось сохранить file_id для {path}: {e}")
+
+
+async def _forget(bot: Bot, path: str, sha256: str):
+    _file_ids.pop((path, sha256), None)
+    try:
+        await delete_media_file_id(bot.id, path, sha256)
+    except Exception as e:
+        logging.error(f"media.py: не удалось удалить file_id для {path}: {e}")
+
+
+def _is_file_id_error(error: TelegramBadRequest) -> bool:
+    # "wrong file identifier", "wrong remote file identifier specified" и т.п.;
+    # остальные ошибки (например, "chat not found") к file_id отношения не имеют
+    return "file" in str(error).lower()
+
+
+async def send_photo(bot: Bot, chat_id: int, path: str, **kwargs) -> Message:
+    """Отправляет фото по file_id, а если его ещё нет — загружает файл и запоминает file_id"""
+    sha256 = await _file_hash(path)
+    await _load_registry(bot)
+    key = (path, sha256)
+
+    file_id = _file_ids.get(key)
+    if file_id:
+        try:
+            return await bot.send_photo(chat_id, file_id, **kwargs)
+        except TelegramBadRequest as e:
+            if not _is_file_id_error(e):
+                raise
+            # file_id больше не принимается — загружаем файл заново
+            logging.warning(f"media.py: file_id для {path} отклонён ({e}), загружаю заново")
+            await _forget(bot, path, sha256)
+
+    lock = _upload_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        file_id = _file_ids.get(key)
+        if file_id is None:
+            # Файл мог загрузить другой воркер
+            await _load_registry(bot, force=True)
+            file_id = _file_ids.get(key)
+        if file_id:
+            return await bot.send_photo(chat_id, file_id, **kwargs)
+        message = await bot.send_photo(chat_id, FSInputFile(_abs_path(path)), **kwargs)
+        await _remember(bot, path, sha256, message)
+        return message
+
+
+async def send_media_group(bot: Bot, chat_id: int, photos: List[dict], **kwargs) -> List[Message]:
+    """
+    Отправляет галерею [{"path", "caption"}] медиагруппами по 10 фото.
+    Уже загруженные файлы идут по file_id, новые загружаются и попадают в реестр.
+    Отсутствующие на диске файлы пропускаются.
+    """
+    await _load_registry(bot)
+    items = []
+    for photo in photos:
+        try:
+            items.append({**photo, "sha256": await _file_hash(photo["path"])})
+        except FileNotFoundError:
+            logging.error(f"media.py: файл {photo['path']} не найден, пропускаю")
+
+    sent = []
+    for start in range(0, len(items), MEDIA_GROUP_LIMIT):
+        chunk = items[start:start + MEDIA_GROUP_LIMIT]
+        try:
+            messages = await _send_group_chunk(bot, chat_id, chunk, use_file_ids=True, **kwargs)
+        except TelegramBadRequest as e:
+            if not _is_file_id_error(e):
+                raise
+            # Какой-то из file_id отклонён — забываем их и загружаем файлы этой пачки заново
+            logging.warning(f"media.py: медиагруппа по file_id отклонена ({e}), загружаю заново")
+            for item in chunk:
+                if (item["path"], item["sha256"]) in _file_ids:
+                    await _forget(bot, item["path"], item["sha256"])
+            messages = await _send_group_chunk(bot, chat_id, chunk, use_file_ids=False, **kwargs)
+        sent.extend(messages)
+    return sent
+
+
+async def _send_group_chunk(bot: Bot, chat_id: int, chunk: List[dict], use_file_ids: bool, **kwargs) -> List[Message]:
+    media = []
+    uploaded = []
+    for index, item in enumerate(chunk):
+        file_id = _file_ids.get((item["path"], item["sha256"])) if use_file_ids else None
+        if file_id is None:
+            uploaded.append(index)
+        media.append(InputMediaPhoto(
+            media=file_id or FSInputFile(_abs_path(item["path"])),
+            caption=item.get("caption"),
+            parse_mode="HTML",
+        ))
+    messages = await bot.send_media_group(chat_id, media, **kwargs)
+    # Telegram возвращает сообщения в порядке файлов
+    for index in uploaded:
+        await _remember(bot, chunk[index]["path"], chunk[index]["sha256"], messages[index])
+    return messages
+
+
+# === ПРЕДЗАГРУЗКА ПРИ СТАРТЕ ===
+
+async def prewarm(bot: Bot, paths: List[str], chat_id: int = ADMIN_CHAT_ID):
+    """Загружает файлы без file_id в служебный чат и сразу удаляет сообщения"""
+    if not chat_id:
+        logging.info("media.py: ADMIN_CHAT_ID не задан, предзагрузка медиа пропущена")
+        return
+    await _load_registry(bot, force=True)
+    for path in paths:
+        try:
+            if (path, await _file_hash(path)) in _file_ids:
+                continue
+            message = await send_photo(bot, chat_id, path, disable_notification=True)
+            await bot.delete_message(chat_id, message.message_id)
+            logging.info(f"media.py: {path} загружен заранее")
+        except Exception as e:
+            logging.error(f"media.py: не удалось заранее загрузить {path}: {e}")
+
+
+async def _prewarm_all(bot: Bot):
+    paths = [START_PHOTO]
+    try:
+        paths += [p for p in await get_all_hotel_photo_paths() if p != START_PHOTO]
+    except Exception as e:
+        logging.error(f"media.py: не удалось получить список фото гостиниц: {e}")
+    await prewarm(bot, paths)
+
+
+def start_prewarm(bot: Bot):
+    """Запускает предзагрузку в фоне, не задерживая старт бота"""
+    global _prewarm_task
+    if _prewarm_task is None or _prewarm_task.done():
+        _prewarm_task = asyncio.get_running_loop().create_task(_prewarm_all(bot))
+
+
+async def stop_prewarm():
+    global _prewarm_task
+    if _prewarm_task is not None:
+        _prewarm_task.cancel()
+        _prewarm_task = None
@@ -0,0 +1,168 @@
+# === МОДУЛЬ МЕТРИК (Prometheus) ===
+#
+# Метрики бота и обращений к Telegram API. Отдаются на /metrics FastAPI-приложения,
+# а при запуске через polling (main.py) — отдельным HTTP-сервером на METRICS_PORT.
+#
+# UpdateMetricsMiddleware — внешний middleware на dp.update: число и время обработки
+# обновлений по типу. HandlerMetricsMiddleware — внутренний middleware на событиях
+# (message, callback_query, ...): вызывается только когда найден обработчик, поэтому
+# знает его имя (data["handler"]) и видит, в какое состояние FSM обработчик перевёл пользователя.
+# TelegramApiMetricsMiddleware — middleware сессии бота: время каждого вызова API.
+
+import time
+from typing import Any, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.types import Update
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Обработчики бота — это десятки миллисекунд, запросы к Telegram — сотни
+HANDLER_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+API_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+UPDATES = Counter("bot_updates_total", "Полученные обновления Telegram", ["event"])
+UPDATE_DURATION = Histogram(
+    "bot_update_duration_seconds", "Время обработки обновления целиком", ["event"], buckets=HANDLER_BUCKETS
+)
+HANDLER_DURATION = Histogram(
+    "bot_handler_duration_seconds", "Время работы обработчика", ["event", "handler"], buckets=HANDLER_BUCKETS
+)
+HANDLERS_IN_FLIGHT = Gauge("bot_handlers_in_flight", "Обработчики, выполняющиеся сейчас", ["event", "handler"])
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Необработанные исключения в обработчиках", ["event", "handler", "exception"]
+)
+FSM_TRANSITIONS = Counter("bot_fsm_transitions_total", "Переходы между состояниями FSM", ["from_state", "to_state"])
+API_DURATION = Histogram(
+    "telegram_api_request_duration_seconds", "Время вызова Telegram Bot API", ["method"], buckets=API_BUCKETS
+)
+API_ERRORS = Counter("telegram_api_errors_total", "Ошибки вызовов Telegram Bot API", ["method", "exception"])
+
+# === БАЗА ДАННЫХ (заполняются в db_stats.py) ===
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "Время выполнения запроса к БД", ["query"], buckets=DB_BUCKETS)
+DB_QUERY_ROWS = Counter("db_query_rows_total", "Строки, возвращённые или изменённые запросами", ["query"])
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "Ошибки запросов к БД", ["query", "exception"])
+DB_POOL_ACQUIRE_WAIT = Histogram(
+    "db_pool_acquire_wait_seconds", "Ожидание свободного соединения из пула", buckets=DB_BUCKETS
+)
+DB_POOL_WAITING = Gauge("db_pool_waiting", "Запросы, ожидающие соединение из пула")
+DB_POOL_CONNECTIONS = Gauge("db_pool_connections", "Соединения пула: used, idle, max", ["state"])
+DB_POOL_SATURATION = Gauge("db_pool_saturation", "Доля занятых соединений от максимума пула (0…1)")
+DB_READS = Counter("db_reads_total", "Соединения для чтения по месту выполнения: replica или primary", ["target"])
+DB_REPLICA_HEALTHY = Gauge("db_replica_healthy", "1 — чтение идёт с реплики, 0 — реплика недоступна или отстаёт")
+DB_REPLICA_LAG = Gauge("db_replica_lag_seconds", "Отставание реплики при последней проверке")
+
+# === ПЛАНИРОВЩИК ОБНОВЛЕНИЙ (заполняются в scheduler.py) ===
+QUEUE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SCHEDULER_QUEUE_WAIT = Histogram(
+    "bot_update_queue_wait_seconds", "Ожидание обновления в очереди до начала обработки", buckets=QUEUE_BUCKETS
+)
+SCHEDULER_QUEUED = Gauge("bot_update_queue_depth", "Обновления в очереди планировщика")
+SCHEDULER_ACTIVE_CHATS = Gauge("bot_update_queue_chats", "Чаты, у которых есть необработанные обновления")
+SCHEDULER_BUSY_WORKERS = Gauge("bot_update_workers_busy", "Воркеры планировщика, занятые обработкой")
+SCHEDULER_SHED = Counter("bot_updates_shed_total", "Обновления, отброшенные планировщиком", ["reason"])
+
+# === ОГРАНИЧЕНИЕ ЧАСТОТЫ (throttling.py) ===
+THROTTLED = Counter("bot_updates_throttled_total", "Обновления, не обработанные из-за лимита частоты", ["handler"])
+
+# Метка для событий и состояний, которых нет
+NONE_LABEL = "none"
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    handler = data.get("handler")
+    callback = getattr(handler, "callback", None)
+    if callback is None:
+        return "unknown"
+    return f"{callback.__module__}.{getattr(callback, '__qualname__', type(callback).__name__)}"
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler: Callable, event: Any, data: Dict[str, Any]) -> Any:
+        event_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        UPDATES.labels(event_type).inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_DURATION.labels(event_type).observe(time.perf_counter() - started)
+
+
+# Обработчик не менял состояние FSM
+_UNCHANGED = object()
+
+
+class _TrackedFSMContext(FSMContext):
+    """FSMContext, который запоминает последнее установленное обработчиком состояние"""
+
+    def __init__(self, context: FSMContext):
+        super().__init__(storage=context.storage, key=context.key)
+        self.new_state = _UNCHANGED
+
+    async def set_state(self, state=None) -> None:
+        await super().set_state(state)
+        # clear() тоже проходит через set_state(None)
+        self.new_state = state.state if isinstance(state, State) else state
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    def __init__(self, event_type: str):
+        # Имя наблюдателя (message, callback_query, ...), как event_type у Update
+        self.event_type = event_type
+
+    async def __call__(self, handler: Callable, event: Any, data: Dict[str, Any]) -> Any:
+        event_type = self.event_type
+        name = handler_name(data)
+        in_flight = HANDLERS_IN_FLIGHT.labels(event_type, name)
+        # Переход считаем по вызовам set_state/clear обработчика, а не повторным чтением
+        # состояния из хранилища после него (с RedisStorage это лишний запрос на каждое обновление)
+        state = data.get("state")
+        if state is not None:
+            state = data["state"] = _TrackedFSMContext(state)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.labels(event_type, name, type(e).__name__).inc()
+            raise
+        finally:
+            HANDLER_DURATION.labels(event_type, name).observe(time.perf_counter() - started)
+            in_flight.dec()
+
+        if state is not None and state.new_state is not _UNCHANGED:
+            # Состояние до обработчика aiogram кладёт в raw_state
+            before = data.get("raw_state")
+            after = state.new_state
+            if before != after:
+                FSM_TRANSITIONS.labels(before or NONE_LABEL, after or NONE_LABEL).inc()
+        return result
+
+
+class TelegramApiMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot: Bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            API_DURATION.labels(name).observe(time.perf_counter() - started)
+
+
+def setup_dispatcher_metrics(dp):
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    # Внутренние middleware наследуются вложенными роутерами
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(HandlerMetricsMiddleware(name))
+
+
+def render_latest():
+    """Текущие значения метрик в формате Prometheus: (тело, content-type)"""
+    return generate_latest(), CONTENT_TYPE_LATEST
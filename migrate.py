@@ -0,0 +1,146 @@
+# === МОДУЛЬ МИГРАЦИЙ СХЕМЫ БД ===
+#
+# Миграции — файлы migrations/NNNN_описание.sql, применяются по порядку номера.
+# Применённые версии хранятся в таблице schema_migrations.
+# Файл, первая строка которого "-- migrate: no-transaction", выполняется вне транзакции
+# по одной команде (нужно для CREATE INDEX CONCURRENTLY).
+#
+# Запуск:
+#   python migrate.py status   — показать применённые и ожидающие миграции
+#   python migrate.py up       — применить все ожидающие миграции
+
+import asyncio
+import logging
+import os
+import re
+import sys
+from typing import List, Dict
+
+import asyncpg
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+# Ключ advisory-блокировки: бот и API могут стартовать одновременно
+MIGRATIONS_LOCK_ID = 7_260_001
+LOCK_RETRY_DELAY = 0.5
+
+_FILENAME_RE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+
+def load_migrations() -> List[Dict]:
+    """Список миграций из MIGRATIONS_DIR, отсортированный по версии"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _FILENAME_RE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, filename), encoding="utf-8") as f:
+            sql = f.read()
+        migrations.append({
+            "version": match.group(1),
+            "name": match.group(2),
+            "sql": sql,
+            "transactional": not sql.startswith(NO_TRANSACTION_MARKER),
+        })
+    migrations.sort(key=lambda m: int(m["version"]))
+    return migrations
+
+
+async def _ensure_version_table(conn):
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+async def get_applied_versions(conn) -> set:
+    exists = await conn.fetchval("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not exists:
+        return set()
+    rows = await conn.fetch("SELECT version FROM schema_migrations")
+    return {r["version"] for r in rows}
+
+
+async def get_pending(conn) -> List[Dict]:
+    """Миграции, которые ещё не применены (только чтение, без DDL)"""
+    applied = await get_applied_versions(conn)
+    return [m for m in load_migrations() if m["version"] not in applied]
+
+
+def _split_statements(sql: str) -> List[str]:
+    # Только для no-transaction файлов: в них простые команды без $$-блоков
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+async def _apply_one(conn, migration: Dict):
+    logging.info(f"migrate.py: применяю {migration['version']}_{migration['name']}")
+    if migration["transactional"]:
+        async with conn.transaction():
+            await conn.execute(migration["sql"])
+            await conn.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                migration["version"], migration["name"]
+            )
+    else:
+        for statement in _split_statements(migration["sql"]):
+            await conn.execute(statement)
+        await conn.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+            migration["version"], migration["name"]
+        )
+
+
+def _log_server_message(conn, message):
+    # WARNING/NOTICE из миграций (например, какие строки пришлось исправить перед ограничением)
+    logging.warning(f"migrate.py: {message.message}")
+
+
+async def apply_migrations(conn) -> List[Dict]:
+    """Применяет все ожидающие миграции под advisory-блокировкой, возвращает применённые"""
+    # Ждём блокировку короткими попытками, а не pg_advisory_lock: ожидающий запрос держал бы снимок,
+    # и CREATE INDEX CONCURRENTLY в соседнем процессе ждал бы его бесконечно
+    while not await conn.fetchval("SELECT pg_try_advisory_lock($1)", MIGRATIONS_LOCK_ID):
+        await asyncio.sleep(LOCK_RETRY_DELAY)
+    conn.add_log_listener(_log_server_message)
+    try:
+        await _ensure_version_table(conn)
+        # Перечитываем под блокировкой: другой процесс мог успеть применить миграции
+        pending = await get_pending(conn)
+        for migration in pending:
+            await _apply_one(conn, migration)
+        return pending
+    finally:
+        conn.remove_log_listener(_log_server_message)
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATIONS_LOCK_ID)
+
+
+async def _main(command: str):
+    from config import DATABASE_URL
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        if command == "status":
+            applied = await get_applied_versions(conn)
+            for m in load_migrations():
+                mark = "✅" if m["version"] in applied else "⏳"
+                print(f"{mark} {m['version']}_{m['name']}")
+        elif command == "up":
+            applied = await apply_migrations(conn)
+            if applied:
+                for m in applied:
+                    print(f"✅ Применена миграция {m['version']}_{m['name']}")
+            else:
+                print("✅ Схема актуальна, миграций для применения нет.")
+        else:
+            print(f"❌ Неизвестная команда: {command}. Используйте status или up.")
+            sys.exit(2)
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "status"))
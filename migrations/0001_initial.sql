@@ -0,0 +1,27 @@
+-- Исходная схема (раньше создавалась в init_db)
+
+CREATE TABLE IF NOT EXISTS hotels (
+    id SERIAL PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT,
+    address TEXT
+);
+
+CREATE TABLE IF NOT EXISTS room_categories (
+    id SERIAL PRIMARY KEY,
+    hotel_id INTEGER REFERENCES hotels(id),
+    name TEXT NOT NULL,
+    description TEXT,
+    price DECIMAL(10,2)
+);
+
+CREATE TABLE IF NOT EXISTS bookings (
+    id SERIAL PRIMARY KEY,
+    telegram_id BIGINT NOT NULL,
+    hotel_id INTEGER REFERENCES hotels(id),
+    room_category_id INTEGER REFERENCES room_categories(id),
+    check_in DATE,
+    check_out DATE,
+    status TEXT DEFAULT 'Заявка',
+    created_at TIMESTAMP DEFAULT NOW()
+);
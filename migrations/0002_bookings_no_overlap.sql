@@ -0,0 +1,52 @@
+-- Пересечение дат у активных броней одного пользователя запрещает сама БД
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Уже существующие данные могут нарушать ограничение, и тогда миграция упала бы.
+-- Перед его созданием такие брони отменяются, о каждой пишется WARNING (migrate.py выводит в лог):
+--   - даты перепутаны (заезд позже выезда) — daterange для них не строится;
+--   - бронь пересекается с более ранней (по id) активной бронью того же пользователя —
+--     остаётся самая ранняя, поздние отменяются по одной, пока пересечений не останется.
+DO $$
+DECLARE
+    conflict RECORD;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'bookings_no_overlap') THEN
+        RETURN;
+    END IF;
+
+    FOR conflict IN
+        SELECT id, telegram_id, check_in, check_out FROM bookings
+        WHERE status <> 'cancelled' AND check_in > check_out
+    LOOP
+        UPDATE bookings SET status = 'cancelled' WHERE id = conflict.id;
+        RAISE WARNING 'bookings_no_overlap: бронь % пользователя % (% — %) с заездом позже выезда отменена',
+            conflict.id, conflict.telegram_id, conflict.check_in, conflict.check_out;
+    END LOOP;
+
+    LOOP
+        SELECT b.id, b.telegram_id, b.check_in, b.check_out, e.id AS earlier_id INTO conflict
+        FROM bookings b
+        JOIN bookings e ON e.telegram_id = b.telegram_id AND e.id < b.id AND e.status <> 'cancelled'
+            AND daterange(e.check_in, e.check_out) && daterange(b.check_in, b.check_out)
+        WHERE b.status <> 'cancelled'
+        ORDER BY b.id, e.id
+        LIMIT 1;
+        EXIT WHEN NOT FOUND;
+
+        UPDATE bookings SET status = 'cancelled' WHERE id = conflict.id;
+        RAISE WARNING 'bookings_no_overlap: бронь % пользователя % (% — %) пересекается с бронью % и отменена',
+            conflict.id, conflict.telegram_id, conflict.check_in, conflict.check_out, conflict.earlier_id;
+    END LOOP;
+END
+$$;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'bookings_no_overlap') THEN
+        ALTER TABLE bookings ADD CONSTRAINT bookings_no_overlap
+            EXCLUDE USING gist (telegram_id WITH =, daterange(check_in, check_out) WITH &&)
+            WHERE (status <> 'cancelled');
+    END IF;
+END
+$$;
@@ -0,0 +1,16 @@
+-- Триггеры оповещают все процессы (бот и API) об изменении каталога (см. catalog_cache.py)
+
+CREATE OR REPLACE FUNCTION notify_catalog_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('catalog_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER hotels_catalog_changed
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON hotels
+FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_changed();
+
+CREATE OR REPLACE TRIGGER room_categories_catalog_changed
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON room_categories
+FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_changed();
@@ -0,0 +1,20 @@
+-- Номерной фонд: rooms_total = число номеров категории (NULL — без ограничений),
+-- room_nights — сколько номеров категории занято в каждую ночь
+
+ALTER TABLE room_categories ADD COLUMN IF NOT EXISTS rooms_total INTEGER CHECK (rooms_total >= 0);
+
+CREATE TABLE IF NOT EXISTS room_nights (
+    room_category_id INTEGER NOT NULL REFERENCES room_categories(id),
+    night DATE NOT NULL,
+    booked INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (room_category_id, night)
+);
+
+-- Заполняем счётчики по уже существующим активным броням
+INSERT INTO room_nights (room_category_id, night, booked)
+SELECT b.room_category_id, d::date, count(*)
+FROM bookings b
+CROSS JOIN generate_series(b.check_in, b.check_out - 1, interval '1 day') d
+WHERE b.status <> 'cancelled' AND b.room_category_id IS NOT NULL AND b.check_in < b.check_out
+GROUP BY 1, 2
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,14 @@
+-- migrate: no-transaction
+-- Индексы под запросы database.py. CONCURRENTLY не блокирует запись в большие таблицы,
+-- но не работает внутри транзакции, поэтому файл применяется по одной команде.
+-- Если построение прервалось, останется невалидный индекс: удалите его (DROP INDEX) и повторите migrate.
+
+-- get_user_bookings: активные брони пользователя, новые сверху, без обращения к таблице
+CREATE INDEX CONCURRENTLY IF NOT EXISTS bookings_user_active_idx
+    ON bookings (telegram_id, created_at DESC, id DESC)
+    INCLUDE (hotel_id, room_category_id, check_in, check_out, status)
+    WHERE status <> 'cancelled';
+
+-- Категории гостиницы (перезагрузка каталога, выбор категории без кэша)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS room_categories_hotel_name_idx
+    ON room_categories (hotel_id, name);
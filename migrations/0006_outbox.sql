@@ -0,0 +1,31 @@
+-- Transactional outbox: уведомления пишутся в той же транзакции, что и изменение брони,
+-- и доставляются в Telegram фоновым диспетчером (outbox.py)
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGSERIAL PRIMARY KEY,
+    chat_id BIGINT NOT NULL,
+    text TEXT NOT NULL,
+    parse_mode TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    sent_at TIMESTAMP,
+    failed_at TIMESTAMP,
+    last_error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS outbox_pending_idx
+    ON outbox (next_attempt_at, id)
+    WHERE sent_at IS NULL AND failed_at IS NULL;
+
+-- Будим диспетчер сразу после коммита, не дожидаясь периодического опроса
+CREATE OR REPLACE FUNCTION notify_outbox_new() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('outbox_new', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER outbox_new
+AFTER INSERT ON outbox
+FOR EACH STATEMENT EXECUTE FUNCTION notify_outbox_new();
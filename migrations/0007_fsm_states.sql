@@ -0,0 +1,12 @@
+-- Хранилище состояний FSM aiogram (fsm_storage.PostgresStorage): формы бронирования
+-- переживают перезапуск и доступны всем воркерам бота
+
+CREATE TABLE IF NOT EXISTS fsm_states (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data JSONB NOT NULL DEFAULT '{}'::jsonb,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Удаление брошенных форм по TTL
+CREATE INDEX IF NOT EXISTS fsm_states_updated_at_idx ON fsm_states (updated_at);
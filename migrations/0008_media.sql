@@ -0,0 +1,24 @@
+-- Реестр загруженных в Telegram файлов (media.py): файл загружается один раз,
+-- дальше отправляется по file_id. file_id действителен только для загрузившего бота,
+-- а при изменении файла на диске меняется sha256 — тогда файл загружается заново
+
+CREATE TABLE IF NOT EXISTS media_files (
+    bot_id BIGINT NOT NULL,
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    file_unique_id TEXT,
+    uploaded_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (bot_id, path, sha256)
+);
+
+-- Фотогалереи гостиниц: пути к файлам относительно корня проекта (например images/hotels/alfa_1.jpg)
+CREATE TABLE IF NOT EXISTS hotel_photos (
+    id SERIAL PRIMARY KEY,
+    hotel_id INTEGER NOT NULL REFERENCES hotels(id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    caption TEXT,
+    position INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS hotel_photos_hotel_idx ON hotel_photos (hotel_id, position, id);
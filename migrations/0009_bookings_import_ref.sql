@@ -0,0 +1,10 @@
+-- migrate: no-transaction
+-- Ключ брони из внешней системы (catalog_import.py): повторный импорт того же файла
+-- не создаёт дубликатов. Колонка без значения по умолчанию добавляется мгновенно,
+-- индекс строится CONCURRENTLY, чтобы не блокировать запись в bookings.
+
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS import_ref TEXT;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS bookings_import_ref_idx
+    ON bookings (import_ref)
+    WHERE import_ref IS NOT NULL;
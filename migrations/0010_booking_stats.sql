@@ -0,0 +1,50 @@
+-- Аналитика спроса: заявки и отмены по категориям и дням.
+-- booking_stats_daily пополняется инкрементально (database.refresh_booking_stats) только по новым
+-- строкам bookings, а не пересчитывается заново. Новые строки находятся по номеру транзакции:
+-- created_xid / cancelled_xid сравниваются с водяным знаком stats_watermarks.low_xid — в отличие от
+-- bookings.id, он не пропускает строки транзакций, которые закоммитились позже соседних.
+-- Загрузка по ночам уже ведётся в room_nights.
+
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS created_xid xid8;
+ALTER TABLE bookings ALTER COLUMN created_xid SET DEFAULT pg_current_xact_id();
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS cancelled_at TIMESTAMP;
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS cancelled_xid xid8;
+
+CREATE INDEX IF NOT EXISTS bookings_created_xid_idx ON bookings (created_xid) WHERE created_xid IS NOT NULL;
+CREATE INDEX IF NOT EXISTS bookings_cancelled_xid_idx ON bookings (cancelled_xid) WHERE cancelled_xid IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS booking_stats_daily (
+    room_category_id INTEGER NOT NULL REFERENCES room_categories(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    -- заявки, созданные в этот день, и запрошенные в них ночи
+    requests INTEGER NOT NULL DEFAULT 0,
+    requested_nights INTEGER NOT NULL DEFAULT 0,
+    -- отмены, сделанные в этот день
+    cancellations INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (room_category_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS booking_stats_daily_day_idx ON booking_stats_daily (day);
+
+CREATE TABLE IF NOT EXISTS stats_watermarks (
+    name TEXT PRIMARY KEY,
+    -- все транзакции с номером меньше low_xid уже учтены (не xmin: это имя системного столбца)
+    low_xid xid8 NOT NULL,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Уже существующие брони (created_xid IS NULL) учитываем один раз здесь. Время отмены у них
+-- неизвестно, поэтому отмена относится ко дню создания заявки
+INSERT INTO booking_stats_daily (room_category_id, day, requests, requested_nights, cancellations)
+SELECT room_category_id, created_at::date, count(*), sum(GREATEST(check_out - check_in, 0)),
+       count(*) FILTER (WHERE status = 'cancelled')
+FROM bookings
+WHERE created_xid IS NULL AND room_category_id IS NOT NULL AND created_at IS NOT NULL
+GROUP BY 1, 2
+ON CONFLICT DO NOTHING;
+
+-- ALTER TABLE выше держит блокировку bookings до конца миграции, поэтому транзакции старше
+-- текущего снимка уже завершены и попали в выборку выше, а более новые получат created_xid
+INSERT INTO stats_watermarks (name, low_xid)
+VALUES ('booking_stats', pg_snapshot_xmin(pg_current_snapshot()))
+ON CONFLICT DO NOTHING;
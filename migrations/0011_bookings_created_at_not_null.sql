@@ -0,0 +1,7 @@
+-- Keyset-пагинация «Моих броней» идёт по (created_at, id), и курсор строится из created_at.
+-- Старые брони без даты создания получают начало эпохи (самые старые в списке),
+-- после этого NULL в столбце запрещён.
+
+UPDATE bookings SET created_at = '1970-01-01' WHERE created_at IS NULL;
+
+ALTER TABLE bookings ALTER COLUMN created_at SET NOT NULL;
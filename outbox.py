@@ -0,0 +1,148 @@
+# === МОДУЛЬ ДОСТАВКИ УВЕДОМЛЕНИЙ ИЗ OUTBOX ===
+#
+# Обработчики записывают уведомления в таблицу outbox в той же транзакции, что и
+# изменение брони (см. database.create_booking / update_booking_status). Этот модуль
+# в фоне забирает их пачками, отправляет в Telegram и повторяет неудачные отправки.
+# В режиме сводки (OUTBOX_DIGEST_INTERVAL > 0) накопившиеся за интервал уведомления
+# в один чат приходят одним сообщением.
+
+import asyncio
+import logging
+from typing import Optional
+
+import asyncpg
+from aiogram import Bot
+
+from config import DATABASE_URL, OUTBOX_DIGEST_INTERVAL
+from database import claim_outbox_batch, mark_outbox_sent, mark_outbox_retry
+
+OUTBOX_CHANNEL = "outbox_new"
+BATCH_SIZE = 50
+# Опрос на случай потерянного NOTIFY или повторов по расписанию
+POLL_INTERVAL = 5
+# На это время уведомление закрепляется за воркером, пока идёт отправка
+LEASE_SECONDS = 60
+MAX_ATTEMPTS = 10
+BACKOFF_SECONDS = 5
+# Максимальная длина текста сообщения в Telegram
+MAX_MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n— — —\n\n"
+# Запас длины под заголовок сводки
+DIGEST_HEADER_RESERVE = 64
+
+_bot: Optional[Bot] = None
+_task: Optional[asyncio.Task] = None
+_listener_conn: Optional[asyncpg.Connection] = None
+_wakeup = asyncio.Event()
+
+
+def _group_for_delivery(rows: list) -> list:
+    """
+    Превращает пачку строк outbox в список сообщений {"chat_id", "text", "parse_mode", "ids"}.
+    Без режима сводки — по сообщению на строку, в режиме сводки — склеивает уведомления
+    в один чат с одним parse_mode, пока они влезают в одно сообщение.
+    """
+    if not OUTBOX_DIGEST_INTERVAL:
+        return [
+            {"chat_id": r["chat_id"], "text": r["text"], "parse_mode": r["parse_mode"], "ids": [r["id"]]}
+            for r in rows
+        ]
+
+    messages = []
+    open_digests = {}
+    for r in rows:
+        key = (r["chat_id"], r["parse_mode"])
+        digest = open_digests.get(key)
+        if digest is not None and digest["length"] + len(DIGEST_SEPARATOR) + len(r["text"]) <= MAX_MESSAGE_LENGTH:
+            digest["parts"].append(r["text"])
+            digest["ids"].append(r["id"])
+            digest["length"] += len(DIGEST_SEPARATOR) + len(r["text"])
+        else:
+            digest = {
+                "chat_id": r["chat_id"], "parse_mode": r["parse_mode"], "parts": [r["text"]], "ids": [r["id"]],
+                "length": DIGEST_HEADER_RESERVE + len(DIGEST_SEPARATOR) + len(r["text"]),
+            }
+            open_digests[key] = digest
+            messages.append(digest)
+
+    for digest in messages:
+        del digest["length"]
+        parts = digest.pop("parts")
+        if len(parts) == 1:
+            digest["text"] = parts[0]
+        else:
+            header = f"📬 Сводка уведомлений: {len(parts)}"
+            if digest["parse_mode"] == "HTML":
+                header = f"<b>{header}</b>"
+            digest["text"] = header + DIGEST_SEPARATOR + DIGEST_SEPARATOR.join(parts)
+    return messages
+
+
+async def _deliver(message: dict):
+    try:
+        await _bot.send_message(message["chat_id"], message["text"], parse_mode=message["parse_mode"])
+    except Exception as e:
+        logging.error(f"outbox.py: ошибка отправки в чат {message['chat_id']} (outbox {message['ids']}): {e}")
+        await mark_outbox_retry(message["ids"], str(e)[:1000], MAX_ATTEMPTS, BACKOFF_SECONDS)
+        return
+    await mark_outbox_sent(message["ids"])
+
+
+async def drain_once() -> int:
+    """Отправляет одну пачку уведомлений, возвращает число обработанных строк"""
+    rows = await claim_outbox_batch(BATCH_SIZE, LEASE_SECONDS)
+    if rows:
+        # Разные сообщения отправляем параллельно: лимиты Telegram соблюдает сессия бота
+        await asyncio.gather(*(_deliver(m) for m in _group_for_delivery(rows)))
+    return len(rows)
+
+
+async def _worker():
+    while True:
+        try:
+            # Полная пачка — скорее всего, есть ещё; сразу берём следующую
+            while await drain_once() == BATCH_SIZE:
+                pass
+        except Exception as e:
+            logging.error(f"outbox.py: ошибка обработки outbox: {e}")
+
+        if OUTBOX_DIGEST_INTERVAL:
+            # В режиме сводки копим уведомления весь интервал
+            await asyncio.sleep(OUTBOX_DIGEST_INTERVAL)
+            _wakeup.clear()
+            continue
+        try:
+            await asyncio.wait_for(_wakeup.wait(), POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+def _on_notify(conn, pid, channel, payload):
+    _wakeup.set()
+
+
+async def start(bot: Bot):
+    global _bot, _task, _listener_conn
+    if _task is not None and not _task.done():
+        return
+    _bot = bot
+    try:
+        _listener_conn = await asyncpg.connect(DATABASE_URL)
+        await _listener_conn.add_listener(OUTBOX_CHANNEL, _on_notify)
+    except Exception as e:
+        # Без LISTEN уведомления всё равно уйдут по периодическому опросу
+        logging.error(f"outbox.py: не удалось подписаться на {OUTBOX_CHANNEL}: {e}")
+        _listener_conn = None
+    _task = asyncio.get_running_loop().create_task(_worker())
+    logging.info("outbox.py: диспетчер уведомлений запущен.")
+
+
+async def stop():
+    global _task, _listener_conn
+    if _task is not None:
+        _task.cancel()
+        _task = None
+    if _listener_conn is not None:
+        conn, _listener_conn = _listener_conn, None
+        await conn.close()
@@ -0,0 +1,221 @@
+# === МОДУЛЬ ПЛАНИРОВЩИКА ОБНОВЛЕНИЙ ===
+#
+# Обновления Telegram раскладываются по очередям чатов. Обновления одного чата обрабатываются
+# строго по одному и по порядку (шаги BookingForm не обгоняют друг друга), разные чаты —
+# параллельно на фиксированном числе воркеров, так что при медленной БД число одновременных
+# обработчиков не растёт без предела.
+#
+# Защита от перегрузки:
+#   - общая очередь не больше SCHEDULER_MAX_QUEUE: polling перестаёт забирать обновления
+#     (put ждёт), webhook отвечает Telegram 503 и тот пришлёт обновление повторно;
+#   - очередь одного чата не больше SCHEDULER_MAX_CHAT_QUEUE: лишнее от флудящего чата отбрасывается;
+#   - обновление, прождавшее дольше SCHEDULER_MAX_WAIT секунд, отбрасывается — пользователь
+#     уже не ждёт ответа, а обработка лишь задержит следующие.
+#
+# Используется в webhook.py (submit) и в polling из main.py (run_polling).
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, Optional, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+from aiogram.utils.backoff import Backoff, BackoffConfig
+
+from config import SCHEDULER_MAX_CHAT_QUEUE, SCHEDULER_MAX_QUEUE, SCHEDULER_MAX_WAIT, SCHEDULER_WORKERS
+from metrics import (
+    SCHEDULER_ACTIVE_CHATS, SCHEDULER_BUSY_WORKERS, SCHEDULER_QUEUE_WAIT, SCHEDULER_QUEUED, SCHEDULER_SHED,
+)
+
+# Результаты submit
+ACCEPTED = "accepted"
+QUEUE_FULL = "queue_full"
+CHAT_QUEUE_FULL = "chat_queue_full"
+
+
+def chat_key(update: Update) -> Hashable:
+    """Ключ очереди: чат, иначе пользователь; обновления без того и другого не упорядочиваются"""
+    context = UserContextMiddleware.resolve_event_context(update)
+    if context.chat is not None:
+        return ("chat", context.chat.id)
+    if context.user is not None:
+        return ("user", context.user.id)
+    return ("update", update.update_id)
+
+
+class UpdateScheduler:
+    def __init__(self, dp: Dispatcher, bot: Bot, workers: int = SCHEDULER_WORKERS,
+                 max_queue: int = SCHEDULER_MAX_QUEUE, max_chat_queue: int = SCHEDULER_MAX_CHAT_QUEUE,
+                 max_wait: float = SCHEDULER_MAX_WAIT):
+        self.dp = dp
+        self.bot = bot
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_chat_queue = max_chat_queue
+        self.max_wait = max_wait
+        # ключ чата -> обновления, ждущие обработки (update, время постановки)
+        self._chats: Dict[Hashable, Deque[Tuple[Update, float]]] = {}
+        # Чаты, готовые к обработке. Чат попадает сюда, только если его сейчас никто не обрабатывает
+        # и его ещё нет в очереди, поэтому два воркера не возьмут один чат одновременно
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._busy = set()
+        self._queued = 0
+        self._space = asyncio.Condition()
+        self._tasks = []
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logging.info(f"scheduler.py: запущено воркеров: {self.workers}")
+
+    async def stop(self, timeout: float = 10):
+        """Даёт очереди разойтись не дольше timeout секунд, затем останавливает воркеры"""
+        if not self._tasks:
+            return
+        deadline = time.monotonic() + timeout
+        while (self._queued or self._busy) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._queued:
+            logging.warning(f"scheduler.py: при остановке не обработано обновлений: {self._queued}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, update: Update) -> str:
+        """Ставит обновление в очередь без ожидания; возвращает ACCEPTED или причину отказа"""
+        if self._queued >= self.max_queue:
+            SCHEDULER_SHED.labels(QUEUE_FULL).inc()
+            return QUEUE_FULL
+        key = chat_key(update)
+        chat = self._chats.get(key)
+        if chat is None:
+            chat = self._chats[key] = deque()
+            if key not in self._busy:
+                self._ready.put_nowait(key)
+        elif len(chat) >= self.max_chat_queue:
+            SCHEDULER_SHED.labels(CHAT_QUEUE_FULL).inc()
+            return CHAT_QUEUE_FULL
+        chat.append((update, time.monotonic()))
+        self._queued += 1
+        self._update_gauges()
+        return ACCEPTED
+
+    async def put(self, update: Update) -> str:
+        """Как submit, но при заполненной общей очереди ждёт места (для polling)"""
+        async with self._space:
+            await self._space.wait_for(lambda: self._queued < self.max_queue)
+        return self.submit(update)
+
+    def _update_gauges(self):
+        SCHEDULER_QUEUED.set(self._queued)
+        SCHEDULER_ACTIVE_CHATS.set(len(self._chats))
+
+    async def _notify_space(self):
+        async with self._space:
+            self._space.notify_all()
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            chat = self._chats.get(key)
+            if not chat:
+                self._chats.pop(key, None)
+                continue
+            update, queued_at = chat.popleft()
+            self._queued -= 1
+            self._busy.add(key)
+            SCHEDULER_BUSY_WORKERS.inc()
+            try:
+                waited = time.monotonic() - queued_at
+                SCHEDULER_QUEUE_WAIT.observe(waited)
+                if self.max_wait and waited > self.max_wait:
+                    SCHEDULER_SHED.labels("stale").inc()
+                    logging.warning(f"scheduler.py: обновление {update.update_id} ждало {waited:.1f} с, пропущено")
+                else:
+                    await self._process(update)
+            finally:
+                SCHEDULER_BUSY_WORKERS.dec()
+                self._busy.discard(key)
+                # Следующее обновление этого чата — в конец очереди готовых, чтобы не занимать воркер
+                if chat:
+                    self._ready.put_nowait(key)
+                else:
+                    self._chats.pop(key, None)
+                self._update_gauges()
+                await self._notify_space()
+
+    async def _process(self, update: Update):
+        # Отдельная задача на обновление — отдельная копия контекста: ContextVar, выставленные
+        # обработчиком (например, database._primary_until), не переживают его и не попадают
+        # в следующие обновления этого воркера
+        try:
+            await asyncio.create_task(self.dp.feed_update(self.bot, update))
+        except Exception as e:
+            logging.error(f"scheduler.py: ошибка обработки обновления {update.update_id}: {e}")
+
+
+# === POLLING ===
+
+# Long polling: сколько секунд Telegram держит запрос getUpdates, если обновлений нет
+POLLING_TIMEOUT = 30
+# Паузы между повторами при недоступности Telegram — как у dp.start_polling
+POLLING_BACKOFF = BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1)
+
+
+async def _listen_updates(bot: Bot, allowed_updates, polling_timeout: int = POLLING_TIMEOUT):
+    """
+    Бесконечный цикл getUpdates. Ошибки сети и Telegram не останавливают polling, а повторяются
+    с растущей паузой. Обновление подтверждается (offset) только после того, как его приняли
+    """
+    backoff = Backoff(config=POLLING_BACKOFF)
+    offset = None
+    # Запрос должен ждать дольше, чем Telegram держит long polling
+    request_timeout = int(bot.session.timeout + polling_timeout) if bot.session.timeout else None
+    failed = False
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset, timeout=polling_timeout, allowed_updates=allowed_updates,
+                request_timeout=request_timeout,
+            )
+        except Exception as e:
+            failed = True
+            logging.error(
+                f"scheduler.py: не удалось получить обновления ({type(e).__name__}: {e}), "
+                f"повтор через {backoff.next_delay:.1f} с"
+            )
+            await backoff.asleep()
+            continue
+        if failed:
+            logging.info("scheduler.py: связь с Telegram восстановлена")
+            backoff.reset()
+            failed = False
+        for update in updates:
+            yield update
+            offset = update.update_id + 1
+
+
+async def run_polling(dp: Dispatcher, bot: Bot, scheduler: Optional[UpdateScheduler] = None):
+    """
+    Замена dp.start_polling: обновления получаются через getUpdates и идут в планировщик.
+    Пока общая очередь заполнена, новые обновления не запрашиваются, а неподтверждённые
+    остаются на стороне Telegram.
+    """
+    scheduler = scheduler or UpdateScheduler(dp, bot)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    scheduler.start()
+    try:
+        async for update in _listen_updates(bot, allowed_updates=dp.resolve_used_update_types()):
+            await scheduler.put(update)
+    finally:
+        await scheduler.stop()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
@@ -0,0 +1,116 @@
+# === МОДУЛЬ ИСХОДЯЩИХ СООБЩЕНИЙ (лимиты Telegram) ===
+#
+# RateLimitMiddleware — middleware сессии бота: все вызовы API, адресованные чату
+# (send_message, message.answer, edit_message_text, ...), проходят через общий и
+# початовый лимиты, а TelegramRetryAfter выдерживается и запрос повторяется.
+#
+# Уведомления, которые обработчик не должен ждать, идут через outbox (outbox.py): там же
+# повторы и склейка накопившихся сообщений в один чат (режим сводки).
+
+import asyncio
+import logging
+import time
+from typing import Dict, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+# Лимиты Telegram Bot API: ~30 сообщений в секунду всего, 1 в секунду в личный чат,
+# 20 в минуту в группу. Это средние значения: короткую серию (ответ из нескольких сообщений)
+# Telegram пропускает, поэтому в чат можно отправить до *_CHAT_BURST сообщений подряд
+GLOBAL_RATE = 30
+PRIVATE_CHAT_RATE = 1.0
+PRIVATE_CHAT_BURST = 3
+GROUP_CHAT_RATE = 20 / 60
+GROUP_CHAT_BURST = 3
+MAX_RETRIES = 3
+# Неактивные чаты удаляются из таблицы лимитов
+CHAT_STATE_TTL = 600
+
+
+class RateLimiter:
+    """Общий token bucket плюс token bucket на каждый чат"""
+
+    def __init__(self, global_rate: float = GLOBAL_RATE):
+        self.global_rate = global_rate
+        self._tokens = global_rate
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        # chat_id -> (токены, момент пересчёта)
+        self._chats: Dict[int, Tuple[float, float]] = {}
+        # Flood wait от Telegram, не привязанный к чату: до этого момента бот не отправляет ничего
+        self._paused_until = 0.0
+        self._last_cleanup = time.monotonic()
+
+    def pause(self, seconds: float, chat_id=None):
+        """Flood wait: для чата — останавливаем только его bucket, иначе — все отправки"""
+        now = time.monotonic()
+        if chat_id is None:
+            self._paused_until = max(self._paused_until, now + seconds)
+            return
+        # Уводим bucket чата в минус: следующий acquire() этого чата выждет seconds, остальные чаты — нет
+        rate, burst = self._chat_limit(chat_id)
+        tokens, updated = self._chats.get(chat_id, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        self._chats[chat_id] = (min(tokens, 1 - seconds * rate), now)
+
+    @staticmethod
+    def _chat_limit(chat_id) -> Tuple[float, float]:
+        """(скорость в секунду, серия) для чата"""
+        # Отрицательные id и @username — группы и каналы
+        if isinstance(chat_id, int) and chat_id > 0:
+            return PRIVATE_CHAT_RATE, PRIVATE_CHAT_BURST
+        return GROUP_CHAT_RATE, GROUP_CHAT_BURST
+
+    async def acquire(self, chat_id=None):
+        async with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+
+            if chat_id is not None:
+                # Bucket чата: тоже резервируем токен с уходом в минус
+                rate, burst = self._chat_limit(chat_id)
+                tokens, updated = self._chats.get(chat_id, (burst, now))
+                tokens = min(burst, tokens + (now - updated) * rate) - 1
+                self._chats[chat_id] = (tokens, now)
+                if tokens < 0:
+                    wait = max(wait, -tokens / rate)
+
+            # Пополняем общий bucket и резервируем токен (допускаем уход в минус — это очередь)
+            self._tokens = min(self.global_rate, self._tokens + (now - self._updated) * self.global_rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.global_rate)
+
+            if now - self._last_cleanup > CHAT_STATE_TTL:
+                # Чат с полным bucket ничем не отличается от нового
+                for k, (tokens, updated) in list(self._chats.items()):
+                    rate, burst = self._chat_limit(k)
+                    if tokens + (now - updated) * rate >= burst:
+                        del self._chats[k]
+                self._last_cleanup = now
+
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+rate_limiter = RateLimiter()
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot: Bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        for attempt in range(MAX_RETRIES + 1):
+            # Лимитируем только запросы, адресованные чату (ответы на callback и т.п. не считаются)
+            if chat_id is not None:
+                await rate_limiter.acquire(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                logging.warning(f"sender.py: flood wait {e.retry_after} с для {type(method).__name__}, повторяю")
+                # Flood wait одного чата (например, группы админов) не должен останавливать остальных
+                rate_limiter.pause(e.retry_after, chat_id)
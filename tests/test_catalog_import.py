@@ -0,0 +1,40 @@
+# === ТЕСТЫ ПРОВЕРКИ СТРОК ИМПОРТА КАТАЛОГА ===
+#
+# Без БД: разбор файлов и проверка строк (catalog_import.parse_content / validate).
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_import import parse_content, validate
+
+
+def test_csv_column_named_row_does_not_replace_row_number():
+    content = "name,row\nГостиница,abc\n"
+    rows = parse_content(content, "csv", "hotels")["hotels"]
+    assert rows[0]["row"] == 2
+    records, errors = validate("hotels", rows)
+    assert records[0][0] == 2 and errors == []
+
+
+def test_json_key_named_row_does_not_replace_row_number():
+    content = '[{"name": "А", "row": "x"}, {"name": "Б", "row": 100}]'
+    rows = parse_content(content, "json", "hotels")["hotels"]
+    assert [r["row"] for r in rows] == [1, 2]
+
+
+def test_out_of_range_integers_are_row_errors():
+    categories = parse_content(
+        "hotel,name,rooms_total\nГ,Стандарт,2147483648\nГ,Люкс,2147483647\n", "csv", "categories"
+    )["categories"]
+    records, errors = validate("categories", categories)
+    assert [r[0] for r in records] == [3]
+    assert [e["row"] for e in errors] == [2]
+
+    bookings = parse_content(
+        '[{"telegram_id": 9223372036854775808, "hotel": "Г", "category": "С",'
+        ' "check_in": "2030-01-01", "check_out": "2030-01-02"}]', "json", "bookings"
+    )["bookings"]
+    records, errors = validate("bookings", bookings)
+    assert records == [] and errors[0]["row"] == 1 and "telegram_id" in errors[0]["error"]
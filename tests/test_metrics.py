@@ -0,0 +1,62 @@
+# === ТЕСТЫ МЕТРИК ОБРАБОТЧИКОВ (metrics.HandlerMetricsMiddleware) ===
+#
+# Без БД: состояние FSM хранится в MemoryStorage, чтения состояния считаются.
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import metrics
+
+
+class _Form(StatesGroup):
+    dates = State()
+
+
+class _CountingStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    async def get_state(self, key):
+        self.reads += 1
+        return await super().get_state(key)
+
+
+def _transitions(before, after) -> float:
+    from prometheus_client import REGISTRY
+    return REGISTRY.get_sample_value(
+        "bot_fsm_transitions_total", {"from_state": before, "to_state": after}
+    ) or 0.0
+
+
+def _run(handler):
+    storage = _CountingStorage()
+    state = FSMContext(storage, StorageKey(bot_id=1, chat_id=7, user_id=7))
+    data = {"state": state, "raw_state": None, "handler": None}
+    asyncio.run(metrics.HandlerMetricsMiddleware("message")(handler, object(), data))
+    return storage
+
+
+def test_transition_is_recorded_without_reading_state_back():
+    async def handler(event, data):
+        await data["state"].set_state(_Form.dates)
+
+    counted = _transitions(metrics.NONE_LABEL, "_Form:dates")
+    storage = _run(handler)
+    assert _transitions(metrics.NONE_LABEL, "_Form:dates") - counted == 1
+    assert storage.reads == 0
+
+
+def test_handler_without_state_change_does_not_touch_storage():
+    async def handler(event, data):
+        return None
+
+    assert _run(handler).reads == 0
@@ -0,0 +1,46 @@
+# === ТЕСТЫ ЛИМИТОВ ИСХОДЯЩИХ СООБЩЕНИЙ (sender.RateLimiter) ===
+#
+# Без БД и сети: asyncio.sleep подменяется, проверяется только рассчитанное ожидание.
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sender
+
+
+def _waits(monkeypatch, limiter, chat_ids):
+    """Сколько ждал acquire() для каждого чата по очереди"""
+    waits = []
+
+    async def fake_sleep(seconds):
+        waits[-1] = seconds
+
+    monkeypatch.setattr(sender.asyncio, "sleep", fake_sleep)
+
+    async def run():
+        for chat_id in chat_ids:
+            waits.append(0.0)
+            await limiter.acquire(chat_id)
+
+    asyncio.run(run())
+    return waits
+
+
+def test_flood_wait_of_one_chat_does_not_pause_others(monkeypatch):
+    limiter = sender.RateLimiter()
+    limiter.pause(30, chat_id=-100)
+
+    admin, user = _waits(monkeypatch, limiter, [-100, 555])
+    assert 29 < admin <= 30
+    assert user == 0.0
+
+
+def test_flood_wait_without_chat_pauses_everything(monkeypatch):
+    limiter = sender.RateLimiter()
+    limiter.pause(5)
+
+    waits = _waits(monkeypatch, limiter, [-100, 555])
+    assert all(4 < w <= 5 for w in waits)
@@ -0,0 +1,48 @@
+# === ТЕСТЫ ПРОГРЕВА ЧАСТЫХ ЗАПРОСОВ (database._prepare_hot_statements) ===
+#
+# Без БД: соединение подменяется, проверяется, что прогрев не ломает создание пула
+# на версиях asyncpg без подходящего Connection._prepare.
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+class _Connection:
+    def __init__(self):
+        self.executed = []
+
+    async def execute(self, query):
+        self.executed.append(query)
+
+
+class _OldConnection(_Connection):
+    async def _prepare(self, query, *, timeout=None):
+        raise AssertionError("вызов без use_cache")
+
+
+class _CurrentConnection(_Connection):
+    def __init__(self):
+        super().__init__()
+        self.prepared = []
+
+    async def _prepare(self, query, *, name=None, timeout=None, use_cache=False):
+        self.prepared.append((query, use_cache))
+
+
+def test_warmup_is_skipped_without_compatible_private_prepare():
+    for conn in (_Connection(), _OldConnection()):
+        asyncio.run(database._prepare_hot_statements(conn, readonly_only=False))
+        assert conn.executed == []
+
+
+def test_warmup_fills_statement_cache():
+    conn = _CurrentConnection()
+    asyncio.run(database._prepare_hot_statements(conn, readonly_only=True))
+    expected = [(query, True) for query, readonly in database._HOT_STATEMENTS if readonly]
+    assert expected and conn.prepared == expected
+    assert conn.executed == ["SELECT 1"]
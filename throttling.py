@@ -0,0 +1,132 @@
+# === МОДУЛЬ ОГРАНИЧЕНИЯ ЧАСТОТЫ ЗАПРОСОВ ===
+#
+# Token bucket на пользователя: в ведре до THROTTLE_BURST жетонов, пополняется со скоростью
+# THROTTLE_RATE жетонов в секунду, каждое сообщение или нажатие кнопки, для которого нашёлся
+# обработчик, забирает жетон. Пустое ведро — обработчик не вызывается, пользователь один раз
+# получает «не так быстро», остальные лишние нажатия молча пропускаются.
+#
+# Для отдельных обработчиков можно задать своё, более строгое ведро флагом:
+#   @router.message(F.text == '🎫 Мои брони', flags={"throttle": {"key": "my_bookings", "rate": 0.5, "burst": 3}})
+# Такое ведро считается дополнительно к общему ведру пользователя.
+#
+# Вёдра хранятся в памяти процесса. Ведро, которое простояло столько, что успело бы наполниться
+# заново, ничем не отличается от нового и удаляется; сверх THROTTLE_MAX_BUCKETS удаляются
+# давно не использованные.
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery
+
+from config import THROTTLE_BURST, THROTTLE_MAX_BUCKETS, THROTTLE_RATE
+from metrics import THROTTLED, handler_name
+
+SLOW_DOWN_TEXT = "⏳ Слишком много запросов. Подождите пару секунд и попробуйте снова."
+# Проверять простаивающие вёдра не чаще, чем раз в столько секунд
+EVICT_INTERVAL = 30
+
+
+class TokenBuckets:
+    """Вёдра жетонов по ключу: key -> [жетоны, время пополнения, предупреждён ли, время до наполнения]"""
+
+    def __init__(self, max_buckets: int = THROTTLE_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._evicted_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key: Hashable, rate: float, burst: float, now: float = None) -> Optional[bool]:
+        """
+        Забирает жетон. True — можно обрабатывать, False — ведро пустое и пользователя надо
+        предупредить, None — пустое и предупреждение уже было.
+        """
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(burst), now, False, burst / rate if rate > 0 else float("inf")]
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        self._evict(now)
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return True
+        if bucket[2]:
+            return None
+        bucket[2] = True
+        return False
+
+    def refund(self, key: Hashable):
+        """Возвращает жетон, взятый take(), если обработчик всё же не вызывается"""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] += 1
+
+    def _evict(self, now: float):
+        # Сначала самые старые: сверх лимита удаляем без условий
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        if now - self._evicted_at < EVICT_INTERVAL:
+            return
+        self._evicted_at = now
+        # Ведро, простоявшее дольше времени наполнения, уже полное — как новое.
+        # Порядок OrderedDict — по последнему обращению, дальше идут только более свежие
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < bucket[3]:
+                break
+            del self._buckets[key]
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, rate: float = THROTTLE_RATE, burst: float = THROTTLE_BURST,
+                 buckets: TokenBuckets = None):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = buckets or TokenBuckets()
+
+    async def __call__(self, handler: Callable, event: Any, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        # Middleware стоит только на message и callback_query — у обоих есть answer()
+        if user is None or self.rate <= 0:
+            return await handler(event, data)
+
+        user_key = ("user", user.id)
+        allowed = self.buckets.take(user_key, self.rate, self.burst)
+        flag = get_flag(data, "throttle")
+        if allowed and flag and flag.get("rate", self.rate) > 0:
+            allowed = self.buckets.take(
+                ("handler", flag["key"], user.id), flag.get("rate", self.rate), flag.get("burst", self.burst)
+            )
+            if not allowed:
+                # Обработчик не вызывается — жетон общего ведра не должен пропасть
+                self.buckets.refund(user_key)
+        if allowed:
+            return await handler(event, data)
+
+        THROTTLED.labels(handler_name(data)).inc()
+        # Предупреждаем один раз за серию; дальше молча пропускаем, не тратя вызовы Telegram
+        if allowed is False:
+            logging.info(f"throttling.py: пользователь {user.id} превысил лимит запросов")
+            await event.answer(SLOW_DOWN_TEXT)
+        elif isinstance(event, CallbackQuery):
+            # Без ответа кнопка остаётся в состоянии загрузки, пока Telegram не снимет его сам
+            await event.answer()
+        return None
+
+
+def setup_throttling(dp, middleware: ThrottlingMiddleware = None):
+    # Внутренний middleware: срабатывает, только когда обработчик найден, и видит его флаги
+    middleware = middleware or ThrottlingMiddleware()
+    dp.message.middleware(middleware)
+    dp.callback_query.middleware(middleware)
+    return middleware
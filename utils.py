@@ -1,16 +1,16 @@
 # === МОДУЛЬ УТИЛИТ === 
-from aiogram import Bot
+from database import enqueue_notification
 import logging
 
-async def notify_admin(bot: Bot, admin_chat_id: int, message: str):
+async def notify_admin(admin_chat_id: int, message: str, parse_mode: str = None):
     """
-    Отправляет сообщение администратору.
+    Ставит сообщение администратору в outbox; доставку и повторы выполняет outbox.py.
     """
     try:
-        await bot.send_message(chat_id=admin_chat_id, text=message)
-        logging.info(f"Уведомление админу {admin_chat_id} отправлено: {message[:50]}...") # Логируем первые 50 символов
+        await enqueue_notification(admin_chat_id, message, parse_mode)
+        logging.info(f"Уведомление админу {admin_chat_id} поставлено в очередь: {message[:50]}...") # Логируем первые 50 символов
     except Exception as e:
-        logging.error(f"Ошибка при отправке уведомления админу {admin_chat_id}: {e}")
+        logging.error(f"Ошибка при постановке уведомления админу {admin_chat_id} в очередь: {e}")
 
 def sanitize_miniapp_data_universal(data: dict) -> dict:
     safe_data = {}
@@ -0,0 +1,74 @@
+# === МОДУЛЬ WEBHOOK БОТА (внутри FastAPI) ===
+# Telegram шлёт обновления на WEBHOOK_PATH; отвечаем 200 сразу, а обработчики aiogram
+# выполняются в фоне в том же event loop и с тем же пулом БД, что и Mini App API.
+# Очерёдность и параллельность обработки задаёт планировщик (scheduler.py); если его общая
+# очередь заполнена, отвечаем 503 — Telegram повторит доставку позже.
+
+import hmac
+import logging
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from config import WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET
+from dispatcher import create_dispatcher
+from scheduler import UpdateScheduler, QUEUE_FULL
+import loader
+
+# Сколько ждать незавершённые обработчики при остановке
+SHUTDOWN_TIMEOUT = 10
+
+router = APIRouter()
+
+bot: Optional[Bot] = None
+dp: Optional[Dispatcher] = None
+scheduler: Optional[UpdateScheduler] = None
+
+def is_enabled() -> bool:
+    return bool(WEBHOOK_BASE_URL)
+
+async def start_webhook():
+    """Создаёт бота и диспетчер и регистрирует webhook в Telegram"""
+    global bot, dp, scheduler
+    bot = loader.bot
+    dp = create_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    scheduler = UpdateScheduler(dp, bot)
+    scheduler.start()
+
+    url = WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH
+    await bot.set_webhook(
+        url,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logging.info(f"webhook.py: webhook установлен на {url}")
+
+async def stop_webhook():
+    global bot, dp, scheduler
+    if bot is None:
+        return
+    # Webhook в Telegram не удаляем: при перезапуске обновления дождутся нового процесса
+    if scheduler.queued:
+        logging.info(f"webhook.py: жду обработки {scheduler.queued} обновлений...")
+    await scheduler.stop(SHUTDOWN_TIMEOUT)
+    await dp.emit_shutdown(bot=bot, dispatcher=dp)
+    await bot.session.close()
+    bot, dp, scheduler = None, None, None
+
+@router.post(WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(request: Request):
+    if bot is None:
+        raise HTTPException(status_code=404)
+
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(token, WEBHOOK_SECRET or ""):
+        raise HTTPException(status_code=403)
+
+    update = Update.model_validate(await request.json(), context={"bot": bot})
+    if scheduler.submit(update) == QUEUE_FULL:
+        return Response(status_code=503)
+    # Переполненная очередь одного чата — обновление отброшено, повторять его не нужно
+    return Response(status_code=200)